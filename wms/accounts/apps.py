@@ -4,3 +4,14 @@ from django.apps import AppConfig
 class AccountsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "wms.accounts"
+
+    def ready(self):
+        from django.contrib.auth.models import User, Group, Permission
+        from django.db.models.signals import post_save, post_delete, m2m_changed
+        from .backends import invalidate_auth_cache
+
+        for model in (User, Group, Permission):
+            post_save.connect(invalidate_auth_cache, sender=model, dispatch_uid=f"auth_cache_save_{model.__name__}")
+            post_delete.connect(invalidate_auth_cache, sender=model, dispatch_uid=f"auth_cache_delete_{model.__name__}")
+        for through in (User.groups.through, User.user_permissions.through, Group.permissions.through):
+            m2m_changed.connect(invalidate_auth_cache, sender=through, dispatch_uid=f"auth_cache_m2m_{through.__name__}")
@@ -0,0 +1,53 @@
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+_VERSION_KEY = "auth:version"
+
+
+def _auth_cache_version():
+    version = cache.get(_VERSION_KEY)
+    if version is None:
+        version = 1
+        cache.add(_VERSION_KEY, version, None)
+    return version
+
+
+# Saves that touch only these User fields leave the cached users and permissions valid.
+_IGNORED_USER_FIELDS = frozenset({"last_login"})
+
+
+def invalidate_auth_cache(**kwargs):
+    # Group and permission changes can affect any number of users, so every
+    # cached user and permission set is dropped by moving to a new version.
+    # A login only stamps last_login and must not flush everyone's cache.
+    update_fields = kwargs.get("update_fields")
+    if update_fields and set(update_fields) <= _IGNORED_USER_FIELDS:
+        return
+    try:
+        cache.incr(_VERSION_KEY)
+    except ValueError:
+        cache.set(_VERSION_KEY, 2, None)
+
+
+class CachedModelBackend(ModelBackend):
+    def get_user(self, user_id):
+        key = f"auth:user:{_auth_cache_version()}:{user_id}"
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                cache.set(key, user, settings.AUTH_CACHE_TIMEOUT)
+        return user
+
+    def get_all_permissions(self, user_obj, obj=None):
+        if not user_obj.is_active or user_obj.is_anonymous or obj is not None:
+            return set()
+        if not hasattr(user_obj, "_perm_cache"):
+            key = f"auth:perms:{_auth_cache_version()}:{user_obj.pk}"
+            perms = cache.get(key)
+            if perms is None:
+                perms = super().get_all_permissions(user_obj)
+                cache.set(key, perms, settings.AUTH_CACHE_TIMEOUT)
+            user_obj._perm_cache = perms
+        return user_obj._perm_cache
@@ -0,0 +1,43 @@
+from django.contrib.auth.models import User, Group, Permission
+from django.core.cache import cache
+from django.test import TestCase
+from wms.accounts.backends import CachedModelBackend, _auth_cache_version
+
+
+class CachedModelBackendTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("clerk", password="pass")
+        self.group = Group.objects.create(name="Clerks")
+        self.user.groups.add(self.group)
+        self.backend = CachedModelBackend()
+
+    def test_user_and_permissions_are_cached_across_requests(self):
+        self.assertIsNotNone(self.backend.get_user(self.user.pk))
+        self.assertEqual(self.backend.get_all_permissions(self.backend.get_user(self.user.pk)), set())
+
+        with self.assertNumQueries(0):
+            user = self.backend.get_user(self.user.pk)
+            self.assertFalse(self.backend.has_perm(user, "inventory.override_negative_stock"))
+            self.assertFalse(self.backend.has_perm(user, "inventory.override_negative_stock"))
+
+    def test_group_permission_change_invalidates_cache(self):
+        self.assertFalse(self.backend.has_perm(self.backend.get_user(self.user.pk), "inventory.override_negative_stock"))
+
+        self.group.permissions.add(Permission.objects.get(codename="override_negative_stock"))
+        self.assertTrue(self.backend.has_perm(self.backend.get_user(self.user.pk), "inventory.override_negative_stock"))
+
+    def test_deactivated_user_is_not_served_from_cache(self):
+        self.assertIsNotNone(self.backend.get_user(self.user.pk))
+        self.user.is_active = False
+        self.user.save(update_fields=["is_active"])
+        self.assertIsNone(self.backend.get_user(self.user.pk))
+
+    def test_login_does_not_invalidate_cache(self):
+        version = _auth_cache_version()
+        self.assertTrue(self.client.login(username="clerk", password="pass"))
+        self.assertEqual(_auth_cache_version(), version)
+
+        self.user.first_name = "Clerk"
+        self.user.save()
+        self.assertEqual(_auth_cache_version(), version + 1)
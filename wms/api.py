@@ -0,0 +1,253 @@
+import csv
+import io
+import json
+from datetime import datetime, time
+from django.core.exceptions import PermissionDenied
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Prefetch
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from rest_framework import renderers, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from wms.inventory.services import post_documents_bulk
+from wms.serializers import requested_expansions, prefetch_related_instances
+
+
+def int_param(params, name):
+    value = params.get(name)
+    if value in (None, ""):
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise ValidationError({name: "Must be an integer."})
+
+
+def date_param(params, name):
+    value = params.get(name)
+    if value in (None, ""):
+        return None
+    parsed = parse_date(value)
+    if parsed is None:
+        raise ValidationError({name: "Use YYYY-MM-DD."})
+    return parsed
+
+
+def month_param(params, name):
+    value = params.get(name)
+    if value in (None, ""):
+        return None
+    parsed = parse_date(f"{value}-01" if len(value) == 7 else value)
+    if parsed is None:
+        raise ValidationError({name: "Use YYYY-MM."})
+    return parsed
+
+
+def start_of_day(value):
+    return timezone.make_aware(datetime.combine(value, time.min))
+
+
+def _orjson_default(value):
+    return DjangoJSONEncoder().default(value)
+
+
+class ORJSONRenderer(renderers.JSONRenderer):
+    # Same output as JSONRenderer in compact mode; needs the optional orjson package.
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        import orjson
+
+        if data is None:
+            return b""
+        return orjson.dumps(data, default=_orjson_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class NDJSONRenderer(renderers.BaseRenderer):
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, cls=DjangoJSONEncoder).encode() + b"\n"
+
+
+class CSVRenderer(renderers.BaseRenderer):
+    media_type = "text/csv"
+    format = "csv"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerow([f"{key}: {value}" for key, value in (data or {}).items()])
+        return buffer.getvalue().encode()
+
+
+# Export actions only produce these formats; pick one with ?format= or the Accept header.
+EXPORT_RENDERERS = [NDJSONRenderer, CSVRenderer]
+EXPORT_CHUNK_SIZE = 2000
+
+
+def _ndjson_chunks(names, rows):
+    encoder = DjangoJSONEncoder(separators=(",", ":"))
+    chunk = []
+    for row in rows:
+        chunk.append(encoder.encode(dict(zip(names, row))))
+        if len(chunk) == EXPORT_CHUNK_SIZE:
+            yield "\n".join(chunk) + "\n"
+            chunk = []
+    if chunk:
+        yield "\n".join(chunk) + "\n"
+
+
+def _csv_chunks(names, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(names)
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+        if count == EXPORT_CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            count = 0
+    yield buffer.getvalue()
+
+
+def export_response(request, queryset, fields, filename):
+    # fields: (output name, values_list lookup) pairs; the first must be the primary key.
+    # Rows stream in id order from a server-side cursor, so after_id=<last id> resumes an interrupted export.
+    after_id = int_param(request.query_params, "after_id") or 0
+    names = [name for name, lookup in fields]
+    rows = (
+        queryset.filter(pk__gt=after_id)
+        .order_by("pk")
+        .values_list(*[lookup for name, lookup in fields])
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+    if request.accepted_renderer.format == "csv":
+        response = StreamingHttpResponse(_csv_chunks(names, rows), content_type="text/csv; charset=utf-8")
+        response["Content-Disposition"] = f'attachment; filename="{filename}.csv"'
+    else:
+        response = StreamingHttpResponse(_ndjson_chunks(names, rows), content_type="application/x-ndjson")
+    return response
+
+
+class LinesPrefetchMixin:
+    line_model = None
+
+    def get_queryset(self):
+        lines = self.line_model.objects.order_by("id")
+        if "item" in requested_expansions(self.request):
+            lines = lines.select_related("item")
+        return super().get_queryset().prefetch_related(Prefetch("lines", queryset=lines))
+
+
+class BulkCreateMixin:
+    bulk_max_documents = 500
+
+    @action(detail=False, methods=["post"])
+    def bulk(self, request):
+        documents = request.data.get("documents") if isinstance(request.data, dict) else None
+        if not isinstance(documents, list) or not documents:
+            raise ValidationError({"documents": "Send a non-empty list of documents."})
+        if len(documents) > self.bulk_max_documents:
+            raise ValidationError({"documents": f"At most {self.bulk_max_documents} documents per request."})
+        post = request.data.get("post") in (True, "true", "1", 1)
+
+        serializer_class = self.get_serializer_class()
+        context = self.get_serializer_context()
+        context["prefetched"] = prefetch_related_instances(serializer_class(context=context), documents)
+
+        results = []
+        valid = []
+        for index, document in enumerate(documents):
+            serializer = serializer_class(data=document, context=context)
+            if serializer.is_valid():
+                valid.append((index, {**serializer.validated_data, "created_by": request.user}))
+                results.append({"index": index, "status": "created"})
+            else:
+                results.append({"index": index, "status": "invalid", "errors": serializer.errors})
+
+        with transaction.atomic():
+            headers = serializer_class(many=True, context=context).create([data for index, data in valid])
+            for (index, data), header in zip(valid, headers):
+                results[index]["id"] = header.pk
+            if post and headers:
+                posted_ids, rejected = post_documents_bulk(
+                    serializer_class.Meta.model, [header.pk for header in headers], request.user
+                )
+                posted_ids = set(posted_ids)
+                for index, data in valid:
+                    pk = results[index]["id"]
+                    if pk in posted_ids:
+                        results[index]["status"] = "posted"
+                    elif pk in rejected:
+                        results[index]["status"] = "not_posted"
+                        results[index]["errors"] = {"post": [rejected[pk]]}
+
+        failed = any("errors" in result for result in results)
+        return Response(
+            {"results": results},
+            status=status.HTTP_207_MULTI_STATUS if failed else status.HTTP_201_CREATED,
+        )
+
+
+class PostingActionsMixin:
+    post_service = None
+    unpost_service = None
+    bulk_max_documents = 500
+
+    def check_posting_permission(self, request):
+        # Posting and unposting are POST actions, which DjangoModelPermissions maps to add_*.
+        # Changing stock needs change_*, the same as the posting views in the UI.
+        opts = self.get_queryset().model._meta
+        if not request.user.has_perm(f"{opts.app_label}.change_{opts.model_name}"):
+            self.permission_denied(request)
+
+    @action(detail=True, methods=["post"], url_path="post")
+    def post_document(self, request, pk=None):
+        self.check_posting_permission(request)
+        document = self.get_object()
+        try:
+            self.post_service(document, request.user, override_reason=request.data.get("override_reason", ""))
+        except PermissionDenied as exc:
+            raise ValidationError({"detail": str(exc)})
+        document.refresh_from_db()
+        return Response(self.get_serializer(document).data)
+
+    @action(detail=True, methods=["post"], url_path="unpost")
+    def unpost_document(self, request, pk=None):
+        self.check_posting_permission(request)
+        document = self.get_object()
+        self.unpost_service(document)
+        document.refresh_from_db()
+        return Response(self.get_serializer(document).data)
+
+    @action(detail=False, methods=["post"], url_path="post-batch")
+    def post_batch(self, request):
+        self.check_posting_permission(request)
+        ids = request.data.get("ids") if isinstance(request.data, dict) else None
+        if not isinstance(ids, list) or not ids or not all(isinstance(pk, int) for pk in ids):
+            raise ValidationError({"ids": "Send a non-empty list of document ids."})
+        if len(ids) > self.bulk_max_documents:
+            raise ValidationError({"ids": f"At most {self.bulk_max_documents} documents per request."})
+        model = self.get_queryset().model
+        posted_ids, rejected = post_documents_bulk(
+            model, ids, request.user, override_reason=request.data.get("override_reason", "")
+        )
+        posted_ids = set(posted_ids)
+        results = []
+        for pk in ids:
+            if pk in posted_ids:
+                results.append({"id": pk, "status": "posted"})
+            elif pk in rejected:
+                results.append({"id": pk, "status": "not_posted", "errors": {"post": [rejected[pk]]}})
+            else:
+                results.append({"id": pk, "status": "skipped"})
+        failed = any(result["status"] != "posted" for result in results)
+        return Response({"results": results}, status=status.HTTP_207_MULTI_STATUS if failed else status.HTTP_200_OK)
@@ -0,0 +1,44 @@
+import logging
+import time
+from django.db import DatabaseError, connection
+from django.http import JsonResponse
+from django.views.decorators.cache import never_cache
+
+logger = logging.getLogger(__name__)
+
+
+def database_status():
+    status = {"database": "ok", "conn_max_age": connection.settings_dict["CONN_MAX_AGE"]}
+    started = time.perf_counter()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+    except DatabaseError:
+        # The endpoint is public, so the details only go to the log.
+        logger.exception("Health check query failed")
+        status["database"] = "error"
+    status["latency_ms"] = round((time.perf_counter() - started) * 1000, 2)
+
+    pool = connection.pool
+    if pool is not None:
+        stats = pool.get_stats()
+        status["pool"] = {
+            "size": stats.get("pool_size", 0),
+            "available": stats.get("pool_available", 0),
+            "min_size": stats.get("pool_min", pool.min_size),
+            "max_size": stats.get("pool_max", pool.max_size),
+            "requests_waiting": stats.get("requests_waiting", 0),
+            "requests_num": stats.get("requests_num", 0),
+            "requests_queued": stats.get("requests_queued", 0),
+            "requests_wait_ms": stats.get("requests_wait_ms", 0),
+            "requests_errors": stats.get("requests_errors", 0),
+            "connections_num": stats.get("connections_num", 0),
+            "connections_errors": stats.get("connections_errors", 0),
+        }
+    return status
+
+
+@never_cache
+def health(request):
+    status = database_status()
+    return JsonResponse(status, status=200 if status["database"] == "ok" else 503)
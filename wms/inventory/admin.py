@@ -1,7 +1,16 @@
 from django.contrib import admin
 from django.contrib import messages
 from django.utils.translation import gettext_lazy as _
-from .models import StockBalance, StockMovement, TransferHeader, TransferLine, AdjustmentHeader, AdjustmentLine
+from .services import delete_balances
+from .models import (
+    StockBalance,
+    StockMovement,
+    StockOutboxEvent,
+    TransferHeader,
+    TransferLine,
+    AdjustmentHeader,
+    AdjustmentLine,
+)
 
 
 @admin.register(StockBalance)
@@ -12,8 +21,7 @@ class StockBalanceAdmin(admin.ModelAdmin):
 
     @admin.action(permissions=["change"], description=_("Delete selected stock balances"))
     def bulk_delete_selected(self, request, queryset):
-        count = queryset.count()
-        queryset.delete()
+        count = delete_balances(queryset)
         self.message_user(
             request,
             _("Deleted %(count)s stock balance record(s).") % {"count": count},
@@ -28,6 +36,13 @@ class StockMovementAdmin(admin.ModelAdmin):
     readonly_fields = [field.name for field in StockMovement._meta.fields]
 
 
+@admin.register(StockOutboxEvent)
+class StockOutboxEventAdmin(admin.ModelAdmin):
+    list_display = ("id", "event_type", "reference_id", "created_at", "dispatched_at", "attempts")
+    list_filter = ("event_type",)
+    readonly_fields = [field.name for field in StockOutboxEvent._meta.fields]
+
+
 class TransferLineInline(admin.TabularInline):
     model = TransferLine
     extra = 1
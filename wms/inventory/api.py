@@ -1,6 +1,31 @@
+from datetime import timedelta
+from django.db import connection
+from django.db.models import Q
 from rest_framework import viewsets
-from rest_framework.permissions import DjangoModelPermissions
-from .models import StockBalance, StockMovement, TransferHeader, AdjustmentHeader
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination
+from rest_framework.permissions import DjangoModelPermissions, IsAuthenticated
+from rest_framework.response import Response
+from wms.api import (
+    EXPORT_RENDERERS,
+    LinesPrefetchMixin,
+    PostingActionsMixin,
+    date_param,
+    export_response,
+    int_param,
+    month_param,
+    start_of_day,
+)
+from .services import (
+    post_transfer,
+    post_adjustment,
+    unpost_transfer_inventory,
+    unpost_adjustment_inventory,
+    lookup_stock,
+)
+from .models import ConsumptionRollup, StockBalance, StockMovement, StockTombstone, TransferHeader, TransferLine, AdjustmentHeader, AdjustmentLine
+from .reports import CONSUMPTION_GROUPS, consumption_summary
 from .serializers import (
     StockBalanceSerializer,
     StockMovementSerializer,
@@ -9,31 +34,251 @@ from .serializers import (
 )
 
 
+def _change_cursor_param(params):
+    value = params.get("cursor")
+    if value in (None, ""):
+        return 0, 0
+    try:
+        xid, seq = (int(part) for part in value.split("."))
+    except ValueError:
+        raise ValidationError({"cursor": "Use the cursor returned by the previous response."})
+    return xid, seq
+
+
+def _ids_param(params, name):
+    values = [value for value in params.getlist(name) for value in value.split(",") if value]
+    if not values:
+        return None
+    try:
+        return [int(value) for value in values]
+    except ValueError:
+        raise ValidationError({name: "Use comma separated integers."})
+
+
+def _format_change_cursor(xid, seq):
+    return f"{xid}.{seq}"
+
+
+def _lookup_pairs(data):
+    pairs = data.get("pairs") if isinstance(data, dict) else None
+    if not isinstance(pairs, list) or not pairs:
+        raise ValidationError({"pairs": "Send a non-empty list of pairs."})
+    if len(pairs) > StockBalanceViewSet.max_lookup_pairs:
+        raise ValidationError({"pairs": f"At most {StockBalanceViewSet.max_lookup_pairs} pairs per request."})
+    parsed = []
+    for index, pair in enumerate(pairs):
+        # Accept [warehouse, item] or {"warehouse": .., "item": ..} / {"warehouse": .., "internal_code": ..}.
+        if isinstance(pair, list) and len(pair) == 2:
+            pair = {"warehouse": pair[0], "item": pair[1]}
+        if not isinstance(pair, dict):
+            raise ValidationError({"pairs": {index: "Invalid pair."}})
+        warehouse_id = pair.get("warehouse")
+        item_id = pair.get("item")
+        code = pair.get("internal_code")
+        if not isinstance(warehouse_id, int) or not (isinstance(item_id, int) or isinstance(code, str)):
+            raise ValidationError({"pairs": {index: "Give an integer warehouse and an item id or internal_code."}})
+        parsed.append((warehouse_id, item_id if isinstance(item_id, int) else None, code))
+    return parsed
+
+
+class StockBalanceCursorPagination(CursorPagination):
+    ordering = ("id",)
+    page_size = 100
+    page_size_query_param = "page_size"
+    max_page_size = 1000
+
+
+class StockMovementCursorPagination(CursorPagination):
+    ordering = ("-created_at", "-id")
+    page_size = 100
+    page_size_query_param = "page_size"
+    max_page_size = 1000
+
+
 class StockBalanceViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = StockBalance.objects.all()
     serializer_class = StockBalanceSerializer
     permission_classes = [DjangoModelPermissions]
+    pagination_class = StockBalanceCursorPagination
+    max_lookup_pairs = 10000
+
+    @action(detail=False, methods=["post"], permission_classes=[IsAuthenticated])
+    def lookup(self, request):
+        pairs = _lookup_pairs(request.data)
+        include_cost = request.data.get("include_cost") in (True, "true", "1", 1)
+        rows = lookup_stock(pairs, include_cost=include_cost)
+        columns = ["warehouse", "item", "on_hand"] + (["last_cost"] if include_cost else [])
+        results = []
+        for warehouse_id, item_id, on_hand, last_cost in rows:
+            row = [warehouse_id, item_id, str(on_hand) if on_hand is not None else None]
+            if include_cost:
+                row.append(str(last_cost) if last_cost is not None else None)
+            results.append(row)
+        return Response({"columns": columns, "results": results})
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        params = self.request.query_params
+        warehouse_id = int_param(params, "warehouse")
+        if warehouse_id is not None:
+            queryset = queryset.filter(warehouse_id=warehouse_id)
+        item_id = int_param(params, "item")
+        if item_id is not None:
+            queryset = queryset.filter(item_id=item_id)
+        if params.get("internal_code"):
+            queryset = queryset.filter(item__internal_code=params["internal_code"])
+        return queryset
 
 
 class StockMovementViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = StockMovement.objects.all().order_by("-created_at")
+    queryset = StockMovement.objects.all().order_by("-created_at", "-id")
     serializer_class = StockMovementSerializer
     permission_classes = [DjangoModelPermissions]
+    pagination_class = StockMovementCursorPagination
+    export_fields = [
+        ("id", "id"),
+        ("warehouse", "warehouse_id"),
+        ("item", "item_id"),
+        ("movement_type", "movement_type"),
+        ("qty_delta", "qty_delta"),
+        ("unit_cost", "unit_cost"),
+        ("currency", "currency"),
+        ("reference_type", "reference_type"),
+        ("reference_id", "reference_id"),
+        ("override_negative", "override_negative"),
+        ("created_by", "created_by_id"),
+        ("created_at", "created_at"),
+    ]
+
+    @action(detail=False, renderer_classes=EXPORT_RENDERERS)
+    def export(self, request):
+        return export_response(request, self.get_queryset(), self.export_fields, "stock-movements")
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        params = self.request.query_params
+        warehouse_id = int_param(params, "warehouse")
+        if warehouse_id is not None:
+            queryset = queryset.filter(warehouse_id=warehouse_id)
+        item_id = int_param(params, "item")
+        if item_id is not None:
+            queryset = queryset.filter(item_id=item_id)
+        if params.get("movement_type"):
+            queryset = queryset.filter(movement_type__in=params["movement_type"].split(","))
+        # Compare against day boundaries instead of created_at__date so the indexes stay usable.
+        date_from = date_param(params, "date_from")
+        if date_from:
+            queryset = queryset.filter(created_at__gte=start_of_day(date_from))
+        date_to = date_param(params, "date_to")
+        if date_to:
+            queryset = queryset.filter(created_at__lt=start_of_day(date_to + timedelta(days=1)))
+        if params.get("reference_type"):
+            queryset = queryset.filter(reference_type=params["reference_type"])
+        reference_id = int_param(params, "reference_id")
+        if reference_id is not None:
+            queryset = queryset.filter(reference_id=reference_id)
+        return queryset
 
-class TransferViewSet(viewsets.ModelViewSet):
+
+class TransferViewSet(PostingActionsMixin, LinesPrefetchMixin, viewsets.ModelViewSet):
     queryset = TransferHeader.objects.all().order_by("-created_at")
     serializer_class = TransferSerializer
     permission_classes = [DjangoModelPermissions]
+    line_model = TransferLine
+    post_service = staticmethod(post_transfer)
+    unpost_service = staticmethod(unpost_transfer_inventory)
 
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
 
 
-class AdjustmentViewSet(viewsets.ModelViewSet):
+class AdjustmentViewSet(PostingActionsMixin, LinesPrefetchMixin, viewsets.ModelViewSet):
     queryset = AdjustmentHeader.objects.all().order_by("-created_at")
     serializer_class = AdjustmentSerializer
     permission_classes = [DjangoModelPermissions]
+    line_model = AdjustmentLine
+    post_service = staticmethod(post_adjustment)
+    unpost_service = staticmethod(unpost_adjustment_inventory)
 
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
+
+
+class StockChangeFeedViewSet(viewsets.GenericViewSet):
+    queryset = StockMovement.objects.all()
+    permission_classes = [DjangoModelPermissions]
+    default_limit = 1000
+    max_limit = 10000
+
+    def list(self, request):
+        params = request.query_params
+        after_xid, after_seq = _change_cursor_param(params)
+        limit = min(int_param(params, "limit") or self.default_limit, self.max_limit)
+        warehouse_id = int_param(params, "warehouse")
+
+        # Only hand out rows written by transactions older than every transaction still running.
+        # A change sequence alone is not enough: a slower transaction can commit a lower value later.
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint")
+            horizon = cursor.fetchone()[0]
+        changed = Q(change_xid__lt=horizon) & (
+            Q(change_xid__gt=after_xid) | Q(change_xid=after_xid, change_seq__gt=after_seq)
+        )
+        if warehouse_id is not None:
+            changed &= Q(warehouse_id=warehouse_id)
+
+        changes = []
+        for kind, queryset in (
+            ("balance", StockBalance.objects.all()),
+            ("movement", StockMovement.objects.all()),
+            ("deleted", StockTombstone.objects.all()),
+        ):
+            rows = queryset.filter(changed).order_by("change_xid", "change_seq")[: limit + 1]
+            changes.extend(((row.change_xid, row.change_seq), kind, row) for row in rows)
+        changes.sort(key=lambda change: change[0])
+        has_more = len(changes) > limit
+        changes = changes[:limit]
+
+        balances, movements, deleted = [], [], []
+        for position, kind, row in changes:
+            if kind == "balance":
+                balances.append(row)
+            elif kind == "movement":
+                movements.append(row)
+            else:
+                deleted.append({"kind": row.kind, "id": row.object_id, "warehouse": row.warehouse_id, "item": row.item_id})
+        next_cursor = changes[-1][0] if changes else (after_xid, after_seq)
+        return Response(
+            {
+                "cursor": _format_change_cursor(*next_cursor),
+                "has_more": has_more,
+                "balances": StockBalanceSerializer(balances, many=True).data,
+                "movements": StockMovementSerializer(movements, many=True).data,
+                "deleted": deleted,
+            }
+        )
+
+
+class ConsumptionViewSet(viewsets.GenericViewSet):
+    queryset = ConsumptionRollup.objects.all()
+    permission_classes = [DjangoModelPermissions]
+
+    def list(self, request):
+        params = request.query_params
+        group_by = [group for group in params.get("group", "location").split(",") if group]
+        unknown = [group for group in group_by if group not in CONSUMPTION_GROUPS]
+        if unknown or not group_by:
+            raise ValidationError({"group": f"Use a comma separated list of {', '.join(CONSUMPTION_GROUPS)}."})
+        rows = consumption_summary(
+            group_by,
+            month_from=month_param(params, "month_from"),
+            month_to=month_param(params, "month_to"),
+            location_ids=_ids_param(params, "location"),
+            warehouse_ids=_ids_param(params, "warehouse"),
+            item_ids=_ids_param(params, "item"),
+            category=params.get("category") or None,
+        )
+        for row in rows:
+            row["qty"], row["value"] = str(row["qty"]), str(row["value"])
+        return Response({"results": rows})
+
@@ -0,0 +1,77 @@
+import asyncio
+import json
+
+import psycopg
+from django.db import connection
+
+from .services import BALANCE_CHANNEL
+
+# Seconds between checks whether anyone is still subscribed.
+IDLE_CHECK = 5
+# Changes a slow subscriber may fall behind before further ones are dropped for it.
+QUEUE_SIZE = 1000
+
+
+def listen_params():
+    params = connection.get_connection_params()
+    params.pop("cursor_factory", None)
+    params.pop("context", None)
+    return params
+
+
+class BalanceListener:
+    # One LISTEN connection per process (and event loop), fanned out to every open
+    # stock page through its own queue. The connection closes once nobody listens.
+    def __init__(self):
+        self.subscribers = set()
+        self.task = None
+        self.loop = None
+        self.ready = None
+
+    async def subscribe(self):
+        loop = asyncio.get_running_loop()
+        if self.task is None or self.task.done() or self.loop is not loop:
+            self.subscribers = set()
+            self.loop = loop
+            self.ready = loop.create_future()
+            self.task = loop.create_task(self._run(self.ready))
+        queue = asyncio.Queue(QUEUE_SIZE)
+        self.subscribers.add(queue)
+        try:
+            await asyncio.shield(self.ready)
+        except Exception:
+            self.subscribers.discard(queue)
+            raise
+        return queue
+
+    def unsubscribe(self, queue):
+        self.subscribers.discard(queue)
+
+    async def _run(self, ready):
+        task = asyncio.current_task()
+        conn = None
+        try:
+            conn = await psycopg.AsyncConnection.connect(autocommit=True, **listen_params())
+            await conn.execute(f"LISTEN {BALANCE_CHANNEL}")
+            ready.set_result(None)
+            while self.subscribers:
+                async for notify in conn.notifies(timeout=IDLE_CHECK):
+                    change = json.loads(notify.payload)
+                    for queue in list(self.subscribers):
+                        if not queue.full():
+                            queue.put_nowait(change)
+        except Exception as exc:
+            if not ready.done():
+                ready.set_exception(exc)
+            # None ends the streams; the browsers reconnect and start a new listener.
+            for queue in list(self.subscribers):
+                if not queue.full():
+                    queue.put_nowait(None)
+        finally:
+            if self.task is task:
+                self.task = None
+            if conn is not None:
+                await conn.close()
+
+
+balance_listener = BalanceListener()
@@ -0,0 +1,41 @@
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from wms.inventory.reports import classify_items
+
+
+class Command(BaseCommand):
+    help = (
+        "Classify items as A/B/C by issued value and X/Y/Z by the variability of monthly issued quantities, "
+        "from the consumption rollup. Run monthly, after the month's issues are posted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--months", type=int, default=12, help="Complete months of consumption to read.")
+        parser.add_argument("--a-share", type=Decimal, default=Decimal("0.80"), help="Share of issued value covered by A items.")
+        parser.add_argument("--b-share", type=Decimal, default=Decimal("0.95"), help="Share of issued value covered by A and B items.")
+        parser.add_argument("--x-cv", type=Decimal, default=Decimal("0.5"), help="Highest coefficient of variation for X items.")
+        parser.add_argument("--y-cv", type=Decimal, default=Decimal("1.0"), help="Highest coefficient of variation for Y items.")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("This command only supports PostgreSQL.")
+        if not 0 < options["a_share"] <= options["b_share"] <= 1:
+            raise CommandError("Expected 0 < --a-share <= --b-share <= 1.")
+        if not 0 <= options["x_cv"] <= options["y_cv"]:
+            raise CommandError("Expected 0 <= --x-cv <= --y-cv.")
+
+        started = time.perf_counter()
+        counts = classify_items(
+            months=options["months"],
+            a_share=options["a_share"],
+            b_share=options["b_share"],
+            x_cv=options["x_cv"],
+            y_cv=options["y_cv"],
+        )
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f"Classified {sum(counts.values())} item(s) ({elapsed:.2f}s)."))
+        for abc in "ABC":
+            self.stdout.write(f"  {abc}: " + " ".join(f"{abc}{xyz}={counts.get(abc + xyz, 0)}" for xyz in "XYZ"))
@@ -0,0 +1,54 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from wms.inventory.models import ReorderSuggestion
+from wms.inventory.reports import compute_reorder_suggestions
+from wms.inventory.services import create_reorder_purchases
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute reorder suggestions from issue consumption, vendor lead times and safety stock. "
+        "Run nightly, after the day's issues are posted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lookback-months", type=int, default=3, help="Months of consumption behind the daily usage.")
+        parser.add_argument("--safety-days", type=int, default=7, help="Days of usage kept as safety stock.")
+        parser.add_argument("--cover-days", type=int, default=30, help="Days of usage a reorder should cover.")
+        parser.add_argument("--warehouse", type=int, action="append", dest="warehouses", help="Limit to a warehouse id, repeatable.")
+        parser.add_argument("--create-drafts", metavar="USERNAME", help="Turn every suggestion with a preferred vendor into draft purchases.")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("This command only supports PostgreSQL.")
+
+        user = None
+        if options["create_drafts"]:
+            try:
+                user = get_user_model().objects.get(username=options["create_drafts"])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"Unknown user {options['create_drafts']!r}.")
+
+        started = time.perf_counter()
+        count = compute_reorder_suggestions(
+            lookback_months=options["lookback_months"],
+            safety_days=options["safety_days"],
+            cover_days=options["cover_days"],
+            warehouse_ids=options["warehouses"],
+        )
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f"Stored {count} reorder suggestion(s) ({elapsed:.2f}s)."))
+
+        suggestions = ReorderSuggestion.objects.all()
+        if options["warehouses"]:
+            suggestions = suggestions.filter(warehouse_id__in=options["warehouses"])
+        for row in suggestions.values("vendor__name").annotate(count=Count("id")).order_by("vendor__name"):
+            self.stdout.write(f"  {row['vendor__name'] or '-'}: {row['count']}")
+
+        if user is not None:
+            headers = create_reorder_purchases(suggestions.values_list("id", flat=True), user)
+            self.stdout.write(self.style.SUCCESS(f"Created {len(headers)} draft purchase(s)."))
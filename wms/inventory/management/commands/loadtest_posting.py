@@ -0,0 +1,307 @@
+import multiprocessing
+import random
+import threading
+import time
+from collections import defaultdict
+from decimal import Decimal
+
+import psycopg
+from django.contrib.auth.models import User
+from django.core.exceptions import PermissionDenied
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections, transaction
+from django.db.models import Sum
+from django.utils import timezone
+from wms.masters.models import Vendor, Warehouse, OutgoingLocation, Item
+from wms.purchasing.models import PurchaseHeader, PurchaseLine
+from wms.issuing.models import IssueHeader, IssueLine
+from wms.inventory.models import StockBalance, StockMovement, TransferHeader, TransferLine
+from wms.inventory.services import post_purchase, post_issue, post_transfer
+
+PREFIX = "LOADTEST"
+OPERATIONS = ("purchase", "issue", "transfer")
+
+
+class LockTimer:
+    def __init__(self):
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        if "FOR UPDATE" not in sql:
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+
+
+def _is_retryable(exc):
+    return isinstance(exc.__cause__, (psycopg.errors.DeadlockDetected, psycopg.errors.SerializationFailure))
+
+
+def _create_purchase(ctx, rng, items):
+    purchase = PurchaseHeader.objects.create(
+        vendor_id=ctx["vendor_id"],
+        warehouse_id=rng.choice(ctx["warehouse_ids"]),
+        invoice_no=f"{PREFIX}-{rng.getrandbits(32):08x}",
+        invoice_date=timezone.localdate(),
+        created_by_id=ctx["user_id"],
+    )
+    for item_id in items:
+        qty = Decimal(rng.randint(5, 20))
+        PurchaseLine.objects.create(
+            purchase=purchase,
+            item_id=item_id,
+            qty=qty,
+            unit_price=Decimal("1.00"),
+            line_total=qty,
+        )
+    return purchase
+
+
+def _create_issue(ctx, rng, items):
+    issue = IssueHeader.objects.create(
+        warehouse_id=rng.choice(ctx["warehouse_ids"]),
+        outgoing_location_id=ctx["location_id"],
+        issue_date=timezone.localdate(),
+        notes=PREFIX,
+        created_by_id=ctx["user_id"],
+    )
+    for item_id in items:
+        IssueLine.objects.create(header=issue, item_id=item_id, qty=Decimal(rng.randint(1, 5)))
+    return issue
+
+
+def _create_transfer(ctx, rng, items):
+    from_id, to_id = rng.sample(ctx["warehouse_ids"], 2)
+    transfer = TransferHeader.objects.create(
+        from_warehouse_id=from_id,
+        to_warehouse_id=to_id,
+        date=timezone.localdate(),
+        notes=PREFIX,
+        created_by_id=ctx["user_id"],
+    )
+    for item_id in items:
+        TransferLine.objects.create(header=transfer, item_id=item_id, qty=Decimal(rng.randint(1, 5)))
+    return transfer
+
+
+CREATORS = {
+    "purchase": (_create_purchase, post_purchase),
+    "issue": (_create_issue, post_issue),
+    "transfer": (_create_transfer, post_transfer),
+}
+
+
+def run_worker(ctx, worker_no):
+    rng = random.Random(ctx["seed"] + worker_no)
+    user = User.objects.get(pk=ctx["user_id"])
+    timer = LockTimer()
+    stats = {
+        "latencies": defaultdict(list),
+        "rejected": 0,
+        "deadlocks": 0,
+        "retries": 0,
+        "failures": 0,
+        "lock_wait": 0.0,
+    }
+    interval = ctx["workers"] / ctx["rate"] if ctx["rate"] else 0
+    deadline = time.monotonic() + ctx["duration"]
+    next_slot = time.monotonic()
+
+    try:
+        with connection.execute_wrapper(timer):
+            while time.monotonic() < deadline:
+                if interval:
+                    delay = next_slot - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                    next_slot += interval
+
+                op = rng.choices(OPERATIONS, weights=ctx["weights"])[0]
+                items = rng.sample(ctx["item_ids"], min(ctx["lines"], len(ctx["item_ids"])))
+                create, post = CREATORS[op]
+                started = time.perf_counter()
+                for attempt in range(ctx["max_retries"] + 1):
+                    try:
+                        with transaction.atomic():
+                            post(create(ctx, rng, items), user)
+                    except OperationalError as exc:
+                        if not _is_retryable(exc):
+                            stats["failures"] += 1
+                            break
+                        if isinstance(exc.__cause__, psycopg.errors.DeadlockDetected):
+                            stats["deadlocks"] += 1
+                        if attempt == ctx["max_retries"]:
+                            stats["failures"] += 1
+                            break
+                        stats["retries"] += 1
+                    except PermissionDenied:
+                        stats["rejected"] += 1
+                        break
+                    else:
+                        stats["latencies"][op].append(time.perf_counter() - started)
+                        break
+    finally:
+        stats["lock_wait"] = timer.seconds
+        connection.close()
+    stats["latencies"] = dict(stats["latencies"])
+    return stats
+
+
+def _process_worker(ctx, worker_no, queue):
+    queue.put(run_worker(ctx, worker_no))
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class Command(BaseCommand):
+    help = (
+        "Post purchases, issues and transfers concurrently against shared hot items and report "
+        "throughput, latency, lock waits and deadlocks. Run it against a staging database only."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument("--mode", choices=["thread", "process"], default="thread")
+        parser.add_argument("--duration", type=float, default=30, help="Seconds to run.")
+        parser.add_argument("--rate", type=float, default=0, help="Target documents per second, 0 = unthrottled.")
+        parser.add_argument("--hot-items", type=int, default=10)
+        parser.add_argument("--lines", type=int, default=3, help="Lines per document.")
+        parser.add_argument("--mix", default="4:4:2", help="purchase:issue:transfer weights.")
+        parser.add_argument("--max-retries", type=int, default=3)
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("This command only supports PostgreSQL.")
+        try:
+            weights = [float(w) for w in options["mix"].split(":")]
+        except ValueError:
+            raise CommandError("--mix must look like 4:4:2")
+        if len(weights) != len(OPERATIONS) or not any(weights):
+            raise CommandError("--mix must look like 4:4:2")
+
+        ctx = self._prepare(options)
+        ctx["weights"] = weights
+        self.stdout.write(
+            f"Running {options['workers']} {options['mode']} worker(s) for {options['duration']}s "
+            f"against {len(ctx['item_ids'])} hot item(s)..."
+        )
+
+        started = time.perf_counter()
+        results = self._run(ctx, options)
+        elapsed = time.perf_counter() - started
+        self._report(results, elapsed)
+        self._verify(ctx)
+
+    def _prepare(self, options):
+        user, created = User.objects.get_or_create(username=f"{PREFIX.lower()}-user")
+        if created:
+            user.set_unusable_password()
+            user.save(update_fields=["password"])
+        vendor, _ = Vendor.objects.get_or_create(name=f"{PREFIX} Vendor")
+        location, _ = OutgoingLocation.objects.get_or_create(
+            name=f"{PREFIX} Location", defaults={"type": OutgoingLocation.TYPE_DEPARTMENT}
+        )
+        warehouses = [
+            Warehouse.objects.get_or_create(name=f"{PREFIX} Warehouse {n}")[0] for n in (1, 2)
+        ]
+        items = [
+            Item.objects.get_or_create(internal_code=f"{PREFIX}-{n:04d}", defaults={"name": f"{PREFIX} Item {n}", "unit": "pcs"})[0]
+            for n in range(1, options["hot_items"] + 1)
+        ]
+        connections.close_all()
+        return {
+            "user_id": user.id,
+            "vendor_id": vendor.id,
+            "location_id": location.id,
+            "warehouse_ids": [wh.id for wh in warehouses],
+            "item_ids": [item.id for item in items],
+            "workers": options["workers"],
+            "duration": options["duration"],
+            "rate": options["rate"],
+            "lines": options["lines"],
+            "max_retries": options["max_retries"],
+            "seed": options["seed"],
+        }
+
+    def _run(self, ctx, options):
+        if options["mode"] == "process":
+            mp = multiprocessing.get_context("fork")
+            queue = mp.Queue()
+            procs = [mp.Process(target=_process_worker, args=(ctx, n, queue)) for n in range(ctx["workers"])]
+            for proc in procs:
+                proc.start()
+            results = [queue.get() for _ in procs]
+            for proc in procs:
+                proc.join()
+            return results
+
+        results = []
+        lock = threading.Lock()
+
+        def target(n):
+            stats = run_worker(ctx, n)
+            with lock:
+                results.append(stats)
+
+        threads = [threading.Thread(target=target, args=(n,)) for n in range(ctx["workers"])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def _report(self, results, elapsed):
+        latencies = defaultdict(list)
+        totals = defaultdict(float)
+        for stats in results:
+            for op, values in stats["latencies"].items():
+                latencies[op].extend(values)
+            for key in ("rejected", "deadlocks", "retries", "failures", "lock_wait"):
+                totals[key] += stats[key]
+
+        all_latencies = [value for values in latencies.values() for value in values]
+        done = len(all_latencies)
+        self.stdout.write(f"Posted {done} document(s) in {elapsed:.1f}s: {done / elapsed:.1f} docs/s")
+        rows = sorted(latencies.items()) + [("all", all_latencies)]
+        for op, values in rows:
+            self.stdout.write(
+                f"  {op:<9} n={len(values):<7} "
+                f"p50={_percentile(values, 50) * 1000:.1f}ms "
+                f"p95={_percentile(values, 95) * 1000:.1f}ms "
+                f"p99={_percentile(values, 99) * 1000:.1f}ms"
+            )
+        lock_wait = totals["lock_wait"]
+        self.stdout.write(
+            f"Lock wait: {lock_wait:.2f}s total, {lock_wait / done * 1000 if done else 0:.1f}ms per document"
+        )
+        self.stdout.write(
+            f"Deadlocks: {int(totals['deadlocks'])}  Retries: {int(totals['retries'])}  "
+            f"Failures: {int(totals['failures'])}  Rejected (insufficient stock): {int(totals['rejected'])}"
+        )
+
+    def _verify(self, ctx):
+        movement_totals = {
+            (row["warehouse_id"], row["item_id"]): row["total"]
+            for row in StockMovement.objects.filter(warehouse_id__in=ctx["warehouse_ids"])
+            .values("warehouse_id", "item_id")
+            .annotate(total=Sum("qty_delta"))
+        }
+        mismatches = 0
+        balances = StockBalance.objects.filter(warehouse_id__in=ctx["warehouse_ids"])
+        for warehouse_id, item_id, on_hand in balances.values_list("warehouse_id", "item_id", "on_hand"):
+            if movement_totals.pop((warehouse_id, item_id), Decimal("0")) != on_hand:
+                mismatches += 1
+        mismatches += sum(1 for total in movement_totals.values() if total != 0)
+        if mismatches:
+            raise CommandError(f"StockBalance does not match SUM(StockMovement) for {mismatches} pair(s).")
+        self.stdout.write(self.style.SUCCESS("StockBalance matches SUM(StockMovement) for all load-test pairs."))
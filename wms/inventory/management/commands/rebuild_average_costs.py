@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from wms.inventory.services import rebuild_average_costs
+
+
+class Command(BaseCommand):
+    help = "Recompute average costs, stock values, movement values and consumption rollup values by replaying the StockMovement history."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=5000, help="Movements read and rows written per batch.")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("This command only supports PostgreSQL.")
+
+        started = time.perf_counter()
+        count = rebuild_average_costs(options["chunk_size"])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f"Revalued {count} balance(s) ({elapsed:.2f}s)."))
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from wms.inventory.services import fifo_stock_value, rebuild_cost_layers
+
+
+class Command(BaseCommand):
+    help = "Rebuild the FIFO cost layers and their consumptions by replaying the StockMovement history."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=5000, help="Movements read and rows written per batch.")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("This command only supports PostgreSQL.")
+
+        started = time.perf_counter()
+        counts = rebuild_cost_layers(options["chunk_size"])
+        elapsed = time.perf_counter() - started
+        totals = fifo_stock_value()
+        value = sum((value for qty, value in totals.values()), 0)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Replayed {counts['movements']} movement(s) into {counts['layers']} layer(s) and "
+                f"{counts['consumptions']} consumption(s), open value {value} ({elapsed:.2f}s)."
+            )
+        )
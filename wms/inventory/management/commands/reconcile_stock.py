@@ -0,0 +1,63 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from wms.masters.models import Warehouse
+from wms.inventory.services import find_stock_mismatches, repair_stock_balances
+
+
+def _run_for_warehouse(warehouse_id, repair):
+    try:
+        mismatches = find_stock_mismatches([warehouse_id])
+        repaired = repair_stock_balances([warehouse_id]) if repair and mismatches else 0
+        return mismatches, repaired
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = "Compare StockBalance.on_hand with SUM(StockMovement.qty_delta) and optionally rewrite the balances."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--warehouse", type=int, action="append", dest="warehouses", help="Warehouse id, repeatable.")
+        parser.add_argument("--repair", action="store_true", help="Rewrite mismatched balances from the movements.")
+        parser.add_argument("--jobs", type=int, default=1, help="Parallel per-warehouse workers.")
+        parser.add_argument("--limit", type=int, default=50, help="Mismatches to print.")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("This command only supports PostgreSQL.")
+
+        started = time.perf_counter()
+        warehouse_ids = options["warehouses"]
+        if options["jobs"] > 1:
+            if warehouse_ids is None:
+                warehouse_ids = list(Warehouse.objects.values_list("id", flat=True))
+            connection.close()
+            mismatches = []
+            repaired = 0
+            with ThreadPoolExecutor(max_workers=options["jobs"]) as pool:
+                results = pool.map(lambda wh_id: _run_for_warehouse(wh_id, options["repair"]), warehouse_ids)
+                for rows, count in results:
+                    mismatches.extend(rows)
+                    repaired += count
+        else:
+            mismatches = find_stock_mismatches(warehouse_ids)
+            repaired = repair_stock_balances(warehouse_ids) if options["repair"] and mismatches else 0
+        elapsed = time.perf_counter() - started
+
+        for warehouse_id, item_id, on_hand, movement_total in mismatches[: options["limit"]]:
+            self.stdout.write(
+                f"warehouse={warehouse_id} item={item_id} on_hand={on_hand if on_hand is not None else '-'} "
+                f"movements={movement_total}"
+            )
+        if len(mismatches) > options["limit"]:
+            self.stdout.write(f"... and {len(mismatches) - options['limit']} more")
+
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS(f"No mismatches ({elapsed:.2f}s)."))
+        elif options["repair"]:
+            self.stdout.write(self.style.SUCCESS(f"Repaired {repaired} balance(s) ({elapsed:.2f}s)."))
+        else:
+            raise CommandError(f"Found {len(mismatches)} mismatched balance(s). Run with --repair to fix them.")
@@ -0,0 +1,75 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from wms.inventory.models import StockOutboxEvent
+from wms.inventory.outbox import RelayStats, build_sink, relay_batch
+
+
+class Command(BaseCommand):
+    help = (
+        "Deliver stock outbox events to one or more sinks, at least once. "
+        "Several relays can run side by side, each claims its own batches with SKIP LOCKED."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sink",
+            action="append",
+            dest="sinks",
+            required=True,
+            help="file:<path>, webhook:<url> or callback:<dotted.path>, repeatable.",
+        )
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--max-attempts",
+            type=int,
+            default=10,
+            help="Park an event after N failed deliveries, 0 retries forever.",
+        )
+        parser.add_argument("--follow", action="store_true", help="Keep polling instead of exiting when drained.")
+        parser.add_argument("--interval", type=float, default=1.0, help="Seconds between polls with --follow.")
+        parser.add_argument("--purge-days", type=int, help="Delete events dispatched more than N days ago.")
+
+    def handle(self, *args, **options):
+        try:
+            sinks = [build_sink(spec) for spec in options["sinks"]]
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        stats = RelayStats()
+        reported = time.perf_counter()
+        try:
+            while True:
+                try:
+                    count = relay_batch(sinks, options["batch_size"], options["max_attempts"], stats)
+                except Exception as exc:
+                    self.stderr.write(f"Batch failed, will retry: {type(exc).__name__}: {exc}")
+                    if not options["follow"]:
+                        break
+                    time.sleep(options["interval"])
+                    continue
+                if count:
+                    if options["follow"] and time.perf_counter() - reported > 60:
+                        self._report(stats)
+                        reported = time.perf_counter()
+                    continue
+                if not options["follow"]:
+                    break
+                time.sleep(options["interval"])
+        except KeyboardInterrupt:
+            pass
+
+        if options["purge_days"] is not None:
+            cutoff = timezone.now() - timedelta(days=options["purge_days"])
+            purged, _ = StockOutboxEvent.objects.filter(dispatched_at__lt=cutoff).delete()
+            self.stdout.write(f"Purged {purged} dispatched event(s).")
+        self._report(stats)
+        if stats.failures and not options["follow"]:
+            raise CommandError(f"{stats.failures} batch(es) failed.")
+
+    def _report(self, stats):
+        pending = StockOutboxEvent.objects.filter(dispatched_at__isnull=True).count()
+        metrics = " ".join(f"{name}={value}" for name, value in stats.as_dict().items())
+        self.stdout.write(self.style.SUCCESS(f"{metrics} pending={pending}"))
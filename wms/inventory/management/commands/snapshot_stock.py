@@ -0,0 +1,38 @@
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from wms.inventory.models import StockSnapshot
+from wms.inventory.reports import take_stock_snapshot
+
+
+class Command(BaseCommand):
+    help = "Store per-warehouse, per-item quantities and values at the end of a day for the valuation reports."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--date", help="Day to snapshot as YYYY-MM-DD, defaults to yesterday.")
+        parser.add_argument("--keep-days", type=int, help="Delete snapshots older than N days.")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("This command only supports PostgreSQL.")
+
+        if options["date"]:
+            try:
+                day = date.fromisoformat(options["date"])
+            except ValueError:
+                raise CommandError(f"Invalid date {options['date']!r}, expected YYYY-MM-DD.")
+        else:
+            day = timezone.localdate() - timedelta(days=1)
+
+        started = time.perf_counter()
+        count = take_stock_snapshot(day)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f"Stored {count} position(s) for {day} ({elapsed:.2f}s)."))
+
+        if options["keep_days"] is not None:
+            cutoff = timezone.localdate() - timedelta(days=options["keep_days"])
+            purged, _ = StockSnapshot.objects.filter(date__lt=cutoff).delete()
+            self.stdout.write(f"Purged {purged} snapshot row(s).")
@@ -0,0 +1,35 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="stockmovement",
+            name="inventory__created_9e52f7_idx",
+        ),
+        migrations.AddIndex(
+            model_name="stockmovement",
+            index=models.Index(fields=["created_at", "id"], name="inventory_s_created_36aee8_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="stockmovement",
+            index=models.Index(fields=["warehouse", "created_at"], name="inventory_s_warehou_f752ce_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="stockmovement",
+            index=models.Index(fields=["item", "created_at"], name="inventory_s_item_id_a9fe64_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="stockmovement",
+            index=models.Index(fields=["movement_type", "created_at"], name="inventory_s_movemen_ed5291_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="stockmovement",
+            index=models.Index(fields=["reference_type", "reference_id"], name="inventory_s_referen_5aaa1a_idx"),
+        ),
+    ]
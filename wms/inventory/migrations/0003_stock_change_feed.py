@@ -0,0 +1,63 @@
+import wms.inventory.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0002_stockmovement_api_indexes"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            "CREATE SEQUENCE IF NOT EXISTS inventory_change_seq",
+            "DROP SEQUENCE IF EXISTS inventory_change_seq",
+        ),
+        migrations.AddField(
+            model_name="stockmovement",
+            name="change_xid",
+            field=models.BigIntegerField(db_default=wms.inventory.models.CurrentTransactionId(), editable=False),
+        ),
+        migrations.AddField(
+            model_name="stockmovement",
+            name="change_seq",
+            field=models.BigIntegerField(db_default=wms.inventory.models.NextChangeSeq(), editable=False),
+        ),
+        migrations.AddField(
+            model_name="stockbalance",
+            name="change_xid",
+            field=models.BigIntegerField(db_default=wms.inventory.models.CurrentTransactionId(), editable=False),
+        ),
+        migrations.AddField(
+            model_name="stockbalance",
+            name="change_seq",
+            field=models.BigIntegerField(db_default=wms.inventory.models.NextChangeSeq(), editable=False),
+        ),
+        migrations.CreateModel(
+            name="StockTombstone",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("kind", models.CharField(choices=[("movement", "Movement"), ("balance", "Balance")], max_length=20)),
+                ("object_id", models.BigIntegerField()),
+                ("warehouse_id", models.BigIntegerField()),
+                ("item_id", models.BigIntegerField()),
+                ("deleted_at", models.DateTimeField(auto_now_add=True)),
+                ("change_xid", models.BigIntegerField(db_default=wms.inventory.models.CurrentTransactionId(), editable=False)),
+                ("change_seq", models.BigIntegerField(db_default=wms.inventory.models.NextChangeSeq(), editable=False)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(fields=["change_xid", "change_seq"], name="inventory_s_change__aa448d_idx"),
+                    models.Index(fields=["deleted_at"], name="inventory_s_deleted_4006eb_idx"),
+                ],
+            },
+        ),
+        migrations.AddIndex(
+            model_name="stockmovement",
+            index=models.Index(fields=["change_xid", "change_seq"], name="inventory_s_change__e08079_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="stockbalance",
+            index=models.Index(fields=["change_xid", "change_seq"], name="inventory_s_change__446c0e_idx"),
+        ),
+    ]
@@ -0,0 +1,35 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0003_stock_change_feed"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StockOutboxEvent",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("event_type", models.CharField(max_length=50)),
+                ("reference_type", models.CharField(blank=True, max_length=50)),
+                ("reference_id", models.PositiveIntegerField(blank=True, null=True)),
+                ("payload", models.JSONField(default=dict)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("dispatched_at", models.DateTimeField(blank=True, null=True)),
+                ("attempts", models.PositiveIntegerField(default=0)),
+                ("last_error", models.TextField(blank=True)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        condition=models.Q(("dispatched_at__isnull", True)),
+                        fields=["id"],
+                        name="inventory_outbox_pending_idx",
+                    ),
+                    models.Index(fields=["dispatched_at"], name="inventory_s_dispatc_317c46_idx"),
+                ],
+            },
+        ),
+    ]
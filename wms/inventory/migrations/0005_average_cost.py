@@ -0,0 +1,26 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0004_stock_outbox"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="stockbalance",
+            name="avg_cost",
+            field=models.DecimalField(decimal_places=4, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name="stockbalance",
+            name="stock_value",
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=16),
+        ),
+        migrations.AddField(
+            model_name="stockmovement",
+            name="value_delta",
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=16, null=True),
+        ),
+    ]
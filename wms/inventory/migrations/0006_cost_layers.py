@@ -0,0 +1,65 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0005_average_cost"),
+        ("masters", "0004_unit"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="CostLayer",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("received_at", models.DateTimeField()),
+                ("qty", models.DecimalField(decimal_places=3, max_digits=14)),
+                ("remaining", models.DecimalField(decimal_places=3, max_digits=14)),
+                ("unit_cost", models.DecimalField(decimal_places=4, max_digits=14)),
+                ("item", models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to="masters.item")),
+                (
+                    "movement",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="cost_layers",
+                        to="inventory.stockmovement",
+                    ),
+                ),
+                ("warehouse", models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to="masters.warehouse")),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        condition=models.Q(("remaining__gt", 0)),
+                        fields=["warehouse", "item", "received_at", "id"],
+                        name="inventory_costlayer_open_idx",
+                    ),
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="CostLayerConsumption",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("qty", models.DecimalField(decimal_places=3, max_digits=14)),
+                (
+                    "layer",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="consumptions",
+                        to="inventory.costlayer",
+                    ),
+                ),
+                (
+                    "movement",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="layer_consumptions",
+                        to="inventory.stockmovement",
+                    ),
+                ),
+            ],
+        ),
+    ]
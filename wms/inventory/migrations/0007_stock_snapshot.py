@@ -0,0 +1,29 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0006_cost_layers"),
+        ("masters", "0004_unit"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StockSnapshot",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("date", models.DateField()),
+                ("on_hand", models.DecimalField(decimal_places=3, max_digits=14)),
+                ("stock_value", models.DecimalField(decimal_places=2, max_digits=16)),
+                ("item", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to="masters.item")),
+                ("warehouse", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to="masters.warehouse")),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(fields=("date", "warehouse", "item"), name="uq_stock_snapshot"),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,52 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0007_stock_snapshot"),
+        ("masters", "0004_unit"),
+        ("issuing", "0003_issueheader_source_purchase"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ConsumptionRollup",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("month", models.DateField()),
+                ("qty", models.DecimalField(decimal_places=3, default=0, max_digits=16)),
+                ("value", models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ("item", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to="masters.item")),
+                (
+                    "outgoing_location",
+                    models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to="masters.outgoinglocation"),
+                ),
+                ("warehouse", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to="masters.warehouse")),
+            ],
+            options={
+                "indexes": [
+                    models.Index(fields=["outgoing_location", "month"], name="inventory_c_outgoin_5381fd_idx"),
+                    models.Index(fields=["item", "month"], name="inventory_c_item_id_78b1ee_idx"),
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("month", "outgoing_location", "warehouse", "item"), name="uq_consumption_rollup"
+                    ),
+                ],
+            },
+        ),
+        migrations.RunSQL(
+            """
+            INSERT INTO inventory_consumptionrollup (month, outgoing_location_id, warehouse_id, item_id, qty, value)
+            SELECT date_trunc('month', h.issue_date)::date, h.outgoing_location_id, m.warehouse_id, m.item_id,
+                SUM(-m.qty_delta), SUM(-COALESCE(m.value_delta, m.qty_delta * COALESCE(m.unit_cost, 0)))
+            FROM inventory_stockmovement m
+            JOIN issuing_issueheader h ON h.id = m.reference_id
+            WHERE m.reference_type = 'issue' AND m.movement_type = 'OUT_ISSUE'
+            GROUP BY 1, 2, 3, 4
+            """,
+            migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,40 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0008_consumption_rollup"),
+        ("masters", "0005_vendor_lead_time_days"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ReorderSuggestion",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("daily_usage", models.DecimalField(decimal_places=4, max_digits=14)),
+                ("lead_time_days", models.PositiveIntegerField()),
+                ("safety_stock", models.DecimalField(decimal_places=3, max_digits=14)),
+                ("reorder_point", models.DecimalField(decimal_places=3, max_digits=14)),
+                ("on_hand", models.DecimalField(decimal_places=3, max_digits=14)),
+                ("on_order", models.DecimalField(decimal_places=3, max_digits=14)),
+                ("suggested_qty", models.DecimalField(decimal_places=3, max_digits=14)),
+                ("unit_price", models.DecimalField(blank=True, decimal_places=2, max_digits=14, null=True)),
+                ("computed_at", models.DateTimeField()),
+                ("item", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to="masters.item")),
+                (
+                    "vendor",
+                    models.ForeignKey(
+                        blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to="masters.vendor"
+                    ),
+                ),
+                ("warehouse", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to="masters.warehouse")),
+            ],
+            options={
+                "indexes": [models.Index(fields=["vendor", "warehouse"], name="inventory_r_vendor__9f7f8d_idx")],
+                "constraints": [models.UniqueConstraint(fields=("warehouse", "item"), name="uq_reorder_suggestion")],
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0009_reorder_suggestion"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="stockbalance",
+            name="last_in_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="stockbalance",
+            name="last_out_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunSQL(
+            """
+            UPDATE inventory_stockbalance b
+            SET last_in_at = m.last_in_at, last_out_at = m.last_out_at
+            FROM (
+                SELECT warehouse_id, item_id,
+                    MAX(created_at) FILTER (WHERE qty_delta > 0) AS last_in_at,
+                    MAX(created_at) FILTER (WHERE qty_delta < 0) AS last_out_at
+                FROM inventory_stockmovement
+                GROUP BY warehouse_id, item_id
+            ) m
+            WHERE m.warehouse_id = b.warehouse_id AND m.item_id = b.item_id
+            """,
+            migrations.RunSQL.noop,
+        ),
+    ]
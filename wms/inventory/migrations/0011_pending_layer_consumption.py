@@ -0,0 +1,23 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("inventory", "0010_stockbalance_last_movement"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="costlayerconsumption",
+            name="layer",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="consumptions",
+                to="inventory.costlayer",
+            ),
+        ),
+    ]
@@ -1,7 +1,17 @@
 from django.db import models
 from django.conf import settings
 from django.utils.translation import gettext_lazy as _
-from wms.masters.models import Warehouse, Item
+from wms.masters.models import Warehouse, Item, OutgoingLocation, Vendor
+
+
+class CurrentTransactionId(models.Func):
+    template = "pg_current_xact_id()::text::bigint"
+    output_field = models.BigIntegerField()
+
+
+class NextChangeSeq(models.Func):
+    template = "nextval('inventory_change_seq')"
+    output_field = models.BigIntegerField()
 
 
 class StockMovement(models.Model):
@@ -24,6 +34,8 @@ class StockMovement(models.Model):
     movement_type = models.CharField(max_length=30, choices=MOVEMENT_TYPES)
     qty_delta = models.DecimalField(max_digits=14, decimal_places=3)
     unit_cost = models.DecimalField(max_digits=14, decimal_places=2, blank=True, null=True)
+    # Signed change this movement made to StockBalance.stock_value, reversed exactly on unpost/delete.
+    value_delta = models.DecimalField(max_digits=16, decimal_places=2, blank=True, null=True)
     currency = models.CharField(max_length=10, default=settings.DEFAULT_CURRENCY)
     reference_type = models.CharField(max_length=50, blank=True)
     reference_id = models.PositiveIntegerField(blank=True, null=True)
@@ -32,11 +44,19 @@ class StockMovement(models.Model):
     override_reason = models.CharField(max_length=255, blank=True)
     created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.PROTECT)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Change feed position: the writing transaction id first, then the commit-independent sequence.
+    change_xid = models.BigIntegerField(db_default=CurrentTransactionId(), editable=False)
+    change_seq = models.BigIntegerField(db_default=NextChangeSeq(), editable=False)
 
     class Meta:
         indexes = [
             models.Index(fields=["warehouse", "item"]),
-            models.Index(fields=["created_at"]),
+            models.Index(fields=["created_at", "id"]),
+            models.Index(fields=["change_xid", "change_seq"]),
+            models.Index(fields=["warehouse", "created_at"]),
+            models.Index(fields=["item", "created_at"]),
+            models.Index(fields=["movement_type", "created_at"]),
+            models.Index(fields=["reference_type", "reference_id"]),
         ]
         permissions = [
             ("override_negative_stock", _("Can override negative stock")),
@@ -47,12 +67,146 @@ class StockBalance(models.Model):
     warehouse = models.ForeignKey(Warehouse, on_delete=models.PROTECT)
     item = models.ForeignKey(Item, on_delete=models.PROTECT)
     on_hand = models.DecimalField(max_digits=14, decimal_places=3, default=0)
+    avg_cost = models.DecimalField(max_digits=14, decimal_places=4, default=0)
+    stock_value = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    # Latest incoming and outgoing movement, kept by the posting services for the aging report.
+    last_in_at = models.DateTimeField(blank=True, null=True)
+    last_out_at = models.DateTimeField(blank=True, null=True)
+    change_xid = models.BigIntegerField(db_default=CurrentTransactionId(), editable=False)
+    change_seq = models.BigIntegerField(db_default=NextChangeSeq(), editable=False)
 
     class Meta:
         constraints = [
             models.UniqueConstraint(fields=["warehouse", "item"], name="uq_stock_balance_wh_item")
         ]
-        indexes = [models.Index(fields=["warehouse", "item"])]
+        indexes = [
+            models.Index(fields=["warehouse", "item"]),
+            models.Index(fields=["change_xid", "change_seq"]),
+        ]
+
+
+class CostLayer(models.Model):
+    warehouse = models.ForeignKey(Warehouse, on_delete=models.PROTECT)
+    item = models.ForeignKey(Item, on_delete=models.PROTECT)
+    movement = models.ForeignKey(StockMovement, on_delete=models.CASCADE, related_name="cost_layers")
+    received_at = models.DateTimeField()
+    qty = models.DecimalField(max_digits=14, decimal_places=3)
+    remaining = models.DecimalField(max_digits=14, decimal_places=3)
+    unit_cost = models.DecimalField(max_digits=14, decimal_places=4)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["warehouse", "item", "received_at", "id"],
+                condition=models.Q(remaining__gt=0),
+                name="inventory_costlayer_open_idx",
+            ),
+        ]
+
+
+class CostLayerConsumption(models.Model):
+    # No layer while stock is negative: the shortfall waits for the next receipt.
+    layer = models.ForeignKey(CostLayer, on_delete=models.CASCADE, related_name="consumptions", blank=True, null=True)
+    movement = models.ForeignKey(StockMovement, on_delete=models.CASCADE, related_name="layer_consumptions")
+    qty = models.DecimalField(max_digits=14, decimal_places=3)
+
+
+class StockSnapshot(models.Model):
+    date = models.DateField()
+    warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE)
+    item = models.ForeignKey(Item, on_delete=models.CASCADE)
+    on_hand = models.DecimalField(max_digits=14, decimal_places=3)
+    stock_value = models.DecimalField(max_digits=16, decimal_places=2)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["date", "warehouse", "item"], name="uq_stock_snapshot"),
+        ]
+
+
+class ConsumptionRollup(models.Model):
+    month = models.DateField()
+    outgoing_location = models.ForeignKey(OutgoingLocation, on_delete=models.CASCADE)
+    warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE)
+    item = models.ForeignKey(Item, on_delete=models.CASCADE)
+    qty = models.DecimalField(max_digits=16, decimal_places=3, default=0)
+    value = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["month", "outgoing_location", "warehouse", "item"], name="uq_consumption_rollup"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["outgoing_location", "month"]),
+            models.Index(fields=["item", "month"]),
+        ]
+
+
+class ReorderSuggestion(models.Model):
+    warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE)
+    item = models.ForeignKey(Item, on_delete=models.CASCADE)
+    vendor = models.ForeignKey(Vendor, on_delete=models.SET_NULL, blank=True, null=True)
+    daily_usage = models.DecimalField(max_digits=14, decimal_places=4)
+    lead_time_days = models.PositiveIntegerField()
+    safety_stock = models.DecimalField(max_digits=14, decimal_places=3)
+    reorder_point = models.DecimalField(max_digits=14, decimal_places=3)
+    on_hand = models.DecimalField(max_digits=14, decimal_places=3)
+    on_order = models.DecimalField(max_digits=14, decimal_places=3)
+    suggested_qty = models.DecimalField(max_digits=14, decimal_places=3)
+    unit_price = models.DecimalField(max_digits=14, decimal_places=2, blank=True, null=True)
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["warehouse", "item"], name="uq_reorder_suggestion"),
+        ]
+        indexes = [
+            models.Index(fields=["vendor", "warehouse"]),
+        ]
+
+
+class StockTombstone(models.Model):
+    KIND_MOVEMENT = "movement"
+    KIND_BALANCE = "balance"
+
+    KINDS = [
+        (KIND_MOVEMENT, _("Movement")),
+        (KIND_BALANCE, _("Balance")),
+    ]
+
+    kind = models.CharField(max_length=20, choices=KINDS)
+    object_id = models.BigIntegerField()
+    # Plain ids: the warehouse or item may be deleted after the row it belonged to.
+    warehouse_id = models.BigIntegerField()
+    item_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+    change_xid = models.BigIntegerField(db_default=CurrentTransactionId(), editable=False)
+    change_seq = models.BigIntegerField(db_default=NextChangeSeq(), editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["change_xid", "change_seq"]),
+            models.Index(fields=["deleted_at"]),
+        ]
+
+
+class StockOutboxEvent(models.Model):
+    event_type = models.CharField(max_length=50)
+    reference_type = models.CharField(max_length=50, blank=True)
+    reference_id = models.PositiveIntegerField(blank=True, null=True)
+    payload = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+    dispatched_at = models.DateTimeField(blank=True, null=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["id"], condition=models.Q(dispatched_at__isnull=True), name="inventory_outbox_pending_idx"),
+            models.Index(fields=["dispatched_at"]),
+        ]
 
 
 class TransferHeader(models.Model):
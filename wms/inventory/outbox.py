@@ -0,0 +1,146 @@
+import json
+import os
+import time
+import urllib.request
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import StockOutboxEvent
+
+
+def event_message(event):
+    return {
+        "id": event.id,
+        "type": event.event_type,
+        "reference": {"type": event.reference_type, "id": event.reference_id},
+        "created_at": event.created_at.isoformat(),
+        "deltas": event.payload.get("deltas", []),
+    }
+
+
+class FileSink:
+    def __init__(self, path):
+        self.path = path
+
+    def send(self, messages):
+        lines = "".join(json.dumps(message, separators=(",", ":")) + "\n" for message in messages)
+        with open(self.path, "a", encoding="utf-8") as fh:
+            fh.write(lines)
+            fh.flush()
+            os.fsync(fh.fileno())
+
+
+class WebhookSink:
+    def __init__(self, url, timeout=10):
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, messages):
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps({"events": messages}).encode(),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        # urlopen raises for non-2xx answers, which leaves the batch pending for a retry.
+        with urllib.request.urlopen(request, timeout=self.timeout):
+            pass
+
+
+class CallbackSink:
+    def __init__(self, callback):
+        self.callback = import_string(callback) if isinstance(callback, str) else callback
+
+    def send(self, messages):
+        self.callback(messages)
+
+
+SINKS = {
+    "file": FileSink,
+    "webhook": WebhookSink,
+    "callback": CallbackSink,
+}
+
+
+def build_sink(spec):
+    kind, _, target = spec.partition(":")
+    if kind not in SINKS or not target:
+        raise ValueError(f"Unknown sink {spec!r}, expected one of {', '.join(f'{name}:<target>' for name in SINKS)}")
+    return SINKS[kind](target)
+
+
+class RelayStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.batches = 0
+        self.events = 0
+        self.failures = 0
+        self.max_lag = 0.0
+
+    def as_dict(self):
+        elapsed = time.perf_counter() - self.started
+        return {
+            "batches": self.batches,
+            "events": self.events,
+            "failures": self.failures,
+            "events_per_second": round(self.events / elapsed, 1) if elapsed else 0.0,
+            "max_lag_seconds": round(self.max_lag, 3),
+        }
+
+
+def _send(sinks, messages):
+    for sink in sinks:
+        sink.send(messages)
+
+
+def relay_batch(sinks, batch_size=500, max_attempts=None, stats=None):
+    # Events stay locked until every sink accepted them and the dispatch mark commits.
+    # A crash in between redelivers the batch: delivery is at least once, so sinks must dedupe on id.
+    # When a batch fails it is retried event by event, so one event a sink keeps rejecting
+    # only holds back itself until max_attempts parks it.
+    failed = []
+    with transaction.atomic():
+        pending = StockOutboxEvent.objects.filter(dispatched_at__isnull=True)
+        if max_attempts:
+            pending = pending.filter(attempts__lt=max_attempts)
+        events = list(pending.order_by("id").select_for_update(skip_locked=True)[:batch_size])
+        if not events:
+            return 0
+        messages = [event_message(event) for event in events]
+        delivered = events
+        try:
+            _send(sinks, messages)
+        except Exception as exc:
+            if len(events) == 1:
+                delivered, failed = [], [(events[0], exc)]
+            else:
+                delivered = []
+                for event, message in zip(events, messages):
+                    try:
+                        _send(sinks, [message])
+                    except Exception as event_exc:
+                        failed.append((event, event_exc))
+                    else:
+                        delivered.append(event)
+        for event, exc in failed:
+            StockOutboxEvent.objects.filter(id=event.id).update(
+                attempts=F("attempts") + 1, last_error=f"{type(exc).__name__}: {exc}"[:1000]
+            )
+        now = timezone.now()
+        StockOutboxEvent.objects.filter(id__in=[event.id for event in delivered]).update(
+            dispatched_at=now, attempts=F("attempts") + 1, last_error=""
+        )
+
+    if stats is not None:
+        if delivered:
+            stats.batches += 1
+            stats.events += len(delivered)
+            stats.max_lag = max(stats.max_lag, (now - delivered[0].created_at).total_seconds())
+        if failed:
+            stats.failures += 1
+    if failed:
+        raise failed[0][1]
+    return len(delivered)
@@ -0,0 +1,642 @@
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, DecimalField, Max, Min, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from wms.masters.models import Item, Vendor, VendorItem, Warehouse
+from wms.purchasing.models import PurchaseHeader, PurchaseLine, VendorPriceHistory
+from .models import ConsumptionRollup, CostLayer, ReorderSuggestion, StockBalance, StockMovement, StockSnapshot
+from .services import quantize_money
+
+
+def day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+@transaction.atomic
+def take_stock_snapshot(day):
+    # The balances minus everything recorded after `day` is the stock at the end of that day,
+    # so the nightly job may run late without the snapshot picking up the next day's movements.
+    # One INSERT ... SELECT reads balances and movements from the same database snapshot.
+    StockSnapshot.objects.filter(date=day).delete()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {StockSnapshot._meta.db_table} (date, warehouse_id, item_id, on_hand, stock_value)
+            SELECT %s, warehouse_id, item_id, SUM(qty), SUM(value)
+            FROM (
+                SELECT warehouse_id, item_id, on_hand AS qty, stock_value AS value
+                FROM {StockBalance._meta.db_table}
+                UNION ALL
+                SELECT warehouse_id, item_id, -qty_delta, -COALESCE(value_delta, 0)
+                FROM {StockMovement._meta.db_table}
+                WHERE created_at >= %s
+            ) positions
+            GROUP BY warehouse_id, item_id
+            HAVING SUM(qty) <> 0 OR SUM(value) <> 0
+            """,
+            [day, day_start(day + timedelta(days=1))],
+        )
+        return cursor.rowcount
+
+
+def stock_positions_sql(as_of=None):
+    # SQL and params yielding (warehouse_id, item_id, qty, value) rows that sum up to the stock
+    # at the end of `as_of`: the latest snapshot on or before it plus the movements since,
+    # or the live balances minus later movements when there is no snapshot to start from.
+    if as_of is None:
+        return (
+            f"SELECT warehouse_id, item_id, on_hand AS qty, stock_value AS value FROM {StockBalance._meta.db_table}",
+            [],
+        )
+    until = day_start(as_of + timedelta(days=1))
+    snapshot = (
+        StockSnapshot.objects.filter(date__lte=as_of).order_by("-date").values_list("date", flat=True).first()
+    )
+    if snapshot is None:
+        return (
+            f"""
+            SELECT warehouse_id, item_id, on_hand AS qty, stock_value AS value FROM {StockBalance._meta.db_table}
+            UNION ALL
+            SELECT warehouse_id, item_id, -qty_delta, -COALESCE(value_delta, 0)
+            FROM {StockMovement._meta.db_table} WHERE created_at >= %s
+            """,
+            [until],
+        )
+    return (
+        f"""
+        SELECT warehouse_id, item_id, on_hand AS qty, stock_value AS value
+        FROM {StockSnapshot._meta.db_table} WHERE date = %s
+        UNION ALL
+        SELECT warehouse_id, item_id, qty_delta, COALESCE(value_delta, 0)
+        FROM {StockMovement._meta.db_table} WHERE created_at >= %s AND created_at < %s
+        """,
+        [snapshot, day_start(snapshot + timedelta(days=1)), until],
+    )
+
+
+VALUATION_GROUPS = {
+    "warehouse": ("w.id", "w.name", ""),
+    "category": ("NULL", "i.category", ""),
+    "vendor": (
+        "v.id",
+        "v.name",
+        f"""
+        LEFT JOIN (
+            SELECT DISTINCT ON (pl.item_id) pl.item_id, ph.vendor_id
+            FROM {PurchaseLine._meta.db_table} pl
+            JOIN {PurchaseHeader._meta.db_table} ph ON ph.id = pl.purchase_id
+            WHERE ph.is_posted AND ph.invoice_date <= %s
+            ORDER BY pl.item_id, ph.invoice_date DESC, pl.id DESC
+        ) lp ON lp.item_id = s.item_id
+        LEFT JOIN {Vendor._meta.db_table} v ON v.id = lp.vendor_id
+        """,
+    ),
+}
+
+
+def stock_valuation(group_by="warehouse", as_of=None, warehouse_ids=None):
+    # Vendor rollups attribute an item's stock to the vendor of its latest posted purchase.
+    key, label, joins = VALUATION_GROUPS[group_by]
+    positions, params = stock_positions_sql(as_of)
+    join_params = [as_of or timezone.localdate()] if joins else []
+    warehouse_filter = ""
+    if warehouse_ids is not None:
+        warehouse_filter = "WHERE warehouse_id = ANY(%s)"
+        params = params + [list(warehouse_ids)]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            WITH stock AS (
+                SELECT warehouse_id, item_id, SUM(qty) AS qty, SUM(value) AS value
+                FROM ({positions}) positions
+                {warehouse_filter}
+                GROUP BY warehouse_id, item_id
+                HAVING SUM(qty) <> 0 OR SUM(value) <> 0
+            )
+            SELECT {key}, {label}, COUNT(DISTINCT s.item_id), SUM(s.qty), SUM(s.value)
+            FROM stock s
+            JOIN {Warehouse._meta.db_table} w ON w.id = s.warehouse_id
+            JOIN {Item._meta.db_table} i ON i.id = s.item_id
+            {joins}
+            GROUP BY 1, 2
+            ORDER BY 5 DESC, 2
+            """,
+            params + join_params,
+        )
+        return [
+            {"id": row_id, "label": row_label or "", "items": items, "qty": qty, "value": quantize_money(value)}
+            for row_id, row_label, items, qty, value in cursor.fetchall()
+        ]
+
+
+PERIOD_COLUMNS = [
+    ("purchased", StockMovement.TYPE_IN_PURCHASE),
+    ("issued", StockMovement.TYPE_OUT_ISSUE),
+    ("transferred_in", StockMovement.TYPE_TRANSFER_IN),
+    ("transferred_out", StockMovement.TYPE_TRANSFER_OUT),
+    ("adjusted", StockMovement.TYPE_ADJUSTMENT),
+]
+PERIOD_SUMMARY_FIELDS = (
+    ["warehouse_id", "warehouse", "item_id", "item", "unit", "opening"]
+    + [name for name, movement_type in PERIOD_COLUMNS]
+    + ["closing"]
+)
+
+
+def period_summary_sql(date_from, date_to, warehouse_ids=None):
+    # One pass over the movements with a conditional aggregate per column. Opening balances
+    # are seeded from the latest snapshot before the period plus the movements in between, or
+    # from the live balances minus everything since the period started when there is no snapshot.
+    start = day_start(date_from)
+    end = day_start(date_to + timedelta(days=1))
+    snapshot = (
+        StockSnapshot.objects.filter(date__lt=date_from).order_by("-date").values_list("date", flat=True).first()
+    )
+    if snapshot is None:
+        seed = f"SELECT warehouse_id, item_id, on_hand AS qty FROM {StockBalance._meta.db_table}"
+        seed_params = []
+        scan = "created_at >= %s"
+        scan_params = [start]
+        opening = "COALESCE(s.qty, 0) - COALESCE(m.net, 0)"
+    else:
+        seed = f"SELECT warehouse_id, item_id, on_hand AS qty FROM {StockSnapshot._meta.db_table} WHERE date = %s"
+        seed_params = [snapshot]
+        scan = "created_at >= %s AND created_at < %s"
+        scan_params = [day_start(snapshot + timedelta(days=1)), end]
+        opening = "COALESCE(s.qty, 0) + COALESCE(m.before_period, 0)"
+
+    in_period = "created_at >= %s AND created_at < %s"
+    columns = ",\n".join(
+        f"SUM(qty_delta) FILTER (WHERE {in_period} AND movement_type = %s) AS {name}" for name, _ in PERIOD_COLUMNS
+    )
+    column_params = [param for name, movement_type in PERIOD_COLUMNS for param in (start, end, movement_type)]
+    period_total = " + ".join(f"COALESCE(m.{name}, 0)" for name, _ in PERIOD_COLUMNS)
+    warehouse_filter = ""
+    filter_params = []
+    if warehouse_ids is not None:
+        warehouse_filter = "AND warehouse_id = ANY(%s)"
+        filter_params = [list(warehouse_ids)]
+
+    sql = f"""
+        WITH moves AS (
+            SELECT warehouse_id, item_id,
+                SUM(qty_delta) AS net,
+                SUM(qty_delta) FILTER (WHERE created_at < %s) AS before_period,
+                {columns}
+            FROM {StockMovement._meta.db_table}
+            WHERE {scan} {warehouse_filter}
+            GROUP BY warehouse_id, item_id
+        ),
+        seed AS (
+            SELECT * FROM ({seed}) seed WHERE TRUE {warehouse_filter}
+        ),
+        summary AS (
+            SELECT COALESCE(s.warehouse_id, m.warehouse_id) AS warehouse_id,
+                COALESCE(s.item_id, m.item_id) AS item_id,
+                {opening} AS opening,
+                {", ".join(f"COALESCE(m.{name}, 0) AS {name}" for name, _ in PERIOD_COLUMNS)},
+                {period_total} AS period_total
+            FROM seed s FULL JOIN moves m ON m.warehouse_id = s.warehouse_id AND m.item_id = s.item_id
+        )
+        SELECT w.id, w.name, i.id, i.name, i.unit, t.opening::numeric(14, 3),
+            {", ".join(f"t.{name}::numeric(14, 3)" for name, _ in PERIOD_COLUMNS)},
+            (t.opening + t.period_total)::numeric(14, 3)
+        FROM summary t
+        JOIN {Warehouse._meta.db_table} w ON w.id = t.warehouse_id
+        JOIN {Item._meta.db_table} i ON i.id = t.item_id
+        WHERE t.opening <> 0 OR {" OR ".join(f"t.{name} <> 0" for name, _ in PERIOD_COLUMNS)}
+        ORDER BY w.name, i.name, w.id, i.id
+    """
+    params = [start] + column_params + scan_params + filter_params + seed_params + filter_params
+    return sql, params
+
+
+def period_summary(date_from, date_to, warehouse_ids=None):
+    sql, params = period_summary_sql(date_from, date_to, warehouse_ids)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [dict(zip(PERIOD_SUMMARY_FIELDS, row)) for row in cursor.fetchall()]
+
+
+def iter_period_summary(date_from, date_to, warehouse_ids=None, chunk_size=2000):
+    # Rows come from a server-side cursor so exports stream without loading the whole report.
+    sql, params = period_summary_sql(date_from, date_to, warehouse_ids)
+    with connection.chunked_cursor() as cursor:
+        cursor.execute(sql, params)
+        while rows := cursor.fetchmany(chunk_size):
+            yield from rows
+
+
+# Group name -> {rollup lookup: output column}
+CONSUMPTION_GROUPS = {
+    "location": {"outgoing_location": "location", "outgoing_location__name": "location_name"},
+    "item": {"item": "item", "item__name": "item_name", "item__unit": "unit"},
+    "category": {"item__category": "category"},
+    "month": {"month": "month"},
+}
+
+
+def consumption_summary(group_by=("location",), month_from=None, month_to=None, location_ids=None,
+                        warehouse_ids=None, item_ids=None, category=None):
+    # Reads only the monthly rollup that the issue services maintain, never the issue lines.
+    rows = ConsumptionRollup.objects.all()
+    if month_from is not None:
+        rows = rows.filter(month__gte=month_from.replace(day=1))
+    if month_to is not None:
+        rows = rows.filter(month__lte=month_to.replace(day=1))
+    if location_ids is not None:
+        rows = rows.filter(outgoing_location_id__in=location_ids)
+    if warehouse_ids is not None:
+        rows = rows.filter(warehouse_id__in=warehouse_ids)
+    if item_ids is not None:
+        rows = rows.filter(item_id__in=item_ids)
+    if category:
+        rows = rows.filter(item__category=category)
+
+    columns = {}
+    for group in group_by:
+        columns.update(CONSUMPTION_GROUPS[group])
+    ordering = (["month"] if "month" in group_by else []) + ["-value"]
+    rows = (
+        rows.values(*columns)
+        .annotate(qty=Sum("qty"), value=Sum("value"))
+        .exclude(qty=0, value=0)
+        .order_by(*ordering, *columns)
+    )
+    return [
+        {**{name: row[lookup] for lookup, name in columns.items()}, "qty": row["qty"], "value": row["value"]}
+        for row in rows
+    ]
+
+
+def _price_rows(month_from=None, month_to=None, vendor_ids=None, item_ids=None, currency=None):
+    rows = VendorPriceHistory.objects.all()
+    if month_from is not None:
+        rows = rows.filter(month__gte=month_from.replace(day=1))
+    if month_to is not None:
+        rows = rows.filter(month__lte=month_to.replace(day=1))
+    if vendor_ids is not None:
+        rows = rows.filter(vendor_id__in=vendor_ids)
+    if item_ids is not None:
+        rows = rows.filter(item_id__in=item_ids)
+    if currency:
+        rows = rows.filter(currency=currency)
+    return rows
+
+
+def vendor_spend(month_from=None, month_to=None, vendor_id=None, currency=None):
+    # Spend per vendor, or per item of one vendor, from the monthly price history.
+    rows = _price_rows(month_from, month_to, [vendor_id] if vendor_id else None, currency=currency)
+    if vendor_id:
+        columns = ["item", "item__name", "item__unit", "currency"]
+    else:
+        columns = ["vendor", "vendor__name", "currency"]
+    rows = (
+        rows.values(*columns)
+        .annotate(
+            lines=Sum("line_count"),
+            items=Count("item", distinct=True),
+            qty=Sum("qty"),
+            spend=Sum("spend"),
+            min_price=Min("min_price"),
+            max_price=Max("max_price"),
+            last_date=Max("last_date"),
+        )
+        .order_by("-spend", *columns)
+    )
+    rows = list(rows)
+    for row in rows:
+        row["avg_price"] = quantize_money(row["spend"] / row["qty"]) if row["qty"] else None
+    return rows
+
+
+def price_history(item_id, month_from=None, currency=None):
+    # Monthly price points per vendor, oldest first, for charting one item.
+    rows = (
+        _price_rows(month_from, item_ids=[item_id], currency=currency)
+        .select_related("vendor")
+        .order_by("vendor__name", "vendor_id", "currency", "month")
+    )
+    series = {}
+    for row in rows:
+        line = series.setdefault(
+            (row.vendor_id, row.currency),
+            {"vendor": row.vendor_id, "vendor_name": row.vendor.name, "currency": row.currency, "points": []},
+        )
+        line["points"].append(
+            {
+                "month": row.month,
+                "min": row.min_price,
+                "max": row.max_price,
+                "avg": row.avg_price,
+                "last": row.last_price,
+                "qty": row.qty,
+                "spend": row.spend,
+            }
+        )
+    return list(series.values())
+
+
+def best_recent_price(item_id, currency=None, months=6):
+    # Lowest latest price among the vendors that sold the item within the last `months`.
+    today = timezone.localdate()
+    year, month = divmod(today.year * 12 + today.month - months, 12)
+    since = today.replace(year=year, month=month + 1, day=1)
+    latest = (
+        _price_rows(since, item_ids=[item_id], currency=currency)
+        .order_by("vendor_id", "currency", "-month")
+        .distinct("vendor_id", "currency")
+        .values("vendor", "vendor__name", "currency", "last_price", "last_date")
+    )
+    best = min(latest, key=lambda row: (row["last_price"], -row["last_date"].toordinal()), default=None)
+    if best is None:
+        return None
+    return {
+        "vendor": best["vendor"],
+        "vendor_name": best["vendor__name"],
+        "currency": best["currency"],
+        "price": best["last_price"],
+        "date": best["last_date"],
+    }
+
+
+@transaction.atomic
+def compute_reorder_suggestions(lookback_months=3, safety_days=7, cover_days=30, warehouse_ids=None):
+    # Daily usage is what the warehouse issued since the start of the lookback window, from the
+    # monthly consumption rollup. An item is due when on hand plus draft purchases falls to the
+    # reorder point (usage over the preferred vendor's lead time plus safety stock), and the
+    # suggestion refills it to cover `cover_days` more. One INSERT ... SELECT handles every item.
+    today = timezone.localdate()
+    year, month = divmod(today.year * 12 + today.month - 1 - lookback_months, 12)
+    since = today.replace(year=year, month=month + 1, day=1)
+    days = (today - since).days + 1
+
+    suggestions = ReorderSuggestion.objects.all()
+    warehouse_filter = ""
+    params = {
+        "since": since,
+        "days": days,
+        "safety_days": safety_days,
+        "cover_days": cover_days,
+        "default_lead": Vendor._meta.get_field("lead_time_days").default,
+        "currency": settings.DEFAULT_CURRENCY,
+        "now": timezone.now(),
+    }
+    if warehouse_ids:
+        suggestions = suggestions.filter(warehouse_id__in=warehouse_ids)
+        warehouse_filter = "AND s.warehouse_id = ANY(%(warehouse_ids)s)"
+        params["warehouse_ids"] = list(warehouse_ids)
+    suggestions.delete()
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            WITH usage AS (
+                SELECT warehouse_id, item_id, SUM(qty) AS qty
+                FROM {ConsumptionRollup._meta.db_table}
+                WHERE month >= %(since)s
+                GROUP BY warehouse_id, item_id
+            ),
+            stock AS (
+                SELECT COALESCE(b.warehouse_id, u.warehouse_id) AS warehouse_id,
+                       COALESCE(b.item_id, u.item_id) AS item_id,
+                       COALESCE(b.on_hand, 0) AS on_hand,
+                       COALESCE(u.qty, 0) / %(days)s AS daily
+                FROM {StockBalance._meta.db_table} b
+                FULL JOIN usage u ON u.warehouse_id = b.warehouse_id AND u.item_id = b.item_id
+            ),
+            preferred AS (
+                SELECT DISTINCT ON (vi.item_id) vi.item_id, vi.vendor_id, v.lead_time_days
+                FROM {VendorItem._meta.db_table} vi
+                JOIN {Vendor._meta.db_table} v ON v.id = vi.vendor_id
+                WHERE vi.preferred AND v.is_active
+                ORDER BY vi.item_id, vi.vendor_id
+            ),
+            on_order AS (
+                SELECT h.warehouse_id, l.item_id, SUM(l.qty) AS qty
+                FROM {PurchaseLine._meta.db_table} l
+                JOIN {PurchaseHeader._meta.db_table} h ON h.id = l.purchase_id
+                WHERE NOT h.is_posted
+                GROUP BY h.warehouse_id, l.item_id
+            ),
+            plan AS (
+                SELECT s.warehouse_id, s.item_id, p.vendor_id, s.daily, s.on_hand,
+                       COALESCE(p.lead_time_days, %(default_lead)s) AS lead_time_days,
+                       COALESCE(o.qty, 0) AS on_order,
+                       GREATEST(i.min_stock, s.daily * %(safety_days)s) AS safety_stock
+                FROM stock s
+                JOIN {Item._meta.db_table} i ON i.id = s.item_id AND i.is_active
+                JOIN {Warehouse._meta.db_table} w ON w.id = s.warehouse_id AND w.is_active
+                LEFT JOIN preferred p ON p.item_id = s.item_id
+                LEFT JOIN on_order o ON o.warehouse_id = s.warehouse_id AND o.item_id = s.item_id
+                WHERE TRUE {warehouse_filter}
+            )
+            INSERT INTO {ReorderSuggestion._meta.db_table} (
+                warehouse_id, item_id, vendor_id, daily_usage, lead_time_days, safety_stock, reorder_point,
+                on_hand, on_order, suggested_qty, unit_price, computed_at
+            )
+            SELECT plan.warehouse_id, plan.item_id, plan.vendor_id, ROUND(daily, 4), lead_time_days,
+                   ROUND(safety_stock, 3), ROUND(daily * lead_time_days + safety_stock, 3), on_hand, on_order,
+                   ROUND(daily * (lead_time_days + %(cover_days)s) + safety_stock - on_hand - on_order, 3),
+                   price.last_price, %(now)s
+            FROM plan
+            LEFT JOIN LATERAL (
+                SELECT last_price
+                FROM {VendorPriceHistory._meta.db_table} ph
+                WHERE ph.vendor_id = plan.vendor_id AND ph.item_id = plan.item_id AND ph.currency = %(currency)s
+                ORDER BY ph.month DESC
+                LIMIT 1
+            ) price ON TRUE
+            WHERE on_hand + on_order <= daily * lead_time_days + safety_stock
+              AND ROUND(daily * (lead_time_days + %(cover_days)s) + safety_stock - on_hand - on_order, 3) > 0
+            """,
+            params,
+        )
+        return cursor.rowcount
+
+
+@transaction.atomic
+def classify_items(months=12, a_share=Decimal("0.80"), b_share=Decimal("0.95"), x_cv=Decimal("0.5"), y_cv=Decimal("1.0")):
+    # ABC ranks items by issued value over the last `months` complete months: the items making up
+    # the first `a_share` of the total are A, up to `b_share` B, the rest C. XYZ is the coefficient
+    # of variation of the monthly issued quantity, months without issues counting as zero.
+    # Items without issues in the window are left unclassified.
+    today = timezone.localdate()
+    until = today.replace(day=1)
+    year, month = divmod(until.year * 12 + until.month - 1 - months, 12)
+    since = until.replace(year=year, month=month + 1)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            WITH monthly AS (
+                SELECT item_id, month, SUM(qty) AS qty, SUM(value) AS value
+                FROM {ConsumptionRollup._meta.db_table}
+                WHERE month >= %(since)s AND month < %(until)s
+                GROUP BY item_id, month
+            ),
+            stats AS (
+                SELECT item_id, SUM(value) AS value,
+                       SUM(qty) / %(months)s AS mean,
+                       SUM(qty * qty) / %(months)s AS mean_square
+                FROM monthly
+                GROUP BY item_id
+                HAVING SUM(qty) > 0
+            ),
+            classes AS (
+                SELECT item_id,
+                       CASE
+                           WHEN share_before < %(a_share)s THEN 'A'
+                           WHEN share_before < %(b_share)s THEN 'B'
+                           ELSE 'C'
+                       END AS abc,
+                       CASE
+                           WHEN SQRT(GREATEST(mean_square - mean * mean, 0)) / mean <= %(x_cv)s THEN 'X'
+                           WHEN SQRT(GREATEST(mean_square - mean * mean, 0)) / mean <= %(y_cv)s THEN 'Y'
+                           ELSE 'Z'
+                       END AS xyz
+                FROM (
+                    SELECT item_id, mean, mean_square,
+                           COALESCE(
+                               (SUM(value) OVER (ORDER BY value DESC, item_id ROWS UNBOUNDED PRECEDING) - value)
+                               / NULLIF(SUM(value) OVER (), 0),
+                               1
+                           ) AS share_before
+                    FROM stats
+                ) ranked
+            )
+            UPDATE {Item._meta.db_table} item
+            SET abc_class = COALESCE(classes.abc, ''),
+                xyz_class = COALESCE(classes.xyz, ''),
+                classified_at = %(now)s
+            FROM {Item._meta.db_table} source
+            LEFT JOIN classes ON classes.item_id = source.id
+            WHERE item.id = source.id
+            """,
+            {
+                "since": since,
+                "until": until,
+                "months": months,
+                "a_share": a_share,
+                "b_share": b_share,
+                "x_cv": x_cv,
+                "y_cv": y_cv,
+                "now": timezone.now(),
+            },
+        )
+    counts = Item.objects.exclude(abc_class="").values_list("abc_class", "xyz_class").annotate(count=Count("id"))
+    return {abc + xyz: count for abc, xyz, count in counts}
+
+
+# Bucket name -> oldest age in days it holds, the last bucket takes everything older.
+AGING_BUCKETS = [("d30", 30), ("d90", 90), ("d180", 180), ("d365", 365), ("older", None)]
+AGING_BASES = ("movement", "receipt")
+AGING_FIELDS = (
+    ["warehouse_id", "warehouse", "item_id", "item", "unit", "category", "since", "qty", "value"]
+    + [f"{kind}_{name}" for name, days in AGING_BUCKETS for kind in ("qty", "value")]
+)
+
+
+def stock_aging_sql(basis="movement", warehouse_ids=None, min_days=None, category=None):
+    # Positions are dated by the balance's latest movement either way ("movement"), or split
+    # into their open FIFO layers dated by receipt ("receipt"). Each position falls into one
+    # age bucket and the buckets are summed per warehouse and item in the same pass.
+    today = timezone.localdate()
+    if basis == "receipt":
+        positions = f"""
+            SELECT warehouse_id, item_id, received_at AS since, remaining AS qty,
+                ROUND(remaining * unit_cost, 2) AS value
+            FROM {CostLayer._meta.db_table}
+            WHERE remaining > 0
+        """
+    else:
+        positions = f"""
+            SELECT warehouse_id, item_id, GREATEST(last_in_at, last_out_at) AS since, on_hand AS qty,
+                stock_value AS value
+            FROM {StockBalance._meta.db_table}
+            WHERE on_hand > 0
+        """
+
+    columns = []
+    column_params = []
+    newer = None
+    for name, days in AGING_BUCKETS:
+        conditions = []
+        bucket_params = []
+        if days is not None:
+            conditions.append("p.since >= %s")
+            bucket_params.append(day_start(today - timedelta(days=days)))
+        if newer is not None:
+            conditions.append("p.since < %s" if days is not None else "(p.since < %s OR p.since IS NULL)")
+            bucket_params.append(newer)
+        newer = bucket_params[0] if days is not None else None
+        condition = " AND ".join(conditions)
+        columns.append(f"COALESCE(SUM(p.qty) FILTER (WHERE {condition}), 0)::numeric(14, 3)")
+        columns.append(f"COALESCE(SUM(p.value) FILTER (WHERE {condition}), 0)::numeric(16, 2)")
+        column_params.extend(bucket_params * 2)
+
+    filters = []
+    filter_params = []
+    if warehouse_ids is not None:
+        filters.append("p.warehouse_id = ANY(%s)")
+        filter_params.append(list(warehouse_ids))
+    if category:
+        filters.append("i.category = %s")
+        filter_params.append(category)
+    having = ""
+    having_params = []
+    if min_days:
+        having = "HAVING MAX(p.since) < %s OR MAX(p.since) IS NULL"
+        having_params.append(day_start(today - timedelta(days=min_days - 1)))
+
+    sql = f"""
+        SELECT w.id, w.name, i.id, i.name, i.unit, i.category, MIN(p.since),
+            SUM(p.qty)::numeric(14, 3), SUM(p.value)::numeric(16, 2),
+            {", ".join(columns)}
+        FROM ({positions}) p
+        JOIN {Warehouse._meta.db_table} w ON w.id = p.warehouse_id
+        JOIN {Item._meta.db_table} i ON i.id = p.item_id
+        {"WHERE " + " AND ".join(filters) if filters else ""}
+        GROUP BY w.id, i.id
+        {having}
+        ORDER BY MIN(p.since) NULLS FIRST, w.name, i.name, w.id, i.id
+    """
+    return sql, column_params + filter_params + having_params
+
+
+def stock_aging(basis="movement", warehouse_ids=None, min_days=None, category=None):
+    sql, params = stock_aging_sql(basis, warehouse_ids, min_days, category)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [dict(zip(AGING_FIELDS, row)) for row in cursor.fetchall()]
+
+
+def iter_stock_aging(basis="movement", warehouse_ids=None, min_days=None, category=None, chunk_size=2000):
+    sql, params = stock_aging_sql(basis, warehouse_ids, min_days, category)
+    with connection.chunked_cursor() as cursor:
+        cursor.execute(sql, params)
+        while rows := cursor.fetchmany(chunk_size):
+            yield from rows
+
+
+def stock_matrix(items, warehouse_ids):
+    # One row per item with a conditional SUM per warehouse column, all in one grouped pass over the balances.
+    # Filtering by id keeps search joins on `items` from multiplying the sums.
+    qty = DecimalField(max_digits=14, decimal_places=3)
+    money = DecimalField(max_digits=16, decimal_places=2)
+    columns = {
+        f"wh_{warehouse_id}": Coalesce(
+            Sum("stockbalance__on_hand", filter=Q(stockbalance__warehouse_id=warehouse_id)), Value(0, output_field=qty)
+        )
+        for warehouse_id in warehouse_ids
+    }
+    in_scope = Q(stockbalance__warehouse_id__in=warehouse_ids)
+    return Item.objects.filter(pk__in=items.values("pk")).annotate(
+        **columns,
+        total=Coalesce(Sum("stockbalance__on_hand", filter=in_scope), Value(0, output_field=qty)),
+        total_value=Coalesce(Sum("stockbalance__stock_value", filter=in_scope), Value(0, output_field=money)),
+    )
@@ -1,31 +1,40 @@
 from rest_framework import serializers
+from wms.serializers import ExpandableFieldsMixin, SparseFieldsMixin, FastListSerializer
 from .models import StockBalance, StockMovement, TransferHeader, TransferLine, AdjustmentHeader, AdjustmentLine
 
 
-class StockBalanceSerializer(serializers.ModelSerializer):
+class StockBalanceSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = StockBalance
+        list_serializer_class = FastListSerializer
         fields = "__all__"
 
 
-class StockMovementSerializer(serializers.ModelSerializer):
+class StockMovementSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = StockMovement
+        list_serializer_class = FastListSerializer
         fields = "__all__"
         read_only_fields = ["created_by", "created_at"]
 
 
-class TransferLineSerializer(serializers.ModelSerializer):
+class TransferLineSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    item_code = serializers.CharField(source="item.internal_code", read_only=True)
+    item_name = serializers.CharField(source="item.name", read_only=True)
+
     class Meta:
         model = TransferLine
-        fields = ["id", "item", "qty"]
+        list_serializer_class = FastListSerializer
+        fields = ["id", "item", "qty", "item_code", "item_name"]
+        expandable_fields = {"item": ["item_code", "item_name"]}
 
 
-class TransferSerializer(serializers.ModelSerializer):
+class TransferSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     lines = TransferLineSerializer(many=True)
 
     class Meta:
         model = TransferHeader
+        list_serializer_class = FastListSerializer
         fields = [
             "id",
             "from_warehouse",
@@ -39,7 +48,7 @@ class TransferSerializer(serializers.ModelSerializer):
             "posted_at",
             "lines",
         ]
-        read_only_fields = ["created_by", "created_at", "updated_at", "posted_at"]
+        read_only_fields = ["created_by", "created_at", "updated_at", "is_posted", "posted_at"]
 
     def create(self, validated_data):
         lines_data = validated_data.pop("lines")
@@ -49,17 +58,23 @@ class TransferSerializer(serializers.ModelSerializer):
         return transfer
 
 
-class AdjustmentLineSerializer(serializers.ModelSerializer):
+class AdjustmentLineSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    item_code = serializers.CharField(source="item.internal_code", read_only=True)
+    item_name = serializers.CharField(source="item.name", read_only=True)
+
     class Meta:
         model = AdjustmentLine
-        fields = ["id", "item", "qty_delta"]
+        list_serializer_class = FastListSerializer
+        fields = ["id", "item", "qty_delta", "item_code", "item_name"]
+        expandable_fields = {"item": ["item_code", "item_name"]}
 
 
-class AdjustmentSerializer(serializers.ModelSerializer):
+class AdjustmentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     lines = AdjustmentLineSerializer(many=True)
 
     class Meta:
         model = AdjustmentHeader
+        list_serializer_class = FastListSerializer
         fields = [
             "id",
             "warehouse",
@@ -73,7 +88,7 @@ class AdjustmentSerializer(serializers.ModelSerializer):
             "posted_at",
             "lines",
         ]
-        read_only_fields = ["created_by", "created_at", "updated_at", "posted_at"]
+        read_only_fields = ["created_by", "created_at", "updated_at", "is_posted", "posted_at"]
 
     def create(self, validated_data):
         lines_data = validated_data.pop("lines")
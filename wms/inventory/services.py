@@ -1,11 +1,25 @@
 from decimal import Decimal, ROUND_HALF_UP
-from collections import defaultdict
+import bisect
+from collections import defaultdict, deque
 from django.conf import settings
-from django.db import transaction
+from django.db import connection, transaction
+from django.db.models import DecimalField, F, Sum
 from django.utils import timezone
-from django.core.exceptions import PermissionDenied
-from wms.inventory.models import StockBalance, StockMovement, TransferHeader, AdjustmentHeader
-from wms.purchasing.models import PurchaseHeader
+from django.core.exceptions import PermissionDenied, ValidationError
+from wms.inventory.models import (
+    StockBalance,
+    StockMovement,
+    StockTombstone,
+    StockOutboxEvent,
+    CostLayer,
+    CostLayerConsumption,
+    ConsumptionRollup,
+    ReorderSuggestion,
+    StockSnapshot,
+    TransferHeader,
+    AdjustmentHeader,
+)
+from wms.purchasing.models import PurchaseHeader, PurchaseLine, VendorPriceHistory
 from wms.issuing.models import IssueHeader
 
 
@@ -17,9 +31,340 @@ def quantize_money(value: Decimal) -> Decimal:
     return value.quantize(Decimal(settings.QUANT_MONEY), rounding=ROUND_HALF_UP)
 
 
+def quantize_cost(value: Decimal) -> Decimal:
+    return value.quantize(Decimal(settings.QUANT_COST), rounding=ROUND_HALF_UP)
+
+
+def value_movement(on_hand, stock_value, avg_cost, qty_delta, unit_cost=None, value_delta=None):
+    # Weighted average cost: receipts with a known cost blend into the average,
+    # everything else moves at the current average. Returns the movement's
+    # (value_delta, unit_cost) and the balance's new (stock_value, avg_cost).
+    new_on_hand = quantize_qty(on_hand + qty_delta)
+    if value_delta is None:
+        if qty_delta > 0 and unit_cost is not None:
+            value_delta = quantize_money(qty_delta * unit_cost)
+        elif new_on_hand == 0:
+            value_delta = -stock_value
+        else:
+            value_delta = quantize_money(qty_delta * avg_cost)
+    if unit_cost is None:
+        unit_cost = quantize_money(abs(value_delta / qty_delta)) if qty_delta else quantize_money(avg_cost)
+    stock_value = stock_value + value_delta
+    if new_on_hand > 0:
+        avg_cost = quantize_cost(stock_value / new_on_hand)
+    return value_delta, unit_cost, stock_value, avg_cost
+
+
+def movement_value(movement):
+    if movement.value_delta is not None:
+        return movement.value_delta
+    return quantize_money(movement.qty_delta * (movement.unit_cost or 0))
+
+
+def restore_balance(balance, qty_change, value_change=None):
+    # Takes posted stock back out (or puts it back) at the value it was posted with.
+    if value_change is None:
+        value_change = quantize_money(qty_change * balance.avg_cost)
+    balance.on_hand = quantize_qty(balance.on_hand + qty_change)
+    balance.stock_value = balance.stock_value + value_change
+    if balance.on_hand > 0:
+        balance.avg_cost = quantize_cost(balance.stock_value / balance.on_hand)
+    save_balance(balance)
+
+
+BALANCE_CHANNEL = "stock_balance"
+BALANCE_NOTIFY_SQL = (
+    f"pg_notify('{BALANCE_CHANNEL}', "
+    "json_build_object('warehouse', warehouse_id, 'item', item_id, 'on_hand', on_hand::text, "
+    "'stock_value', stock_value::text)::text)"
+)
+
+# Every balance write moves the row to the head of the change feed and queues a NOTIFY,
+# which PostgreSQL only delivers if the transaction commits.
+BALANCE_CHANGED_SQL = f"""
+    UPDATE {StockBalance._meta.db_table} SET
+        {{assignments}}
+        change_xid = pg_current_xact_id()::text::bigint,
+        change_seq = nextval('inventory_change_seq')
+    WHERE id = ANY(%s)
+    RETURNING id, change_xid, change_seq, {BALANCE_NOTIFY_SQL}
+"""
+
+
+def save_balance(balance):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            BALANCE_CHANGED_SQL.format(
+                assignments="on_hand = %s, avg_cost = %s, stock_value = %s, last_in_at = %s, last_out_at = %s,"
+            ),
+            [
+                balance.on_hand,
+                balance.avg_cost,
+                balance.stock_value,
+                balance.last_in_at,
+                balance.last_out_at,
+                [balance.pk],
+            ],
+        )
+        pk, balance.change_xid, balance.change_seq, _ = cursor.fetchone()
+
+
+def mark_movement_time(balance, qty_delta, at):
+    if qty_delta > 0:
+        balance.last_in_at = at
+    elif qty_delta < 0:
+        balance.last_out_at = at
+
+
+def refresh_last_movements(keys):
+    # The deleted movements may have been the latest ones, so read the dates back from what is left.
+    keys = sorted(set(keys))
+    if not keys:
+        return
+    warehouse_ids, item_ids = zip(*keys)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            UPDATE {StockBalance._meta.db_table} b
+            SET last_in_at = m.last_in_at, last_out_at = m.last_out_at
+            FROM (
+                SELECT k.warehouse_id, k.item_id,
+                    MAX(sm.created_at) FILTER (WHERE sm.qty_delta > 0) AS last_in_at,
+                    MAX(sm.created_at) FILTER (WHERE sm.qty_delta < 0) AS last_out_at
+                FROM unnest(%s::bigint[], %s::bigint[]) AS k(warehouse_id, item_id)
+                LEFT JOIN {StockMovement._meta.db_table} sm
+                  ON sm.warehouse_id = k.warehouse_id AND sm.item_id = k.item_id
+                GROUP BY k.warehouse_id, k.item_id
+            ) m
+            WHERE b.warehouse_id = m.warehouse_id AND b.item_id = m.item_id
+            """,
+            [list(warehouse_ids), list(item_ids)],
+        )
+
+
+def touch_balances(ids):
+    with connection.cursor() as cursor:
+        cursor.execute(BALANCE_CHANGED_SQL.format(assignments=""), [list(ids)])
+        return cursor.rowcount
+
+
+def touch_movements(ids):
+    # Rewritten movements must show up in the change feed again.
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            UPDATE {StockMovement._meta.db_table} SET
+                change_xid = pg_current_xact_id()::text::bigint,
+                change_seq = nextval('inventory_change_seq')
+            WHERE id = ANY(%s)
+            """,
+            [list(ids)],
+        )
+        return cursor.rowcount
+
+
+def unwind_snapshots(movement_ids):
+    # A snapshot includes every movement recorded up to the end of its day. Movements
+    # about to be deleted are taken back out of those snapshots in place; rows that end
+    # up empty go, as take_stock_snapshot would not have written them.
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {StockSnapshot._meta.db_table} AS s (date, warehouse_id, item_id, on_hand, stock_value)
+            SELECT d.date, m.warehouse_id, m.item_id, -SUM(m.qty_delta), -SUM(COALESCE(m.value_delta, 0))
+            FROM {StockMovement._meta.db_table} m
+            JOIN (SELECT DISTINCT date FROM {StockSnapshot._meta.db_table}) d
+              ON d.date >= (m.created_at AT TIME ZONE %s)::date
+            WHERE m.id = ANY(%s)
+            GROUP BY d.date, m.warehouse_id, m.item_id
+            ON CONFLICT (date, warehouse_id, item_id) DO UPDATE
+            SET on_hand = s.on_hand + EXCLUDED.on_hand, stock_value = s.stock_value + EXCLUDED.stock_value
+            RETURNING s.id
+            """,
+            [timezone.get_current_timezone_name(), list(movement_ids)],
+        )
+        touched = [row[0] for row in cursor.fetchall()]
+    StockSnapshot.objects.filter(id__in=touched, on_hand=0, stock_value=0).delete()
+
+
+def _delete_with_tombstones(queryset, kind):
+    rows = list(queryset.values_list("id", "warehouse_id", "item_id"))
+    if not rows:
+        return 0
+    StockTombstone.objects.bulk_create(
+        [
+            StockTombstone(kind=kind, object_id=object_id, warehouse_id=warehouse_id, item_id=item_id)
+            for object_id, warehouse_id, item_id in rows
+        ]
+    )
+    ids = [row[0] for row in rows]
+    if kind == StockTombstone.KIND_MOVEMENT:
+        restore_cost_layers(ids)
+        unwind_snapshots(ids)
+    queryset.model.objects.filter(id__in=ids).delete()
+    if kind == StockTombstone.KIND_MOVEMENT:
+        refresh_last_movements((warehouse_id, item_id) for object_id, warehouse_id, item_id in rows)
+    return len(rows)
+
+
+def delete_movements(movements):
+    return _delete_with_tombstones(movements, StockTombstone.KIND_MOVEMENT)
+
+
+@transaction.atomic
+def delete_balances(balances):
+    # Dropping a balance takes its stock away, which the outbox consumers must hear about.
+    deltas = [
+        (warehouse_id, item_id, -on_hand)
+        for warehouse_id, item_id, on_hand in balances.values_list("warehouse_id", "item_id", "on_hand")
+    ]
+    count = _delete_with_tombstones(balances, StockTombstone.KIND_BALANCE)
+    if any(qty for warehouse_id, item_id, qty in deltas):
+        record_stock_event("stock.balance_deleted", "", None, deltas)
+    return count
+
+
+def _stock_event(event_type, reference_type, reference_id, deltas):
+    totals = defaultdict(Decimal)
+    for warehouse_id, item_id, qty in deltas:
+        totals[(warehouse_id, item_id)] += qty
+    return StockOutboxEvent(
+        event_type=event_type,
+        reference_type=reference_type,
+        reference_id=reference_id,
+        payload={
+            "deltas": [
+                [warehouse_id, item_id, str(quantize_qty(qty))]
+                for (warehouse_id, item_id), qty in sorted(totals.items())
+                if qty
+            ]
+        },
+    )
+
+
+def record_stock_event(event_type, reference_type, reference_id, deltas):
+    # Written in the caller's transaction, so the relay only ever sees committed stock changes.
+    event = _stock_event(event_type, reference_type, reference_id, deltas)
+    event.save()
+    return event
+
+
+def consumption_month(issue):
+    return issue.issue_date.replace(day=1)
+
+
+def update_consumption(rows):
+    # rows: (month, outgoing_location_id, warehouse_id, item_id, qty, value) consumption deltas,
+    # added onto the monthly rollup in one upsert. Keys are written in a fixed order so
+    # concurrent postings touching the same rows cannot deadlock.
+    totals = defaultdict(lambda: [Decimal("0"), Decimal("0")])
+    for month, location_id, warehouse_id, item_id, qty, value in rows:
+        total = totals[(month, location_id, warehouse_id, item_id)]
+        total[0] += qty
+        total[1] += value
+    keys = sorted(key for key, (qty, value) in totals.items() if qty or value)
+    if not keys:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            INSERT INTO {ConsumptionRollup._meta.db_table} AS r
+                (month, outgoing_location_id, warehouse_id, item_id, qty, value)
+            SELECT * FROM unnest(%s::date[], %s::bigint[], %s::bigint[], %s::bigint[], %s::numeric[], %s::numeric[])
+            ON CONFLICT (month, outgoing_location_id, warehouse_id, item_id)
+            DO UPDATE SET qty = r.qty + EXCLUDED.qty, value = r.value + EXCLUDED.value
+            """,
+            [
+                [key[0] for key in keys],
+                [key[1] for key in keys],
+                [key[2] for key in keys],
+                [key[3] for key in keys],
+                [totals[key][0] for key in keys],
+                [totals[key][1] for key in keys],
+            ],
+        )
+
+
+def rebuild_consumption_rollup():
+    # Recomputes every rollup row from the issue movements, e.g. once their values were replayed.
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {ConsumptionRollup._meta.db_table}")
+        cursor.execute(
+            f"""
+            INSERT INTO {ConsumptionRollup._meta.db_table} (month, outgoing_location_id, warehouse_id, item_id, qty, value)
+            SELECT date_trunc('month', h.issue_date)::date, h.outgoing_location_id, m.warehouse_id, m.item_id,
+                SUM(-m.qty_delta), SUM(-COALESCE(m.value_delta, ROUND(m.qty_delta * COALESCE(m.unit_cost, 0), 2)))
+            FROM {StockMovement._meta.db_table} m
+            JOIN {IssueHeader._meta.db_table} h ON h.id = m.reference_id
+            WHERE m.reference_type = 'issue' AND m.movement_type = %s
+            GROUP BY 1, 2, 3, 4
+            """,
+            [StockMovement.TYPE_OUT_ISSUE],
+        )
+        return cursor.rowcount
+
+
+def issue_consumption(issue, movements):
+    month = consumption_month(issue)
+    return [
+        (month, issue.outgoing_location_id, movement.warehouse_id, movement.item_id, -movement.qty_delta, -movement_value(movement))
+        for movement in movements
+        if movement is not None
+    ]
+
+
+def price_history_keys(purchase, lines):
+    month = purchase.invoice_date.replace(day=1)
+    return [(purchase.vendor_id, month, line.item_id) for line in lines]
+
+
+def refresh_price_history(keys):
+    # Recomputes the monthly price rows of the given (vendor_id, month, item_id) keys from the
+    # posted purchase lines. Min and max cannot be taken back on unpost, so posting and
+    # unposting both rebuild the touched rows; each key reads one vendor-month of purchases.
+    keys = sorted(set(keys))
+    if not keys:
+        return
+    params = [[key[0] for key in keys], [key[1] for key in keys], [key[2] for key in keys]]
+    history = VendorPriceHistory._meta.db_table
+    with connection.cursor() as cursor:
+        # Upsert in key order and only drop currencies no longer purchased, so concurrent
+        # refreshes of the same key never race a DELETE against an INSERT.
+        cursor.execute(
+            f"""
+            WITH upserted AS (
+                INSERT INTO {history} AS p
+                    (month, vendor_id, item_id, currency, line_count, qty, spend,
+                     min_price, max_price, avg_price, last_price, last_date)
+                SELECT k.month, k.vendor_id, k.item_id, h.currency, COUNT(*),
+                    SUM(l.qty), SUM(l.line_total), MIN(l.unit_price), MAX(l.unit_price),
+                    ROUND(COALESCE(SUM(l.unit_price * l.qty) / NULLIF(SUM(l.qty), 0), AVG(l.unit_price)), 4),
+                    (ARRAY_AGG(l.unit_price ORDER BY h.invoice_date DESC, l.id DESC))[1], MAX(h.invoice_date)
+                FROM unnest(%s::bigint[], %s::date[], %s::bigint[]) k(vendor_id, month, item_id)
+                JOIN {PurchaseHeader._meta.db_table} h ON h.vendor_id = k.vendor_id AND h.is_posted
+                    AND h.invoice_date >= k.month AND h.invoice_date < k.month + interval '1 month'
+                JOIN {PurchaseLine._meta.db_table} l ON l.purchase_id = h.id AND l.item_id = k.item_id
+                GROUP BY k.month, k.vendor_id, k.item_id, h.currency
+                ORDER BY k.month, k.vendor_id, k.item_id, h.currency
+                ON CONFLICT (month, vendor_id, item_id, currency) DO UPDATE SET
+                    line_count = EXCLUDED.line_count, qty = EXCLUDED.qty, spend = EXCLUDED.spend,
+                    min_price = EXCLUDED.min_price, max_price = EXCLUDED.max_price,
+                    avg_price = EXCLUDED.avg_price, last_price = EXCLUDED.last_price,
+                    last_date = EXCLUDED.last_date
+                RETURNING p.id
+            )
+            DELETE FROM {history} p
+            USING unnest(%s::bigint[], %s::date[], %s::bigint[]) k(vendor_id, month, item_id)
+            WHERE p.vendor_id = k.vendor_id AND p.month = k.month AND p.item_id = k.item_id
+                AND p.id NOT IN (SELECT id FROM upserted)
+            """,
+            params + params,
+        )
+
+
 @transaction.atomic
 def apply_movement(*, user, warehouse, item, qty_delta, movement_type, unit_cost=None, currency=None,
-                   reference_type="", reference_id=None, note="", override_reason=""):
+                   reference_type="", reference_id=None, note="", override_reason="", value_delta=None):
     qty_delta = quantize_qty(Decimal(qty_delta))
     if qty_delta == 0:
         return None
@@ -37,8 +382,12 @@ def apply_movement(*, user, warehouse, item, qty_delta, movement_type, unit_cost
         else:
             raise PermissionDenied("Insufficient stock and no override permission")
 
+    value_delta, unit_cost, balance.stock_value, balance.avg_cost = value_movement(
+        balance.on_hand, balance.stock_value, balance.avg_cost, qty_delta, unit_cost, value_delta
+    )
     balance.on_hand = new_on_hand
-    balance.save(update_fields=["on_hand"])
+    mark_movement_time(balance, qty_delta, timezone.now())
+    save_balance(balance)
 
     movement = StockMovement.objects.create(
         warehouse=warehouse,
@@ -46,6 +395,7 @@ def apply_movement(*, user, warehouse, item, qty_delta, movement_type, unit_cost
         movement_type=movement_type,
         qty_delta=qty_delta,
         unit_cost=unit_cost,
+        value_delta=value_delta,
         currency=currency or settings.DEFAULT_CURRENCY,
         reference_type=reference_type,
         reference_id=reference_id,
@@ -57,6 +407,19 @@ def apply_movement(*, user, warehouse, item, qty_delta, movement_type, unit_cost
     return movement
 
 
+def missing_exchange_rate(purchase):
+    if purchase.currency != settings.DEFAULT_CURRENCY and not purchase.exchange_rate:
+        return f"Exchange rate to {settings.DEFAULT_CURRENCY} is required for {purchase.currency} purchases"
+    return None
+
+
+def purchase_unit_cost(purchase, unit_price):
+    # Averages, cost layers and consumption values are all kept in DEFAULT_CURRENCY.
+    if purchase.currency == settings.DEFAULT_CURRENCY:
+        return unit_price
+    return quantize_money(unit_price * purchase.exchange_rate)
+
+
 @transaction.atomic
 def post_purchase(purchase: PurchaseHeader, user, override_reason=""):
     if purchase.is_posted:
@@ -65,25 +428,41 @@ def post_purchase(purchase: PurchaseHeader, user, override_reason=""):
     purchase = PurchaseHeader.objects.select_for_update().get(pk=purchase.pk)
     if purchase.is_posted:
         return purchase
+    error = missing_exchange_rate(purchase)
+    if error:
+        raise ValidationError(error)
 
-    for line in purchase.lines.select_related("item"):
-        apply_movement(
-            user=user,
-            warehouse=purchase.warehouse,
-            item=line.item,
-            qty_delta=line.qty,
-            movement_type=StockMovement.TYPE_IN_PURCHASE,
-            unit_cost=line.unit_price,
-            currency=purchase.currency,
-            reference_type="purchase",
-            reference_id=purchase.id,
-            note=f"Invoice {purchase.invoice_no}",
-            override_reason=override_reason,
+    movements = []
+    lines = list(purchase.lines.select_related("item"))
+    for line in lines:
+        movements.append(
+            apply_movement(
+                user=user,
+                warehouse=purchase.warehouse,
+                item=line.item,
+                qty_delta=line.qty,
+                movement_type=StockMovement.TYPE_IN_PURCHASE,
+                unit_cost=purchase_unit_cost(purchase, line.unit_price),
+                currency=settings.DEFAULT_CURRENCY,
+                reference_type="purchase",
+                reference_id=purchase.id,
+                note=f"Invoice {purchase.invoice_no}",
+                override_reason=override_reason,
+            )
         )
 
+    apply_cost_layers(movements)
+
     purchase.is_posted = True
     purchase.posted_at = timezone.now()
     purchase.save(update_fields=["is_posted", "posted_at"])
+    refresh_price_history(price_history_keys(purchase, lines))
+    record_stock_event(
+        "purchase.posted",
+        "purchase",
+        purchase.id,
+        [(purchase.warehouse_id, line.item_id, line.qty) for line in lines],
+    )
     return purchase
 
 
@@ -96,24 +475,37 @@ def post_issue(issue: IssueHeader, user, override_reason=""):
     if issue.is_posted:
         return issue
 
-    for line in issue.lines.select_related("item"):
-        apply_movement(
-            user=user,
-            warehouse=issue.warehouse,
-            item=line.item,
-            qty_delta=-abs(line.qty),
-            movement_type=StockMovement.TYPE_OUT_ISSUE,
-            unit_cost=None,
-            currency=settings.DEFAULT_CURRENCY,
-            reference_type="issue",
-            reference_id=issue.id,
-            note=f"Issue to {issue.outgoing_location}",
-            override_reason=override_reason,
+    movements = []
+    lines = list(issue.lines.select_related("item"))
+    for line in lines:
+        movements.append(
+            apply_movement(
+                user=user,
+                warehouse=issue.warehouse,
+                item=line.item,
+                qty_delta=-abs(line.qty),
+                movement_type=StockMovement.TYPE_OUT_ISSUE,
+                unit_cost=None,
+                currency=settings.DEFAULT_CURRENCY,
+                reference_type="issue",
+                reference_id=issue.id,
+                note=f"Issue to {issue.outgoing_location}",
+                override_reason=override_reason,
+            )
         )
 
+    apply_cost_layers(movements)
+    update_consumption(issue_consumption(issue, movements))
+
     issue.is_posted = True
     issue.posted_at = timezone.now()
     issue.save(update_fields=["is_posted", "posted_at"])
+    record_stock_event(
+        "issue.posted",
+        "issue",
+        issue.id,
+        [(issue.warehouse_id, line.item_id, -abs(line.qty)) for line in lines],
+    )
     return issue
 
 
@@ -126,8 +518,10 @@ def post_transfer(transfer: TransferHeader, user, override_reason=""):
     if transfer.is_posted:
         return transfer
 
-    for line in transfer.lines.select_related("item"):
-        apply_movement(
+    movements = []
+    lines = list(transfer.lines.select_related("item"))
+    for line in lines:
+        sent = apply_movement(
             user=user,
             warehouse=transfer.from_warehouse,
             item=line.item,
@@ -140,23 +534,33 @@ def post_transfer(transfer: TransferHeader, user, override_reason=""):
             note=f"Transfer to {transfer.to_warehouse}",
             override_reason=override_reason,
         )
-        apply_movement(
+        received = apply_movement(
             user=user,
             warehouse=transfer.to_warehouse,
             item=line.item,
             qty_delta=abs(line.qty),
             movement_type=StockMovement.TYPE_TRANSFER_IN,
-            unit_cost=None,
+            # The receiving warehouse takes the stock at exactly the value the sender gave up.
+            unit_cost=sent.unit_cost if sent else None,
+            value_delta=-sent.value_delta if sent else None,
             currency=settings.DEFAULT_CURRENCY,
             reference_type="transfer",
             reference_id=transfer.id,
             note=f"Transfer from {transfer.from_warehouse}",
             override_reason=override_reason,
         )
+        movements += [sent, received]
+
+    apply_cost_layers(movements)
 
     transfer.is_posted = True
     transfer.posted_at = timezone.now()
     transfer.save(update_fields=["is_posted", "posted_at"])
+    deltas = []
+    for line in lines:
+        deltas.append((transfer.from_warehouse_id, line.item_id, -abs(line.qty)))
+        deltas.append((transfer.to_warehouse_id, line.item_id, abs(line.qty)))
+    record_stock_event("transfer.posted", "transfer", transfer.id, deltas)
     return transfer
 
 
@@ -169,27 +573,516 @@ def post_adjustment(adjustment: AdjustmentHeader, user, override_reason=""):
     if adjustment.is_posted:
         return adjustment
 
-    for line in adjustment.lines.select_related("item"):
-        apply_movement(
-            user=user,
-            warehouse=adjustment.warehouse,
-            item=line.item,
-            qty_delta=line.qty_delta,
-            movement_type=StockMovement.TYPE_ADJUSTMENT,
-            unit_cost=None,
-            currency=settings.DEFAULT_CURRENCY,
-            reference_type="adjustment",
-            reference_id=adjustment.id,
-            note=adjustment.reason,
-            override_reason=override_reason,
+    movements = []
+    lines = list(adjustment.lines.select_related("item"))
+    for line in lines:
+        movements.append(
+            apply_movement(
+                user=user,
+                warehouse=adjustment.warehouse,
+                item=line.item,
+                qty_delta=line.qty_delta,
+                movement_type=StockMovement.TYPE_ADJUSTMENT,
+                unit_cost=None,
+                currency=settings.DEFAULT_CURRENCY,
+                reference_type="adjustment",
+                reference_id=adjustment.id,
+                note=adjustment.reason,
+                override_reason=override_reason,
+            )
         )
 
+    apply_cost_layers(movements)
+
     adjustment.is_posted = True
     adjustment.posted_at = timezone.now()
     adjustment.save(update_fields=["is_posted", "posted_at"])
+    record_stock_event(
+        "adjustment.posted",
+        "adjustment",
+        adjustment.id,
+        [(adjustment.warehouse_id, line.item_id, line.qty_delta) for line in lines],
+    )
     return adjustment
 
 
+def _purchase_movements(purchase):
+    return [
+        StockMovement(
+            warehouse_id=purchase.warehouse_id,
+            item_id=line.item_id,
+            movement_type=StockMovement.TYPE_IN_PURCHASE,
+            qty_delta=line.qty,
+            unit_cost=purchase_unit_cost(purchase, line.unit_price),
+            currency=settings.DEFAULT_CURRENCY,
+            reference_type="purchase",
+            reference_id=purchase.id,
+            note=f"Invoice {purchase.invoice_no}",
+        )
+        for line in purchase.lines.all()
+    ]
+
+
+def _issue_movements(issue):
+    return [
+        StockMovement(
+            warehouse_id=issue.warehouse_id,
+            item_id=line.item_id,
+            movement_type=StockMovement.TYPE_OUT_ISSUE,
+            qty_delta=-abs(line.qty),
+            reference_type="issue",
+            reference_id=issue.id,
+            note=f"Issue to {issue.outgoing_location}",
+        )
+        for line in issue.lines.all()
+    ]
+
+
+def _transfer_movements(transfer):
+    movements = []
+    for line in transfer.lines.all():
+        movements.append(
+            StockMovement(
+                warehouse_id=transfer.from_warehouse_id,
+                item_id=line.item_id,
+                movement_type=StockMovement.TYPE_TRANSFER_OUT,
+                qty_delta=-abs(line.qty),
+                reference_type="transfer",
+                reference_id=transfer.id,
+                note=f"Transfer to {transfer.to_warehouse}",
+            )
+        )
+        movements.append(
+            StockMovement(
+                warehouse_id=transfer.to_warehouse_id,
+                item_id=line.item_id,
+                movement_type=StockMovement.TYPE_TRANSFER_IN,
+                qty_delta=abs(line.qty),
+                reference_type="transfer",
+                reference_id=transfer.id,
+                note=f"Transfer from {transfer.from_warehouse}",
+            )
+        )
+    return movements
+
+
+def _adjustment_movements(adjustment):
+    return [
+        StockMovement(
+            warehouse_id=adjustment.warehouse_id,
+            item_id=line.item_id,
+            movement_type=StockMovement.TYPE_ADJUSTMENT,
+            qty_delta=line.qty_delta,
+            reference_type="adjustment",
+            reference_id=adjustment.id,
+            note=adjustment.reason,
+        )
+        for line in adjustment.lines.all()
+    ]
+
+
+# Header model -> (reference type, related objects used in movement notes, movement builder).
+BULK_POSTING = {
+    PurchaseHeader: ("purchase", (), _purchase_movements),
+    IssueHeader: ("issue", ("outgoing_location",), _issue_movements),
+    TransferHeader: ("transfer", ("from_warehouse", "to_warehouse"), _transfer_movements),
+    AdjustmentHeader: ("adjustment", (), _adjustment_movements),
+}
+
+
+def lock_balances(keys):
+    keys = sorted(set(keys))
+    if not keys:
+        return {}
+    StockBalance.objects.bulk_create(
+        [StockBalance(warehouse_id=warehouse_id, item_id=item_id) for warehouse_id, item_id in keys],
+        ignore_conflicts=True,
+    )
+    warehouse_ids, item_ids = zip(*keys)
+    # Lock in (warehouse, item) order so concurrent batches cannot deadlock each other.
+    balances = StockBalance.objects.raw(
+        f"""
+        SELECT b.* FROM {StockBalance._meta.db_table} b
+        JOIN unnest(%s::bigint[], %s::bigint[]) AS k(warehouse_id, item_id)
+          ON k.warehouse_id = b.warehouse_id AND k.item_id = b.item_id
+        ORDER BY b.warehouse_id, b.item_id
+        FOR UPDATE OF b
+        """,
+        [list(warehouse_ids), list(item_ids)],
+    )
+    return {(balance.warehouse_id, balance.item_id): balance for balance in balances}
+
+
+def lock_open_layers(keys):
+    keys = sorted(set(keys))
+    if not keys:
+        return {}
+    warehouse_ids, item_ids = zip(*keys)
+    layers = CostLayer.objects.raw(
+        f"""
+        SELECT l.* FROM {CostLayer._meta.db_table} l
+        JOIN unnest(%s::bigint[], %s::bigint[]) AS k(warehouse_id, item_id)
+          ON k.warehouse_id = l.warehouse_id AND k.item_id = l.item_id
+        WHERE l.remaining > 0
+        ORDER BY l.warehouse_id, l.item_id, l.received_at, l.id
+        FOR UPDATE OF l
+        """,
+        [list(warehouse_ids), list(item_ids)],
+    )
+    open_layers = {key: [] for key in keys}
+    for layer in layers:
+        open_layers[(layer.warehouse_id, layer.item_id)].append(layer)
+    return open_layers
+
+
+def lock_pending_consumptions(keys):
+    keys = sorted(set(keys))
+    if not keys:
+        return {}
+    warehouse_ids, item_ids = zip(*keys)
+    consumptions = CostLayerConsumption.objects.raw(
+        f"""
+        SELECT c.*, m.warehouse_id, m.item_id FROM {CostLayerConsumption._meta.db_table} c
+        JOIN {StockMovement._meta.db_table} m ON m.id = c.movement_id
+        JOIN unnest(%s::bigint[], %s::bigint[]) AS k(warehouse_id, item_id)
+          ON k.warehouse_id = m.warehouse_id AND k.item_id = m.item_id
+        WHERE c.layer_id IS NULL
+        ORDER BY m.warehouse_id, m.item_id, m.created_at, m.id, c.id
+        FOR UPDATE OF c
+        """,
+        [list(warehouse_ids), list(item_ids)],
+    )
+    pending = {key: [] for key in keys}
+    for consumption in consumptions:
+        pending[(consumption.warehouse_id, consumption.item_id)].append(consumption)
+    return pending
+
+
+def settle_pending_consumptions(keys, removed=()):
+    # Shortfalls from negative stock take the oldest open layers as soon as stock
+    # comes back, so open layers minus pending shortfalls always equal on hand.
+    removed = set(removed)
+    pending = lock_pending_consumptions(keys)
+    pending = {
+        key: [consumption for consumption in consumptions if consumption.movement_id not in removed]
+        for key, consumptions in pending.items()
+    }
+    if not any(pending.values()):
+        return
+    open_layers = lock_open_layers(key for key, consumptions in pending.items() if consumptions)
+    consumptions = []
+    consumed = {}
+    settled = []
+    shortened = []
+    for key, shortfalls in pending.items():
+        for shortfall in shortfalls:
+            needed = shortfall.qty
+            for layer in open_layers.get(key, []):
+                if needed == 0:
+                    break
+                if layer.movement_id in removed or layer.remaining == 0:
+                    continue
+                taken = min(needed, layer.remaining)
+                layer.remaining -= taken
+                needed -= taken
+                consumed[layer.pk] = layer
+                consumptions.append(CostLayerConsumption(layer=layer, movement_id=shortfall.movement_id, qty=taken))
+            if needed == 0:
+                settled.append(shortfall.pk)
+            elif needed < shortfall.qty:
+                shortfall.qty = needed
+                shortened.append(shortfall)
+    CostLayer.objects.bulk_update(consumed.values(), ["remaining"])
+    CostLayerConsumption.objects.bulk_create(consumptions)
+    CostLayerConsumption.objects.filter(pk__in=settled).delete()
+    CostLayerConsumption.objects.bulk_update(shortened, ["qty"])
+
+
+def apply_cost_layers(movements):
+    # FIFO: receipts open a layer, outgoing movements consume the oldest open layers.
+    # All layers a document touches are locked in one query and written back in bulk.
+    # Transfer builders emit each TRANSFER_OUT right before its TRANSFER_IN, which
+    # reopens the consumed layers in the receiving warehouse with their cost and age.
+    # A shortfall on negative stock is kept as a pending consumption without a layer.
+    movements = [movement for movement in movements if movement is not None]
+    open_layers = lock_open_layers(
+        (movement.warehouse_id, movement.item_id) for movement in movements if movement.qty_delta < 0
+    )
+    new_layers = []
+    consumptions = []
+    consumed = {}
+    sent = []
+    for movement in movements:
+        key = (movement.warehouse_id, movement.item_id)
+        if movement.qty_delta < 0:
+            needed = -movement.qty_delta
+            sent = []
+            for layer in open_layers.get(key, []):
+                if needed == 0:
+                    break
+                if layer.remaining == 0:
+                    continue
+                taken = min(needed, layer.remaining)
+                if layer.pk is None:
+                    layer.save()
+                layer.remaining -= taken
+                needed -= taken
+                consumed[layer.pk] = layer
+                consumptions.append(CostLayerConsumption(layer=layer, movement=movement, qty=taken))
+                sent.append((layer, taken))
+            if needed > 0:
+                consumptions.append(CostLayerConsumption(layer=None, movement=movement, qty=needed))
+            continue
+
+        chunks = sent if movement.movement_type == StockMovement.TYPE_TRANSFER_IN else []
+        sent = []
+        remaining = movement.qty_delta - sum((qty for source, qty in chunks), Decimal("0"))
+        if remaining > 0:
+            chunks.append((CostLayer(received_at=movement.created_at, unit_cost=movement.unit_cost or 0), remaining))
+        layers = [
+            CostLayer(
+                warehouse_id=movement.warehouse_id,
+                item_id=movement.item_id,
+                movement=movement,
+                received_at=source.received_at,
+                qty=qty,
+                remaining=qty,
+                unit_cost=source.unit_cost,
+            )
+            for source, qty in chunks
+        ]
+        new_layers.extend(layers)
+        if key in open_layers:
+            open_layers[key].extend(layers)
+
+    CostLayer.objects.bulk_create([layer for layer in new_layers if layer.pk is None])
+    CostLayer.objects.bulk_update(consumed.values(), ["remaining"])
+    CostLayerConsumption.objects.bulk_create(consumptions)
+    settle_pending_consumptions(
+        (movement.warehouse_id, movement.item_id) for movement in movements if movement.qty_delta > 0
+    )
+
+
+def restore_cost_layers(movement_ids):
+    # Give consumed quantities back to their layers; the movements' own layers and
+    # consumption rows go away with the movements.
+    movement_ids = list(movement_ids)
+    restored = set(
+        CostLayerConsumption.objects.filter(movement_id__in=movement_ids, layer__isnull=False).values_list(
+            "layer__warehouse_id", "layer__item_id"
+        )
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            UPDATE {CostLayer._meta.db_table} l SET remaining = l.remaining + c.qty
+            FROM (
+                SELECT layer_id, SUM(qty) AS qty FROM {CostLayerConsumption._meta.db_table}
+                WHERE movement_id = ANY(%s) GROUP BY layer_id
+            ) c
+            WHERE l.id = c.layer_id
+            """,
+            [movement_ids],
+        )
+    reassign_orphaned_consumptions(movement_ids)
+    settle_pending_consumptions(restored, removed=movement_ids)
+
+
+def reassign_orphaned_consumptions(movement_ids):
+    # Later outgoing movements may have drawn from layers of the receipts being removed.
+    # Their consumptions move on to the oldest remaining open layers, so the open layers
+    # keep matching stock and unposting those movements later gives back the right layers.
+    orphaned = list(
+        CostLayerConsumption.objects.filter(layer__movement_id__in=movement_ids)
+        .exclude(movement_id__in=movement_ids)
+        .select_related("layer")
+        .order_by("movement_id", "id")
+    )
+    if not orphaned:
+        return
+    removed = set(movement_ids)
+    open_layers = lock_open_layers((c.layer.warehouse_id, c.layer.item_id) for c in orphaned)
+    consumptions = []
+    consumed = {}
+    for consumption in orphaned:
+        needed = consumption.qty
+        for layer in open_layers[(consumption.layer.warehouse_id, consumption.layer.item_id)]:
+            if needed == 0:
+                break
+            if layer.movement_id in removed or layer.remaining == 0:
+                continue
+            taken = min(needed, layer.remaining)
+            layer.remaining -= taken
+            needed -= taken
+            consumed[layer.pk] = layer
+            consumptions.append(CostLayerConsumption(layer=layer, movement_id=consumption.movement_id, qty=taken))
+        if needed > 0:
+            consumptions.append(CostLayerConsumption(layer=None, movement_id=consumption.movement_id, qty=needed))
+    CostLayer.objects.bulk_update(consumed.values(), ["remaining"])
+    CostLayerConsumption.objects.bulk_create(consumptions)
+
+
+def fifo_stock_value(warehouse_ids=None):
+    layers = CostLayer.objects.filter(remaining__gt=0)
+    if warehouse_ids is not None:
+        layers = layers.filter(warehouse_id__in=warehouse_ids)
+    return {
+        row["warehouse_id"]: (row["qty"], quantize_money(row["value"]))
+        for row in layers.values("warehouse_id").annotate(
+            qty=Sum("remaining"),
+            value=Sum(F("remaining") * F("unit_cost"), output_field=DecimalField(max_digits=20, decimal_places=7)),
+        )
+    }
+
+
+@transaction.atomic
+def post_documents_bulk(model, ids, user, override_reason=""):
+    reference_type, related, build_movements = BULK_POSTING[model]
+    headers = list(
+        model.objects.select_for_update(of=("self",))
+        .filter(pk__in=ids, is_posted=False)
+        .select_related(*related)
+        .prefetch_related("lines")
+        .order_by("pk")
+    )
+    planned = []
+    rejected = {}
+    for header in headers:
+        error = missing_exchange_rate(header) if model is PurchaseHeader else None
+        if error:
+            rejected[header.pk] = error
+            continue
+        movements = []
+        for movement in build_movements(header):
+            movement.qty_delta = quantize_qty(Decimal(movement.qty_delta))
+            if movement.qty_delta != 0:
+                movements.append(movement)
+        planned.append((header, movements))
+
+    balances = lock_balances(
+        (movement.warehouse_id, movement.item_id) for header, movements in planned for movement in movements
+    )
+    can_override = user.is_superuser or user.has_perm("inventory.override_negative_stock")
+    now = timezone.now()
+
+    posted_ids = []
+    new_movements = []
+    events = []
+    consumption = []
+    changed_balances = {}
+    for header, movements in planned:
+        pending = {}
+        allowed = True
+        sent = None
+        for movement in movements:
+            key = (movement.warehouse_id, movement.item_id)
+            balance = balances[key]
+            on_hand, stock_value, avg_cost = pending.get(key, (balance.on_hand, balance.stock_value, balance.avg_cost))
+            if movement.movement_type == StockMovement.TYPE_TRANSFER_IN and sent is not None:
+                # Transfer builders emit each TRANSFER_OUT right before its TRANSFER_IN.
+                movement.unit_cost, carried = sent.unit_cost, -sent.value_delta
+            else:
+                carried = None
+            movement.value_delta, movement.unit_cost, stock_value, avg_cost = value_movement(
+                on_hand, stock_value, avg_cost, movement.qty_delta, movement.unit_cost, carried
+            )
+            sent = movement if movement.movement_type == StockMovement.TYPE_TRANSFER_OUT else None
+            on_hand = quantize_qty(on_hand + movement.qty_delta)
+            pending[key] = (on_hand, stock_value, avg_cost)
+            if on_hand < 0:
+                if not can_override:
+                    allowed = False
+                    break
+                movement.override_negative = True
+                movement.override_reason = override_reason
+        if not allowed:
+            rejected[header.pk] = "Insufficient stock and no override permission"
+            continue
+        for key, (on_hand, stock_value, avg_cost) in pending.items():
+            balance = balances[key]
+            balance.on_hand, balance.stock_value, balance.avg_cost = on_hand, stock_value, avg_cost
+            changed_balances[key] = balance
+        for movement in movements:
+            movement.created_by = user
+            mark_movement_time(balances[(movement.warehouse_id, movement.item_id)], movement.qty_delta, now)
+        new_movements.extend(movements)
+        if model is IssueHeader:
+            consumption.extend(issue_consumption(header, movements))
+        events.append(
+            _stock_event(
+                f"{reference_type}.posted",
+                reference_type,
+                header.pk,
+                [(movement.warehouse_id, movement.item_id, movement.qty_delta) for movement in movements],
+            )
+        )
+        posted_ids.append(header.pk)
+
+    StockMovement.objects.bulk_create(new_movements)
+    apply_cost_layers(new_movements)
+    update_consumption(consumption)
+    if changed_balances:
+        StockBalance.objects.bulk_update(
+            changed_balances.values(), ["on_hand", "avg_cost", "stock_value", "last_in_at", "last_out_at"]
+        )
+        touch_balances(balance.pk for balance in changed_balances.values())
+    if posted_ids:
+        model.objects.filter(pk__in=posted_ids).update(is_posted=True, posted_at=timezone.now())
+        StockOutboxEvent.objects.bulk_create(events)
+        if model is PurchaseHeader:
+            posted = set(posted_ids)
+            refresh_price_history(
+                key
+                for header in headers
+                if header.pk in posted
+                for key in price_history_keys(header, header.lines.all())
+            )
+    return posted_ids, rejected
+
+
+@transaction.atomic
+def create_reorder_purchases(suggestion_ids, user, invoice_date=None):
+    # One draft purchase per preferred vendor and warehouse, the converted suggestions are removed.
+    # Drafts count as on order, so the next reorder run does not suggest the same quantities again.
+    suggestions = list(
+        ReorderSuggestion.objects.select_for_update()
+        .filter(pk__in=suggestion_ids, vendor__isnull=False)
+        .order_by("vendor_id", "warehouse_id", "item_id")
+    )
+    invoice_date = invoice_date or timezone.localdate()
+    groups = defaultdict(list)
+    for suggestion in suggestions:
+        groups[(suggestion.vendor_id, suggestion.warehouse_id)].append(suggestion)
+
+    headers = PurchaseHeader.objects.bulk_create(
+        PurchaseHeader(
+            vendor_id=vendor_id,
+            warehouse_id=warehouse_id,
+            invoice_date=invoice_date,
+            currency=settings.DEFAULT_CURRENCY,
+            notes="Reorder suggestion",
+            created_by=user,
+        )
+        for vendor_id, warehouse_id in groups
+    )
+    PurchaseLine.objects.bulk_create(
+        (
+            PurchaseLine(
+                purchase=header,
+                item_id=suggestion.item_id,
+                qty=suggestion.suggested_qty,
+                unit_price=suggestion.unit_price or 0,
+                line_total=quantize_money(suggestion.suggested_qty * (suggestion.unit_price or 0)),
+            )
+            for header, group in zip(headers, groups.values())
+            for suggestion in group
+        ),
+        batch_size=5000,
+    )
+    ReorderSuggestion.objects.filter(pk__in=[suggestion.pk for suggestion in suggestions]).delete()
+    return headers
+
+
 @transaction.atomic
 def delete_purchase_with_inventory(purchase: PurchaseHeader):
     purchase = PurchaseHeader.objects.select_for_update().get(pk=purchase.pk)
@@ -197,6 +1090,7 @@ def delete_purchase_with_inventory(purchase: PurchaseHeader):
 
     if purchase.is_posted:
         item_qty = defaultdict(Decimal)
+        item_value = defaultdict(Decimal)
         movements = StockMovement.objects.select_for_update().filter(
             reference_type="purchase",
             reference_id=purchase.id,
@@ -207,6 +1101,7 @@ def delete_purchase_with_inventory(purchase: PurchaseHeader):
         if has_movements:
             for movement in movements.select_related("item"):
                 item_qty[movement.item_id] += movement.qty_delta
+                item_value[movement.item_id] += movement_value(movement)
         else:
             for line in purchase.lines.select_related("item"):
                 item_qty[line.item_id] += line.qty
@@ -217,13 +1112,20 @@ def delete_purchase_with_inventory(purchase: PurchaseHeader):
                 item_id=item_id,
                 defaults={"on_hand": Decimal("0")},
             )
-            balance.on_hand = quantize_qty(balance.on_hand - quantize_qty(qty))
-            balance.save(update_fields=["on_hand"])
+            restore_balance(balance, -quantize_qty(qty), -item_value[item_id] if has_movements else None)
 
         if has_movements:
-            movements.delete()
+            delete_movements(movements)
+        record_stock_event(
+            "purchase.deleted",
+            "purchase",
+            purchase.id,
+            [(purchase.warehouse_id, item_id, -qty) for item_id, qty in item_qty.items()],
+        )
 
+    price_keys = price_history_keys(purchase, purchase.lines.all()) if purchase.is_posted else []
     purchase.delete()
+    refresh_price_history(price_keys)
 
     # Hide/remove items that only existed because of this deleted invoice.
     # Keep items that are still referenced by another transaction.
@@ -245,7 +1147,7 @@ def delete_purchase_with_inventory(purchase: PurchaseHeader):
                 continue
 
             # Remove zero balances if any, then deactivate item so it disappears from stock pages.
-            StockBalance.objects.filter(item_id=item_id, on_hand=Decimal("0")).delete()
+            delete_balances(StockBalance.objects.filter(item_id=item_id, on_hand=Decimal("0")))
             Item.objects.filter(pk=item_id).update(is_active=False)
 
 
@@ -255,6 +1157,7 @@ def delete_issue_with_inventory(issue: IssueHeader):
 
     if issue.is_posted:
         item_qty = defaultdict(Decimal)
+        item_value = defaultdict(Decimal)
         movements = StockMovement.objects.select_for_update().filter(
             reference_type="issue",
             reference_id=issue.id,
@@ -265,6 +1168,7 @@ def delete_issue_with_inventory(issue: IssueHeader):
         if has_movements:
             for movement in movements.select_related("item"):
                 item_qty[movement.item_id] += abs(movement.qty_delta)
+                item_value[movement.item_id] += movement_value(movement)
         else:
             for line in issue.lines.select_related("item"):
                 item_qty[line.item_id] += line.qty
@@ -275,11 +1179,21 @@ def delete_issue_with_inventory(issue: IssueHeader):
                 item_id=item_id,
                 defaults={"on_hand": Decimal("0")},
             )
-            balance.on_hand = quantize_qty(balance.on_hand + quantize_qty(qty))
-            balance.save(update_fields=["on_hand"])
+            restore_balance(balance, quantize_qty(qty), -item_value[item_id] if has_movements else None)
 
+        month = consumption_month(issue)
+        update_consumption(
+            (month, issue.outgoing_location_id, issue.warehouse_id, item_id, -qty, item_value[item_id])
+            for item_id, qty in item_qty.items()
+        )
         if has_movements:
-            movements.delete()
+            delete_movements(movements)
+        record_stock_event(
+            "issue.deleted",
+            "issue",
+            issue.id,
+            [(issue.warehouse_id, item_id, qty) for item_id, qty in item_qty.items()],
+        )
 
     issue.delete()
 
@@ -291,6 +1205,7 @@ def unpost_purchase_inventory(purchase: PurchaseHeader):
         return
 
     item_qty_by_wh = defaultdict(Decimal)
+    value_by_wh = defaultdict(Decimal)
     movements = StockMovement.objects.select_for_update().filter(
         reference_type="purchase",
         reference_id=purchase.id,
@@ -302,6 +1217,7 @@ def unpost_purchase_inventory(purchase: PurchaseHeader):
         for movement in movements.select_related("item", "warehouse"):
             key = (movement.warehouse_id, movement.item_id)
             item_qty_by_wh[key] += movement.qty_delta
+            value_by_wh[key] += movement_value(movement)
     else:
         for line in purchase.lines.select_related("item"):
             key = (purchase.warehouse_id, line.item_id)
@@ -313,15 +1229,23 @@ def unpost_purchase_inventory(purchase: PurchaseHeader):
             item_id=item_id,
             defaults={"on_hand": Decimal("0")},
         )
-        balance.on_hand = quantize_qty(balance.on_hand - quantize_qty(qty))
-        balance.save(update_fields=["on_hand"])
+        restore_balance(
+            balance, -quantize_qty(qty), -value_by_wh[(warehouse_id, item_id)] if has_movements else None
+        )
 
     if has_movements:
-        movements.delete()
+        delete_movements(movements)
+    record_stock_event(
+        "purchase.unposted",
+        "purchase",
+        purchase.id,
+        [(warehouse_id, item_id, -qty) for (warehouse_id, item_id), qty in item_qty_by_wh.items()],
+    )
 
     purchase.is_posted = False
     purchase.posted_at = None
     purchase.save(update_fields=["is_posted", "posted_at"])
+    refresh_price_history(price_history_keys(purchase, purchase.lines.all()))
 
 
 @transaction.atomic
@@ -331,6 +1255,7 @@ def unpost_issue_inventory(issue: IssueHeader):
         return
 
     item_qty_by_wh = defaultdict(Decimal)
+    value_by_wh = defaultdict(Decimal)
     movements = StockMovement.objects.select_for_update().filter(
         reference_type="issue",
         reference_id=issue.id,
@@ -342,6 +1267,7 @@ def unpost_issue_inventory(issue: IssueHeader):
         for movement in movements.select_related("warehouse", "item"):
             key = (movement.warehouse_id, movement.item_id)
             item_qty_by_wh[key] += abs(movement.qty_delta)
+            value_by_wh[key] += movement_value(movement)
     else:
         for line in issue.lines.select_related("item"):
             key = (issue.warehouse_id, line.item_id)
@@ -353,12 +1279,396 @@ def unpost_issue_inventory(issue: IssueHeader):
             item_id=item_id,
             defaults={"on_hand": Decimal("0")},
         )
-        balance.on_hand = quantize_qty(balance.on_hand + quantize_qty(qty))
-        balance.save(update_fields=["on_hand"])
+        restore_balance(
+            balance, quantize_qty(qty), -value_by_wh[(warehouse_id, item_id)] if has_movements else None
+        )
 
+    month = consumption_month(issue)
+    update_consumption(
+        (month, issue.outgoing_location_id, warehouse_id, item_id, -qty, value_by_wh[(warehouse_id, item_id)])
+        for (warehouse_id, item_id), qty in item_qty_by_wh.items()
+    )
     if has_movements:
-        movements.delete()
+        delete_movements(movements)
+    record_stock_event(
+        "issue.unposted",
+        "issue",
+        issue.id,
+        [(warehouse_id, item_id, qty) for (warehouse_id, item_id), qty in item_qty_by_wh.items()],
+    )
 
     issue.is_posted = False
     issue.posted_at = None
     issue.save(update_fields=["is_posted", "posted_at"])
+
+
+@transaction.atomic
+def unpost_transfer_inventory(transfer: TransferHeader):
+    transfer = TransferHeader.objects.select_for_update().get(pk=transfer.pk)
+    if not transfer.is_posted:
+        return
+
+    item_qty_by_wh = defaultdict(Decimal)
+    value_by_wh = defaultdict(Decimal)
+    movements = StockMovement.objects.select_for_update().filter(
+        reference_type="transfer",
+        reference_id=transfer.id,
+        movement_type__in=[StockMovement.TYPE_TRANSFER_OUT, StockMovement.TYPE_TRANSFER_IN],
+    )
+
+    has_movements = movements.exists()
+    if has_movements:
+        for movement in movements:
+            key = (movement.warehouse_id, movement.item_id)
+            item_qty_by_wh[key] += movement.qty_delta
+            value_by_wh[key] += movement_value(movement)
+    else:
+        for line in transfer.lines.all():
+            item_qty_by_wh[(transfer.from_warehouse_id, line.item_id)] -= abs(line.qty)
+            item_qty_by_wh[(transfer.to_warehouse_id, line.item_id)] += abs(line.qty)
+
+    for (warehouse_id, item_id), qty in sorted(item_qty_by_wh.items()):
+        balance, _ = StockBalance.objects.select_for_update().get_or_create(
+            warehouse_id=warehouse_id,
+            item_id=item_id,
+            defaults={"on_hand": Decimal("0")},
+        )
+        restore_balance(
+            balance, -quantize_qty(qty), -value_by_wh[(warehouse_id, item_id)] if has_movements else None
+        )
+
+    if has_movements:
+        delete_movements(movements)
+    record_stock_event(
+        "transfer.unposted",
+        "transfer",
+        transfer.id,
+        [(warehouse_id, item_id, -qty) for (warehouse_id, item_id), qty in item_qty_by_wh.items()],
+    )
+
+    transfer.is_posted = False
+    transfer.posted_at = None
+    transfer.save(update_fields=["is_posted", "posted_at"])
+
+
+@transaction.atomic
+def unpost_adjustment_inventory(adjustment: AdjustmentHeader):
+    adjustment = AdjustmentHeader.objects.select_for_update().get(pk=adjustment.pk)
+    if not adjustment.is_posted:
+        return
+
+    item_qty_by_wh = defaultdict(Decimal)
+    value_by_wh = defaultdict(Decimal)
+    movements = StockMovement.objects.select_for_update().filter(
+        reference_type="adjustment",
+        reference_id=adjustment.id,
+        movement_type=StockMovement.TYPE_ADJUSTMENT,
+    )
+
+    has_movements = movements.exists()
+    if has_movements:
+        for movement in movements:
+            key = (movement.warehouse_id, movement.item_id)
+            item_qty_by_wh[key] += movement.qty_delta
+            value_by_wh[key] += movement_value(movement)
+    else:
+        for line in adjustment.lines.all():
+            item_qty_by_wh[(adjustment.warehouse_id, line.item_id)] += line.qty_delta
+
+    for (warehouse_id, item_id), qty in sorted(item_qty_by_wh.items()):
+        balance, _ = StockBalance.objects.select_for_update().get_or_create(
+            warehouse_id=warehouse_id,
+            item_id=item_id,
+            defaults={"on_hand": Decimal("0")},
+        )
+        restore_balance(
+            balance, -quantize_qty(qty), -value_by_wh[(warehouse_id, item_id)] if has_movements else None
+        )
+
+    if has_movements:
+        delete_movements(movements)
+    record_stock_event(
+        "adjustment.unposted",
+        "adjustment",
+        adjustment.id,
+        [(warehouse_id, item_id, -qty) for (warehouse_id, item_id), qty in item_qty_by_wh.items()],
+    )
+
+    adjustment.is_posted = False
+    adjustment.posted_at = None
+    adjustment.save(update_fields=["is_posted", "posted_at"])
+
+
+def _stock_mismatch_sql(warehouse_ids):
+    balance_table = StockBalance._meta.db_table
+    movement_table = StockMovement._meta.db_table
+    balance_filter = movement_filter = ""
+    params = []
+    if warehouse_ids is not None:
+        balance_filter = "WHERE warehouse_id = ANY(%s)"
+        movement_filter = "WHERE warehouse_id = ANY(%s)"
+        params = [list(warehouse_ids), list(warehouse_ids)]
+    sql = f"""
+        SELECT COALESCE(b.warehouse_id, m.warehouse_id) AS warehouse_id,
+               COALESCE(b.item_id, m.item_id) AS item_id,
+               b.on_hand,
+               COALESCE(m.total, 0) AS movement_total,
+               COALESCE(m.value_total, 0) AS movement_value
+        FROM (SELECT warehouse_id, item_id, on_hand FROM {balance_table} {balance_filter}) b
+        FULL OUTER JOIN (
+            SELECT warehouse_id, item_id, SUM(qty_delta) AS total, SUM(value_delta) AS value_total
+            FROM {movement_table} {movement_filter}
+            GROUP BY warehouse_id, item_id
+        ) m ON m.warehouse_id = b.warehouse_id AND m.item_id = b.item_id
+        WHERE COALESCE(b.on_hand, 0) <> COALESCE(m.total, 0)
+    """
+    return sql, params
+
+
+def find_stock_mismatches(warehouse_ids=None):
+    sql, params = _stock_mismatch_sql(warehouse_ids)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT warehouse_id, item_id, on_hand, movement_total FROM ({sql}) mismatches ORDER BY 1, 2", params
+        )
+        return cursor.fetchall()
+
+
+def lookup_stock(pairs, include_cost=False):
+    # pairs: (warehouse_id, item_id, internal_code) with either item_id or internal_code set.
+    # Returns (warehouse_id, item_id or None, on_hand, last_cost) in input order.
+    from wms.masters.models import Item
+
+    if not pairs:
+        return []
+    warehouse_ids, item_ids, codes = (list(column) for column in zip(*pairs))
+    cost_select = "NULL"
+    cost_join = ""
+    if include_cost:
+        cost_select = "lc.unit_cost"
+        cost_join = f"""
+            LEFT JOIN LATERAL (
+                SELECT m.unit_cost FROM {StockMovement._meta.db_table} m
+                WHERE m.item_id = COALESCE(i.id, ic.id)
+                  AND m.movement_type = %s AND m.unit_cost IS NOT NULL
+                ORDER BY m.created_at DESC, m.id DESC
+                LIMIT 1
+            ) lc ON TRUE
+        """
+    sql = f"""
+        SELECT k.warehouse_id, COALESCE(i.id, ic.id), COALESCE(b.on_hand, 0), {cost_select}
+        FROM unnest(%s::bigint[], %s::bigint[], %s::text[]) WITH ORDINALITY AS k(warehouse_id, item_id, code, ord)
+        LEFT JOIN {Item._meta.db_table} i ON i.id = k.item_id
+        LEFT JOIN {Item._meta.db_table} ic ON k.item_id IS NULL AND ic.internal_code = k.code
+        LEFT JOIN {StockBalance._meta.db_table} b
+          ON b.warehouse_id = k.warehouse_id AND b.item_id = COALESCE(i.id, ic.id)
+        {cost_join}
+        ORDER BY k.ord
+    """
+    params = [warehouse_ids, item_ids, codes]
+    if include_cost:
+        params.append(StockMovement.TYPE_IN_PURCHASE)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [
+            (warehouse_id, item_id, on_hand if item_id is not None else None, last_cost)
+            for warehouse_id, item_id, on_hand, last_cost in cursor.fetchall()
+        ]
+
+
+@transaction.atomic
+def repair_stock_balances(warehouse_ids=None):
+    balance_table = StockBalance._meta.db_table
+    with connection.cursor() as cursor:
+        # Block postings into these balances while the totals are recomputed.
+        lock_sql = f"SELECT id FROM {balance_table}"
+        lock_params = []
+        if warehouse_ids is not None:
+            lock_sql += " WHERE warehouse_id = ANY(%s)"
+            lock_params = [list(warehouse_ids)]
+        cursor.execute(f"{lock_sql} FOR UPDATE", lock_params)
+
+        sql, params = _stock_mismatch_sql(warehouse_ids)
+        cursor.execute(
+            f"""
+            WITH mismatches AS ({sql}),
+            repaired AS (
+                INSERT INTO {balance_table} (warehouse_id, item_id, on_hand, avg_cost, stock_value)
+                SELECT warehouse_id, item_id, movement_total,
+                       CASE WHEN movement_total > 0 THEN ROUND(movement_value / movement_total, 4) ELSE 0 END,
+                       movement_value
+                FROM mismatches
+                ON CONFLICT (warehouse_id, item_id) DO UPDATE SET
+                    on_hand = EXCLUDED.on_hand,
+                    stock_value = EXCLUDED.stock_value,
+                    avg_cost = CASE WHEN EXCLUDED.on_hand > 0 THEN EXCLUDED.avg_cost ELSE {balance_table}.avg_cost END,
+                    change_xid = EXCLUDED.change_xid,
+                    change_seq = EXCLUDED.change_seq
+                RETURNING warehouse_id, item_id, {BALANCE_NOTIFY_SQL}
+            )
+            SELECT m.warehouse_id, m.item_id, m.movement_total - COALESCE(m.on_hand, 0)
+            FROM repaired r JOIN mismatches m USING (warehouse_id, item_id)
+            """,
+            params,
+        )
+        deltas = cursor.fetchall()
+    if deltas:
+        record_stock_event("stock.repaired", "", None, deltas)
+    return len(deltas)
+
+
+@transaction.atomic
+def rebuild_average_costs(chunk_size=5000):
+    # One-off replay of the whole ledger for movements written before costs were tracked.
+    list(StockBalance.objects.select_for_update().values_list("id", flat=True))
+    state = {}
+    sent = defaultdict(list)
+    changed = []
+    movements = StockMovement.objects.order_by("id").only(
+        "id", "warehouse_id", "item_id", "movement_type", "qty_delta", "unit_cost", "value_delta", "reference_id"
+    )
+    for movement in movements.iterator(chunk_size=chunk_size):
+        key = (movement.warehouse_id, movement.item_id)
+        on_hand, stock_value, avg_cost = state.get(key, (Decimal("0"), Decimal("0"), Decimal("0")))
+        carried = None
+        unit_cost = movement.unit_cost if movement.movement_type == StockMovement.TYPE_IN_PURCHASE else None
+        transfer_key = (movement.reference_id, movement.item_id)
+        if movement.movement_type == StockMovement.TYPE_TRANSFER_IN and sent[transfer_key]:
+            carried = -sent[transfer_key].pop(0)
+        value_delta, unit_cost, stock_value, avg_cost = value_movement(
+            on_hand, stock_value, avg_cost, movement.qty_delta, unit_cost, carried
+        )
+        if movement.movement_type == StockMovement.TYPE_TRANSFER_OUT:
+            sent[transfer_key].append(value_delta)
+        state[key] = (quantize_qty(on_hand + movement.qty_delta), stock_value, avg_cost)
+        if (movement.value_delta, movement.unit_cost) != (value_delta, unit_cost):
+            movement.value_delta, movement.unit_cost = value_delta, unit_cost
+            changed.append(movement)
+        if len(changed) >= chunk_size:
+            StockMovement.objects.bulk_update(changed, ["value_delta", "unit_cost"])
+            touch_movements(movement.pk for movement in changed)
+            changed = []
+    StockMovement.objects.bulk_update(changed, ["value_delta", "unit_cost"])
+    touch_movements(movement.pk for movement in changed)
+
+    balances = list(StockBalance.objects.all())
+    for balance in balances:
+        on_hand, balance.stock_value, balance.avg_cost = state.get(
+            (balance.warehouse_id, balance.item_id), (Decimal("0"), Decimal("0"), Decimal("0"))
+        )
+    StockBalance.objects.bulk_update(balances, ["stock_value", "avg_cost"], batch_size=chunk_size)
+    touch_balances(balance.pk for balance in balances)
+    # Issues posted before costs were tracked went into the rollup without a value.
+    rebuild_consumption_rollup()
+    return len(balances)
+
+
+def _allocate_ids(model, count):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT nextval(pg_get_serial_sequence(%s, 'id')) FROM generate_series(1, %s)",
+            [model._meta.db_table, count],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+@transaction.atomic
+def rebuild_cost_layers(chunk_size=5000):
+    # Replays the ledger in id order, keeping each key's open layers sorted like
+    # lock_open_layers does and writing closed layers and consumptions chunk by chunk
+    # and the still-open layers at the end. Ids come from the sequence up front so
+    # consumptions can point at layers that are not inserted yet (foreign keys are deferred).
+    list(StockBalance.objects.select_for_update().values_list("id", flat=True))
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {CostLayerConsumption._meta.db_table}")
+        cursor.execute(f"DELETE FROM {CostLayer._meta.db_table}")
+
+    open_layers = defaultdict(list)
+    pending = defaultdict(deque)
+    sent = defaultdict(deque)
+    layer_ids = deque()
+    closed = []
+    consumptions = []
+    counts = {"movements": 0, "layers": 0, "consumptions": 0}
+
+    def flush(layers):
+        CostLayer.objects.bulk_create(layers, batch_size=chunk_size)
+        CostLayerConsumption.objects.bulk_create(consumptions, batch_size=chunk_size)
+        counts["layers"] += len(layers)
+        counts["consumptions"] += len(consumptions)
+        consumptions.clear()
+
+    movements = StockMovement.objects.order_by("id").only(
+        "id", "warehouse_id", "item_id", "movement_type", "qty_delta", "unit_cost", "reference_id", "created_at"
+    )
+    for movement in movements.iterator(chunk_size=chunk_size):
+        key = (movement.warehouse_id, movement.item_id)
+        transfer_key = (movement.reference_id, movement.item_id)
+        if movement.qty_delta < 0:
+            needed = -movement.qty_delta
+            chunks = []
+            layers = open_layers[key]
+            while needed > 0 and layers:
+                layer = layers[0]
+                taken = min(needed, layer.remaining)
+                layer.remaining -= taken
+                needed -= taken
+                chunks.append((layer, taken))
+                consumptions.append(CostLayerConsumption(layer_id=layer.id, movement_id=movement.id, qty=taken))
+                if layer.remaining == 0:
+                    closed.append(layers.pop(0))
+            if needed > 0:
+                pending[key].append((movement.id, needed))
+            if movement.movement_type == StockMovement.TYPE_TRANSFER_OUT:
+                sent[transfer_key].append(chunks)
+        elif movement.qty_delta > 0:
+            chunks = []
+            if movement.movement_type == StockMovement.TYPE_TRANSFER_IN and sent[transfer_key]:
+                chunks = sent[transfer_key].popleft()
+            remaining = movement.qty_delta - sum((qty for source, qty in chunks), Decimal("0"))
+            if remaining > 0:
+                chunks.append((CostLayer(received_at=movement.created_at, unit_cost=movement.unit_cost or 0), remaining))
+            for source, qty in chunks:
+                if not layer_ids:
+                    layer_ids = deque(_allocate_ids(CostLayer, chunk_size))
+                bisect.insort(
+                    open_layers[key],
+                    CostLayer(
+                        id=layer_ids.popleft(),
+                        warehouse_id=movement.warehouse_id,
+                        item_id=movement.item_id,
+                        movement_id=movement.id,
+                        received_at=source.received_at,
+                        qty=qty,
+                        remaining=qty,
+                        unit_cost=source.unit_cost,
+                    ),
+                    key=lambda layer: (layer.received_at, layer.id),
+                )
+            shortfalls = pending[key]
+            layers = open_layers[key]
+            while shortfalls and layers:
+                layer = layers[0]
+                movement_id, needed = shortfalls[0]
+                taken = min(needed, layer.remaining)
+                layer.remaining -= taken
+                consumptions.append(CostLayerConsumption(layer_id=layer.id, movement_id=movement_id, qty=taken))
+                if taken == needed:
+                    shortfalls.popleft()
+                else:
+                    shortfalls[0] = (movement_id, needed - taken)
+                if layer.remaining == 0:
+                    closed.append(layers.pop(0))
+        counts["movements"] += 1
+        if counts["movements"] % chunk_size == 0:
+            flush(closed)
+            closed = []
+
+    consumptions.extend(
+        CostLayerConsumption(layer_id=None, movement_id=movement_id, qty=qty)
+        for shortfalls in pending.values()
+        for movement_id, qty in shortfalls
+    )
+    flush(closed + [layer for layers in open_layers.values() for layer in layers])
+    return counts
+
@@ -1,14 +1,72 @@
 from decimal import Decimal
+import asyncio
+import gc
+import io
+import json
+import os
+import tempfile
 import threading
+from datetime import date, timedelta
+import psycopg
+from asgiref.sync import sync_to_async
 from django.test import TestCase, TransactionTestCase
-from django.contrib.auth.models import User
-from django.core.exceptions import PermissionDenied
-from django.db import connections
-from wms.masters.models import Warehouse, Item, Vendor, OutgoingLocation
-from wms.purchasing.models import PurchaseHeader, PurchaseLine
+from django.contrib.auth.models import User, Permission
+from rest_framework.test import APIClient
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, connections, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from wms.masters.models import Warehouse, Item, Vendor, VendorItem, OutgoingLocation
+from wms.purchasing.models import PurchaseHeader, PurchaseLine, VendorPriceHistory
 from wms.issuing.models import IssueHeader, IssueLine
-from wms.inventory.models import StockBalance
-from wms.inventory.services import post_purchase, post_issue, apply_movement
+from wms.inventory.models import (
+    CostLayer,
+    ConsumptionRollup,
+    CostLayerConsumption,
+    ReorderSuggestion,
+    StockBalance,
+    StockMovement,
+    StockOutboxEvent,
+    StockSnapshot,
+    TransferHeader,
+    TransferLine,
+)
+from wms.inventory.listener import balance_listener
+from wms.inventory.outbox import CallbackSink, FileSink, relay_batch
+from wms.inventory.reports import (
+    best_recent_price,
+    classify_items,
+    compute_reorder_suggestions,
+    day_start,
+    period_summary,
+    stock_aging,
+    stock_valuation,
+    vendor_spend,
+)
+from wms.inventory.services import (
+    post_purchase,
+    post_issue,
+    apply_movement,
+    find_stock_mismatches,
+    unpost_issue_inventory,
+    unpost_purchase_inventory,
+    post_documents_bulk,
+    post_transfer,
+    unpost_transfer_inventory,
+    delete_purchase_with_inventory,
+    delete_issue_with_inventory,
+    fifo_stock_value,
+    create_reorder_purchases,
+    quantize_money,
+    quantize_qty,
+    quantize_cost,
+    repair_stock_balances,
+    delete_balances,
+    BALANCE_CHANNEL,
+)
 
 
 class InventoryTests(TestCase):
@@ -60,6 +118,1636 @@ class InventoryTests(TestCase):
             post_issue(issue, self.user)
 
 
+RELAYED = []
+
+
+def collect_relayed(messages):
+    RELAYED.extend(messages)
+
+
+def reject_relayed(messages):
+    raise ConnectionError("sink down")
+
+
+def reject_issues(messages):
+    if any(message["type"].startswith("issue.") for message in messages):
+        raise ValueError("rejected")
+    RELAYED.extend(messages)
+
+
+class StockOutboxTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("outbox", password="pass")
+        self.warehouse = Warehouse.objects.create(name="WH", location="L")
+        self.vendor = Vendor.objects.create(name="Vendor")
+        self.outgoing = OutgoingLocation.objects.create(name="Dept", type="department")
+        self.item = Item.objects.create(internal_code="I9", name="Item9", unit="pcs")
+        self.purchase = PurchaseHeader.objects.create(
+            vendor=self.vendor,
+            warehouse=self.warehouse,
+            invoice_no="INV-OUT",
+            invoice_date="2026-02-06",
+            created_by=self.user,
+        )
+        PurchaseLine.objects.create(
+            purchase=self.purchase,
+            item=self.item,
+            qty=Decimal("5"),
+            unit_price=Decimal("1.00"),
+            line_total=Decimal("5.00"),
+        )
+        RELAYED.clear()
+
+    def _issue(self, qty):
+        issue = IssueHeader.objects.create(
+            warehouse=self.warehouse,
+            outgoing_location=self.outgoing,
+            issue_date="2026-02-07",
+            created_by=self.user,
+        )
+        IssueLine.objects.create(header=issue, item=self.item, qty=Decimal(qty))
+        return issue
+
+    def _events(self):
+        return [
+            (event.event_type, event.reference_id, event.payload["deltas"])
+            for event in StockOutboxEvent.objects.order_by("id")
+        ]
+
+    def test_services_append_events_in_their_transaction(self):
+        post_purchase(self.purchase, self.user)
+        issue = self._issue("2")
+        post_issue(issue, self.user)
+        unpost_issue_inventory(issue)
+        with self.assertRaises(PermissionDenied):
+            post_issue(self._issue("50"), self.user)
+
+        key = [self.warehouse.id, self.item.id]
+        self.assertEqual(
+            self._events(),
+            [
+                ("purchase.posted", self.purchase.id, [key + ["5.000"]]),
+                ("issue.posted", issue.id, [key + ["-2.000"]]),
+                ("issue.unposted", issue.id, [key + ["2.000"]]),
+            ],
+        )
+
+        bulk = [self._issue("1"), self._issue("1")]
+        posted, rejected = post_documents_bulk(IssueHeader, [issue.id for issue in bulk], self.user)
+        self.assertEqual(len(posted), 2)
+        self.assertEqual(self._events()[-2:], [("issue.posted", pk, [key + ["-1.000"]]) for pk in posted])
+
+    def test_relay_delivers_to_every_sink_once(self):
+        post_purchase(self.purchase, self.user)
+        post_issue(self._issue("1"), self.user)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "events.ndjson")
+            out = io.StringIO()
+            call_command(
+                "relay_stock_events",
+                f"--sink=file:{path}",
+                "--sink=callback:wms.inventory.tests.collect_relayed",
+                batch_size=1,
+                stdout=out,
+            )
+            with open(path) as fh:
+                written = [json.loads(line) for line in fh]
+        self.assertEqual([message["type"] for message in written], ["purchase.posted", "issue.posted"])
+        self.assertEqual(RELAYED, written)
+        self.assertIn("batches=2 events=2 failures=0", out.getvalue())
+        self.assertFalse(StockOutboxEvent.objects.filter(dispatched_at__isnull=True).exists())
+
+        self.assertEqual(relay_batch([FileSink(os.devnull)]), 0)
+
+    def test_failed_sink_keeps_events_pending(self):
+        post_purchase(self.purchase, self.user)
+        with self.assertRaises(CommandError):
+            call_command(
+                "relay_stock_events",
+                "--sink=callback:wms.inventory.tests.reject_relayed",
+                stdout=io.StringIO(),
+                stderr=io.StringIO(),
+            )
+        event = StockOutboxEvent.objects.get()
+        self.assertIsNone(event.dispatched_at)
+        self.assertEqual(event.attempts, 1)
+        self.assertEqual(event.last_error, "ConnectionError: sink down")
+
+        call_command("relay_stock_events", "--sink=callback:wms.inventory.tests.collect_relayed", stdout=io.StringIO())
+        self.assertEqual([message["id"] for message in RELAYED], [event.id])
+
+    def test_rejected_event_does_not_hold_back_the_batch(self):
+        issue = self._issue("1")
+        post_purchase(self.purchase, self.user)
+        post_issue(issue, self.user)
+        unpost_issue_inventory(issue)
+        post_issue(issue, self.user)
+        sink = CallbackSink(reject_issues)
+        for attempt in range(2):
+            with self.assertRaises(ValueError):
+                relay_batch([sink], max_attempts=2)
+        self.assertEqual([message["type"] for message in RELAYED], ["purchase.posted"])
+        self.assertEqual(
+            [
+                (event.event_type, event.attempts, event.dispatched_at is None)
+                for event in StockOutboxEvent.objects.order_by("id")
+            ],
+            [("purchase.posted", 1, False), ("issue.posted", 2, True), ("issue.unposted", 2, True), ("issue.posted", 2, True)],
+        )
+        self.assertEqual(relay_batch([sink], max_attempts=2), 0)
+
+    def test_force_deleting_stock_records_an_event(self):
+        post_purchase(self.purchase, self.user)
+        other = Item.objects.create(internal_code="I9B", name="Empty", unit="pcs")
+        StockBalance.objects.create(warehouse=self.warehouse, item=other, on_hand=0)
+        StockOutboxEvent.objects.all().delete()
+
+        delete_balances(StockBalance.objects.filter(item=other))
+        self.assertEqual(self._events(), [])
+
+        self.client.force_login(User.objects.create_superuser("admin9", "admin9@example.com", "pass"))
+        self.client.post(reverse("item_delete", args=[self.item.id]), {"force": "1"})
+        self.assertFalse(Item.objects.filter(pk=self.item.pk).exists())
+        self.assertEqual(
+            self._events(), [("stock.balance_deleted", None, [[self.warehouse.id, self.item.id, "-5.000"]])]
+        )
+
+
+class AverageCostTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("costs", password="pass")
+        self.warehouse = Warehouse.objects.create(name="WH", location="L")
+        self.other_warehouse = Warehouse.objects.create(name="WH2", location="L")
+        self.vendor = Vendor.objects.create(name="Vendor")
+        self.outgoing = OutgoingLocation.objects.create(name="Dept", type="department")
+        self.item = Item.objects.create(internal_code="I10", name="Item10", unit="pcs")
+
+    def _purchase(self, qty, price):
+        purchase = PurchaseHeader.objects.create(
+            vendor=self.vendor,
+            warehouse=self.warehouse,
+            invoice_no=f"INV-{qty}-{price}",
+            invoice_date="2026-02-06",
+            created_by=self.user,
+        )
+        PurchaseLine.objects.create(
+            purchase=purchase,
+            item=self.item,
+            qty=Decimal(qty),
+            unit_price=Decimal(price),
+            line_total=Decimal(qty) * Decimal(price),
+        )
+        return purchase
+
+    def _issue(self, qty):
+        issue = IssueHeader.objects.create(
+            warehouse=self.warehouse,
+            outgoing_location=self.outgoing,
+            issue_date="2026-02-07",
+            created_by=self.user,
+        )
+        IssueLine.objects.create(header=issue, item=self.item, qty=Decimal(qty))
+        return issue
+
+    def _transfer(self, qty):
+        transfer = TransferHeader.objects.create(
+            from_warehouse=self.warehouse,
+            to_warehouse=self.other_warehouse,
+            date="2026-02-08",
+            created_by=self.user,
+        )
+        TransferLine.objects.create(header=transfer, item=self.item, qty=Decimal(qty))
+        return transfer
+
+    def _cost(self, warehouse):
+        balance = StockBalance.objects.get(warehouse=warehouse, item=self.item)
+        return str(balance.on_hand), str(balance.avg_cost), str(balance.stock_value)
+
+    def test_average_follows_postings_and_reversals(self):
+        post_purchase(self._purchase("10", "2.00"), self.user)
+        second = self._purchase("20", "3.50")
+        post_purchase(second, self.user)
+        self.assertEqual(self._cost(self.warehouse), ("30.000", "3.0000", "90.00"))
+
+        issue = self._issue("6")
+        post_issue(issue, self.user)
+        movement = StockMovement.objects.get(reference_type="issue", reference_id=issue.id)
+        self.assertEqual((movement.unit_cost, movement.value_delta), (Decimal("3.00"), Decimal("-18.00")))
+        self.assertEqual(self._cost(self.warehouse), ("24.000", "3.0000", "72.00"))
+
+        transfer = self._transfer("4")
+        post_transfer(transfer, self.user)
+        self.assertEqual(self._cost(self.warehouse), ("20.000", "3.0000", "60.00"))
+        self.assertEqual(self._cost(self.other_warehouse), ("4.000", "3.0000", "12.00"))
+
+        unpost_transfer_inventory(transfer)
+        self.assertEqual(self._cost(self.other_warehouse), ("0.000", "3.0000", "0.00"))
+        unpost_issue_inventory(issue)
+        delete_purchase_with_inventory(second)
+        self.assertEqual(self._cost(self.warehouse), ("10.000", "2.0000", "20.00"))
+
+    def test_issuing_everything_leaves_no_value_behind(self):
+        post_purchase(self._purchase("3", "1.00"), self.user)
+        post_purchase(self._purchase("3", "2.00"), self.user)
+        post_issue(self._issue("1"), self.user)
+        post_issue(self._issue("5"), self.user)
+        self.assertEqual(self._cost(self.warehouse), ("0.000", "1.5000", "0.00"))
+
+    def test_bulk_posting_and_rebuild_match_single_posting(self):
+        post_purchase(self._purchase("10", "2.00"), self.user)
+        post_purchase(self._purchase("5", "3.10"), self.user)
+        post_issue(self._issue("7"), self.user)
+        post_transfer(self._transfer("3"), self.user)
+        expected = [self._cost(self.warehouse), self._cost(self.other_warehouse)]
+        expected_movements = list(StockMovement.objects.order_by("id").values_list("unit_cost", "value_delta"))
+        expected_rollup = list(ConsumptionRollup.objects.values_list("month", "item_id", "qty", "value"))
+        self.assertEqual(expected_rollup[0][3], Decimal("16.57"))
+
+        call_command("rebuild_average_costs", stdout=io.StringIO())
+        self.assertEqual([self._cost(self.warehouse), self._cost(self.other_warehouse)], expected)
+
+        StockMovement.objects.exclude(movement_type=StockMovement.TYPE_IN_PURCHASE).update(unit_cost=None)
+        StockMovement.objects.update(value_delta=None)
+        StockBalance.objects.update(avg_cost=0, stock_value=0)
+        ConsumptionRollup.objects.update(value=0)
+        before = dict(StockMovement.objects.values_list("id", "change_seq"))
+        call_command("rebuild_average_costs", stdout=io.StringIO())
+        self.assertEqual([self._cost(self.warehouse), self._cost(self.other_warehouse)], expected)
+        for movement_id, change_seq in StockMovement.objects.values_list("id", "change_seq"):
+            self.assertGreater(change_seq, before[movement_id])
+        self.assertEqual(
+            list(StockMovement.objects.order_by("id").values_list("unit_cost", "value_delta")), expected_movements
+        )
+        self.assertEqual(list(ConsumptionRollup.objects.values_list("month", "item_id", "qty", "value")), expected_rollup)
+
+        StockBalance.objects.all().delete()
+        StockMovement.objects.all().delete()
+        documents = [self._purchase("10", "2.00"), self._purchase("5", "3.10")]
+        post_documents_bulk(PurchaseHeader, [document.id for document in documents], self.user)
+        post_documents_bulk(IssueHeader, [self._issue("7").id], self.user)
+        post_documents_bulk(TransferHeader, [self._transfer("3").id], self.user)
+        self.assertEqual([self._cost(self.warehouse), self._cost(self.other_warehouse)], expected)
+
+
+class FIFOCostLayerTests(TestCase):
+    setUp = AverageCostTests.setUp
+    _purchase = AverageCostTests._purchase
+    _issue = AverageCostTests._issue
+    _transfer = AverageCostTests._transfer
+
+    def _layers(self):
+        return list(
+            CostLayer.objects.order_by("warehouse_id", "received_at", "id").values_list(
+                "warehouse_id", "qty", "remaining", "unit_cost", "received_at"
+            )
+        )
+
+    def test_outgoing_movements_consume_oldest_layers(self):
+        first = self._purchase("10", "2.00")
+        post_purchase(first, self.user)
+        post_purchase(self._purchase("20", "3.50"), self.user)
+        issue = self._issue("12")
+        post_issue(issue, self.user)
+        self.assertEqual(
+            list(CostLayer.objects.order_by("id").values_list("remaining", flat=True)), [Decimal("0"), Decimal("18")]
+        )
+        self.assertEqual(CostLayerConsumption.objects.filter(movement__reference_id=issue.id).count(), 2)
+
+        transfer = self._transfer("4")
+        post_transfer(transfer, self.user)
+        source = CostLayer.objects.get(warehouse=self.warehouse, remaining__gt=0)
+        moved = CostLayer.objects.get(warehouse=self.other_warehouse)
+        self.assertEqual((moved.remaining, moved.unit_cost), (Decimal("4"), Decimal("3.5")))
+        self.assertEqual(moved.received_at, source.received_at)
+        self.assertEqual(
+            fifo_stock_value(),
+            {
+                self.warehouse.id: (Decimal("14"), Decimal("49.00")),
+                self.other_warehouse.id: (Decimal("4"), Decimal("14.00")),
+            },
+        )
+
+        unpost_transfer_inventory(transfer)
+        unpost_issue_inventory(issue)
+        self.assertEqual(
+            list(CostLayer.objects.order_by("id").values_list("remaining", flat=True)), [Decimal("10"), Decimal("20")]
+        )
+        self.assertFalse(CostLayerConsumption.objects.exists())
+
+        delete_purchase_with_inventory(first)
+        self.assertEqual(fifo_stock_value(), {self.warehouse.id: (Decimal("20"), Decimal("70.00"))})
+
+    def test_unposting_a_consumed_receipt_moves_consumptions_to_later_layers(self):
+        first = self._purchase("10", "2.00")
+        post_purchase(first, self.user)
+        post_purchase(self._purchase("10", "3.00"), self.user)
+        issue = self._issue("5")
+        post_issue(issue, self.user)
+
+        unpost_purchase_inventory(first)
+        self.assertEqual(StockBalance.objects.get(warehouse=self.warehouse).on_hand, Decimal("5.000"))
+        self.assertEqual(fifo_stock_value(), {self.warehouse.id: (Decimal("5"), Decimal("15.00"))})
+        self.assertEqual(
+            CostLayerConsumption.objects.filter(movement__reference_id=issue.id).get().layer.unit_cost, Decimal("3")
+        )
+
+        unpost_issue_inventory(issue)
+        self.assertEqual(fifo_stock_value(), {self.warehouse.id: (Decimal("10"), Decimal("30.00"))})
+        self.assertFalse(CostLayerConsumption.objects.exists())
+
+    def test_negative_stock_shortfall_nets_against_the_next_receipt(self):
+        post_purchase(self._purchase("4", "2.00"), self.user)
+        self.user.user_permissions.add(Permission.objects.get(codename="override_negative_stock"))
+        self.user = User.objects.get(pk=self.user.pk)
+        issue = self._issue("10")
+        post_issue(issue, self.user, override_reason="Counted later")
+        pending = CostLayerConsumption.objects.get(layer__isnull=True)
+        self.assertEqual(pending.qty, Decimal("6"))
+        self.assertEqual(fifo_stock_value(), {})
+
+        post_purchase(self._purchase("5", "3.00"), self.user)
+        self.assertEqual(CostLayerConsumption.objects.get(layer__isnull=True).qty, Decimal("1"))
+        self.assertEqual(fifo_stock_value(), {})
+        receipt = self._purchase("8", "3.00")
+        post_purchase(receipt, self.user)
+        self.assertFalse(CostLayerConsumption.objects.filter(layer__isnull=True).exists())
+        self.assertEqual(StockBalance.objects.get(warehouse=self.warehouse).on_hand, Decimal("7.000"))
+        self.assertEqual(fifo_stock_value(), {self.warehouse.id: (Decimal("7"), Decimal("21.00"))})
+        expected = self._layers()
+        call_command("rebuild_cost_layers", chunk_size=2, stdout=io.StringIO())
+        self.assertEqual(self._layers(), expected)
+
+        unpost_purchase_inventory(receipt)
+        self.assertEqual(CostLayerConsumption.objects.get(layer__isnull=True).qty, Decimal("1"))
+        self.assertEqual(fifo_stock_value(), {})
+        unpost_issue_inventory(issue)
+        self.assertFalse(CostLayerConsumption.objects.exists())
+        self.assertEqual(fifo_stock_value(), {self.warehouse.id: (Decimal("9"), Decimal("23.00"))})
+
+    def test_rebuild_and_bulk_posting_match_single_posting(self):
+        post_purchase(self._purchase("10", "2.00"), self.user)
+        post_purchase(self._purchase("5", "3.10"), self.user)
+        post_issue(self._issue("7"), self.user)
+        post_transfer(self._transfer("6"), self.user)
+        post_issue(self._issue("1"), self.user)
+        expected = self._layers()
+        expected_value = fifo_stock_value()
+        consumptions = CostLayerConsumption.objects.count()
+
+        call_command("rebuild_cost_layers", chunk_size=2, stdout=io.StringIO())
+        self.assertEqual(self._layers(), expected)
+        self.assertEqual(CostLayerConsumption.objects.count(), consumptions)
+        self.assertEqual(fifo_stock_value(), expected_value)
+
+        StockBalance.objects.all().delete()
+        StockMovement.objects.all().delete()
+        self.assertFalse(CostLayer.objects.exists())
+        documents = [self._purchase("10", "2.00"), self._purchase("5", "3.10")]
+        post_documents_bulk(PurchaseHeader, [document.id for document in documents], self.user)
+        post_documents_bulk(IssueHeader, [self._issue("7").id], self.user)
+        post_documents_bulk(TransferHeader, [self._transfer("6").id], self.user)
+        post_documents_bulk(IssueHeader, [self._issue("1").id], self.user)
+        self.assertEqual(fifo_stock_value(), expected_value)
+        self.assertEqual(CostLayerConsumption.objects.count(), consumptions)
+
+
+class StockReportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser("valuation", "valuation@example.com", "pass")
+        self.warehouse = Warehouse.objects.create(name="WH", location="L")
+        self.other_warehouse = Warehouse.objects.create(name="WH2", location="L")
+        self.vendor = Vendor.objects.create(name="Vendor")
+        self.other_vendor = Vendor.objects.create(name="Other Vendor")
+        self.outgoing = OutgoingLocation.objects.create(name="Dept", type="department")
+        self.bolt = Item.objects.create(name="Bolt", unit="pcs", category="Hardware")
+        self.paint = Item.objects.create(name="Paint", unit="l", category="Paint")
+        self._purchase(self.vendor, self.warehouse, self.bolt, "10", "2.00", date(2026, 1, 10))
+        self._purchase(self.other_vendor, self.other_warehouse, self.paint, "5", "4.00", date(2026, 1, 20))
+        issue = IssueHeader.objects.create(
+            warehouse=self.warehouse,
+            outgoing_location=self.outgoing,
+            issue_date="2026-01-25",
+            created_by=self.user,
+        )
+        IssueLine.objects.create(header=issue, item=self.bolt, qty=Decimal("4"))
+        post_issue(issue, self.user)
+        StockMovement.objects.filter(reference_type="issue", reference_id=issue.id).update(
+            created_at=day_start(date(2026, 1, 25))
+        )
+
+    def _purchase(self, vendor, warehouse, item, qty, price, day):
+        purchase = PurchaseHeader.objects.create(
+            vendor=vendor,
+            warehouse=warehouse,
+            invoice_no=f"INV-{item.name}",
+            invoice_date=day,
+            created_by=self.user,
+        )
+        PurchaseLine.objects.create(
+            purchase=purchase,
+            item=item,
+            qty=Decimal(qty),
+            unit_price=Decimal(price),
+            line_total=Decimal(qty) * Decimal(price),
+        )
+        post_purchase(purchase, self.user)
+        StockMovement.objects.filter(reference_type="purchase", reference_id=purchase.id).update(
+            created_at=day_start(day)
+        )
+
+    def _summary(self, *args, **kwargs):
+        return [(row["label"], row["items"], str(row["qty"]), str(row["value"])) for row in stock_valuation(*args, **kwargs)]
+
+    def test_rollups_at_any_date(self):
+        self.assertEqual(self._summary("warehouse"), [("WH2", 1, "5.000", "20.00"), ("WH", 1, "6.000", "12.00")])
+        self.assertEqual(self._summary("category"), [("Paint", 1, "5.000", "20.00"), ("Hardware", 1, "6.000", "12.00")])
+        self.assertEqual(self._summary("vendor", as_of=date(2026, 1, 15)), [("Vendor", 1, "10.000", "20.00")])
+        self.assertEqual(
+            self._summary("warehouse", as_of=date(2026, 1, 22), warehouse_ids=[self.warehouse.id]),
+            [("WH", 1, "10.000", "20.00")],
+        )
+
+    def test_reports_start_from_the_latest_snapshot(self):
+        call_command("snapshot_stock", date="2026-01-15", stdout=io.StringIO())
+        snapshot = StockSnapshot.objects.get()
+        self.assertEqual((snapshot.on_hand, snapshot.stock_value), (Decimal("10.000"), Decimal("20.00")))
+
+        StockSnapshot.objects.update(stock_value=Decimal("25.00"))
+        self.assertEqual(
+            self._summary("warehouse", as_of=date(2026, 1, 22)),
+            [("WH", 1, "10.000", "25.00"), ("WH2", 1, "5.000", "20.00")],
+        )
+        self.assertEqual(self._summary("warehouse", as_of=date(2026, 1, 12)), [("WH", 1, "10.000", "20.00")])
+
+    def test_period_closing_matches_balances_after_unposting(self):
+        call_command("snapshot_stock", date="2026-01-26", stdout=io.StringIO())
+        unpost_purchase_inventory(PurchaseHeader.objects.get(invoice_no="INV-Paint"))
+
+        closing = {
+            (row["warehouse_id"], row["item_id"]): row["closing"]
+            for row in period_summary(date(2026, 1, 27), timezone.localdate())
+            if row["closing"]
+        }
+        balances = {
+            (balance.warehouse_id, balance.item_id): balance.on_hand for balance in StockBalance.objects.exclude(on_hand=0)
+        }
+        self.assertEqual(closing, balances)
+        self.assertEqual(closing, {(self.warehouse.id, self.bolt.id): Decimal("6.000")})
+
+    def test_unposting_an_older_document_corrects_later_snapshots(self):
+        call_command("snapshot_stock", date="2026-01-12", stdout=io.StringIO())
+        call_command("snapshot_stock", date="2026-01-26", stdout=io.StringIO())
+        unpost_purchase_inventory(PurchaseHeader.objects.get(invoice_no="INV-Paint"))
+
+        self.assertEqual(
+            list(StockSnapshot.objects.order_by("date").values_list("date", "item__name", "on_hand", "stock_value")),
+            [
+                (date(2026, 1, 12), "Bolt", Decimal("10.000"), Decimal("20.00")),
+                (date(2026, 1, 26), "Bolt", Decimal("6.000"), Decimal("12.00")),
+            ],
+        )
+        self.assertEqual(self._summary("warehouse", as_of=date(2026, 1, 27)), [("WH", 1, "6.000", "12.00")])
+        self.assertEqual(self._summary("warehouse", as_of=timezone.localdate()), self._summary("warehouse"))
+
+        unpost_issue_inventory(IssueHeader.objects.get())
+        self.assertEqual(
+            list(StockSnapshot.objects.order_by("date").values_list("on_hand", flat=True)),
+            [Decimal("10.000"), Decimal("10.000")],
+        )
+
+    def test_view_and_exports(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("stock_valuation") + "?group=category&date=22/01/2026")
+        self.assertContains(response, "Hardware")
+        self.assertEqual(response.context["total_value"], Decimal("40.00"))
+
+        response = self.client.get(reverse("stock_valuation") + "?group=vendor&export=csv")
+        self.assertEqual(
+            response.content.decode().splitlines(),
+            ["vendor,items,qty,value", "Other Vendor,1,5.000,20.00", "Vendor,1,6.000,12.00"],
+        )
+        response = self.client.get(reverse("stock_valuation") + "?export=xlsx")
+        self.assertEqual(response.status_code, 200)
+
+    def _period(self, date_from, date_to):
+        return [
+            (row["warehouse"], row["item"], str(row["opening"]), str(row["purchased"]), str(row["issued"]), str(row["closing"]))
+            for row in period_summary(date_from, date_to)
+        ]
+
+    def test_period_summary(self):
+        self.assertEqual(
+            self._period(date(2026, 1, 15), date(2026, 1, 31)),
+            [("WH", "Bolt", "10.000", "0.000", "-4.000", "6.000"), ("WH2", "Paint", "0.000", "5.000", "0.000", "5.000")],
+        )
+        self.assertEqual(self._period(date(2026, 1, 1), date(2026, 1, 12)), [("WH", "Bolt", "0.000", "10.000", "0.000", "10.000")])
+
+        call_command("snapshot_stock", date="2026-01-12", stdout=io.StringIO())
+        StockSnapshot.objects.update(on_hand=Decimal("11.000"))
+        self.assertEqual(
+            self._period(date(2026, 1, 15), date(2026, 1, 24)),
+            [("WH", "Bolt", "11.000", "0.000", "0.000", "11.000"), ("WH2", "Paint", "0.000", "5.000", "0.000", "5.000")],
+        )
+
+        self.client.force_login(self.user)
+        response = self.client.get(
+            reverse("stock_period_summary") + f"?date_from=15/01/2026&date_to=31/01/2026&warehouse={self.warehouse.id}&export=csv"
+        )
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], "warehouse_id,warehouse,item_id,item,unit,opening,purchased,issued,transferred_in,transferred_out,adjusted,closing")
+        self.assertEqual(lines[1:], [f"{self.warehouse.id},WH,{self.bolt.id},Bolt,pcs,11.000,0.000,-4.000,0.000,0.000,0.000,7.000"])
+
+
+class ConsumptionRollupTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser("consumer", "consumer@example.com", "pass")
+        self.warehouse = Warehouse.objects.create(name="WH", location="L")
+        self.vendor = Vendor.objects.create(name="Vendor")
+        self.project = OutgoingLocation.objects.create(name="Project A", type="project")
+        self.department = OutgoingLocation.objects.create(name="Dept", type="department")
+        self.cable = Item.objects.create(name="Cable", unit="m", category="Electrical")
+        self.glove = Item.objects.create(name="Glove", unit="pcs", category="Safety")
+        purchase = PurchaseHeader.objects.create(
+            vendor=self.vendor, warehouse=self.warehouse, invoice_no="INV-C", invoice_date="2026-01-05", created_by=self.user
+        )
+        PurchaseLine.objects.create(purchase=purchase, item=self.cable, qty=Decimal("100"), unit_price=Decimal("2.00"), line_total=Decimal("200.00"))
+        PurchaseLine.objects.create(purchase=purchase, item=self.glove, qty=Decimal("50"), unit_price=Decimal("1.00"), line_total=Decimal("50.00"))
+        post_purchase(purchase, self.user)
+
+    def _issue(self, location, day, **quantities):
+        issue = IssueHeader.objects.create(
+            warehouse=self.warehouse, outgoing_location=location, issue_date=day, created_by=self.user
+        )
+        for name, qty in quantities.items():
+            IssueLine.objects.create(header=issue, item=getattr(self, name), qty=Decimal(qty))
+        return issue
+
+    def _rollup(self):
+        return sorted(
+            (str(month), location, item, str(qty), str(value))
+            for month, location, item, qty, value in ConsumptionRollup.objects.exclude(qty=0).values_list(
+                "month", "outgoing_location__name", "item__name", "qty", "value"
+            )
+        )
+
+    def test_issue_services_maintain_the_monthly_rollup(self):
+        first = self._issue(self.project, "2026-01-10", cable="10", glove="4")
+        post_issue(first, self.user)
+        post_issue(self._issue(self.project, "2026-01-20", cable="5"), self.user)
+        second = self._issue(self.department, "2026-02-03", glove="6")
+        post_issue(second, self.user)
+        self.assertEqual(
+            self._rollup(),
+            [
+                ("2026-01-01", "Project A", "Cable", "15.000", "30.00"),
+                ("2026-01-01", "Project A", "Glove", "4.000", "4.00"),
+                ("2026-02-01", "Dept", "Glove", "6.000", "6.00"),
+            ],
+        )
+
+        unpost_issue_inventory(first)
+        delete_issue_with_inventory(second)
+        self.assertEqual(self._rollup(), [("2026-01-01", "Project A", "Cable", "5.000", "10.00")])
+
+        post_documents_bulk(IssueHeader, [first.id, self._issue(self.department, "2026-02-09", glove="1").id], self.user)
+        self.assertEqual(
+            self._rollup(),
+            [
+                ("2026-01-01", "Project A", "Cable", "15.000", "30.00"),
+                ("2026-01-01", "Project A", "Glove", "4.000", "4.00"),
+                ("2026-02-01", "Dept", "Glove", "1.000", "1.00"),
+            ],
+        )
+
+    def test_report_and_api(self):
+        post_issue(self._issue(self.project, "2026-01-10", cable="10", glove="4"), self.user)
+        post_issue(self._issue(self.project, "2026-02-10", cable="3"), self.user)
+        post_issue(self._issue(self.department, "2026-02-11", glove="2"), self.user)
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.get(f"/api/consumption/?group=item&location={self.project.id}&month_from=2026-01&month_to=2026-03")
+        self.assertFalse([query for query in ctx.captured_queries if "issuing_issueline" in query["sql"]])
+        self.assertEqual(
+            [(row["item_name"], row["qty"], row["value"]) for row in response.json()["results"]],
+            [("Cable", "13.000", "26.00"), ("Glove", "4.000", "4.00")],
+        )
+        response = client.get("/api/consumption/?group=category,month&month_from=2026-02")
+        self.assertEqual(
+            [(row["category"], row["month"], row["qty"]) for row in response.json()["results"]],
+            [("Electrical", "2026-02-01", "3.000"), ("Safety", "2026-02-01", "2.000")],
+        )
+        self.assertEqual(client.get("/api/consumption/?group=vendor").status_code, 400)
+
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("consumption_report") + "?group=location&month_from=2026-01&month_to=2026-02&export=csv")
+        self.assertEqual(
+            response.content.decode().splitlines(),
+            ["location_name,qty,value", "Project A,17.000,30.00", "Dept,2.000,2.00"],
+        )
+        response = self.client.get(reverse("consumption_report") + "?group=month&then=location&month_from=2026-01")
+        self.assertEqual(response.context["total_value"], Decimal("32.00"))
+
+
+class VendorPriceHistoryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser("buyer", "buyer@example.com", "pass")
+        self.warehouse = Warehouse.objects.create(name="WH", location="L")
+        self.acme = Vendor.objects.create(name="Acme")
+        self.bolt = Vendor.objects.create(name="Bolt")
+        self.cable = Item.objects.create(name="Cable", unit="m", category="Electrical")
+        self.glove = Item.objects.create(name="Glove", unit="pcs", category="Safety")
+
+    def _purchase(self, vendor, day, *lines, currency="AZN", exchange_rate=None):
+        purchase = PurchaseHeader.objects.create(
+            vendor=vendor,
+            warehouse=self.warehouse,
+            invoice_no=f"INV-{PurchaseHeader.objects.count()}",
+            invoice_date=day,
+            currency=currency,
+            exchange_rate=exchange_rate,
+            created_by=self.user,
+        )
+        for item, qty, price in lines:
+            PurchaseLine.objects.create(
+                purchase=purchase,
+                item=item,
+                qty=Decimal(qty),
+                unit_price=Decimal(price),
+                line_total=Decimal(qty) * Decimal(price),
+            )
+        return purchase
+
+    def _history(self):
+        return sorted(
+            (row.vendor.name, str(row.month), row.item.name, row.line_count, str(row.qty), str(row.spend),
+             str(row.min_price), str(row.max_price), str(row.avg_price), str(row.last_price))
+            for row in VendorPriceHistory.objects.select_related("vendor", "item")
+        )
+
+    def test_posting_services_keep_the_monthly_prices_exact(self):
+        first = self._purchase(self.acme, "2026-03-02", (self.cable, "10", "2.00"), (self.glove, "5", "1.00"))
+        post_purchase(first, self.user)
+        second = self._purchase(self.acme, "2026-03-20", (self.cable, "30", "3.00"))
+        post_purchase(second, self.user)
+        self.assertEqual(
+            self._history(),
+            [
+                ("Acme", "2026-03-01", "Cable", 2, "40.000", "110.00", "2.00", "3.00", "2.7500", "3.00"),
+                ("Acme", "2026-03-01", "Glove", 1, "5.000", "5.00", "1.00", "1.00", "1.0000", "1.00"),
+            ],
+        )
+
+        unpost_purchase_inventory(second)
+        self.assertEqual(
+            self._history()[0], ("Acme", "2026-03-01", "Cable", 1, "10.000", "20.00", "2.00", "2.00", "2.0000", "2.00")
+        )
+        delete_purchase_with_inventory(first)
+        self.assertEqual(self._history(), [])
+
+        third = self._purchase(self.bolt, "2026-04-01", (self.cable, "4", "2.50"))
+        post_documents_bulk(PurchaseHeader, [second.id, third.id], self.user)
+        self.assertEqual(
+            self._history(),
+            [
+                ("Acme", "2026-03-01", "Cable", 1, "30.000", "90.00", "3.00", "3.00", "3.0000", "3.00"),
+                ("Bolt", "2026-04-01", "Cable", 1, "4.000", "10.00", "2.50", "2.50", "2.5000", "2.50"),
+            ],
+        )
+
+    def test_refresh_updates_rows_in_place_and_drops_gone_currencies(self):
+        post_purchase(self._purchase(self.acme, "2026-03-02", (self.cable, "10", "2.00")), self.user)
+        row_id = VendorPriceHistory.objects.get().id
+        dollars = self._purchase(self.acme, "2026-03-05", (self.cable, "2", "1.00"), currency="USD", exchange_rate="1.70")
+        post_purchase(dollars, self.user)
+        post_purchase(self._purchase(self.acme, "2026-03-09", (self.cable, "10", "3.00")), self.user)
+        self.assertEqual(VendorPriceHistory.objects.get(currency="AZN").id, row_id)
+        self.assertEqual(VendorPriceHistory.objects.get(currency="AZN").line_count, 2)
+
+        unpost_purchase_inventory(dollars)
+        self.assertEqual(list(VendorPriceHistory.objects.values_list("id", "currency")), [(row_id, "AZN")])
+
+    def test_foreign_currency_receipts_are_valued_in_default_currency(self):
+        post_purchase(self._purchase(self.acme, "2026-03-02", (self.cable, "10", "2.00")), self.user)
+        post_purchase(self._purchase(self.bolt, "2026-03-03", (self.cable, "10", "1.00"), currency="USD", exchange_rate="1.70"), self.user)
+        balance = StockBalance.objects.get(warehouse=self.warehouse, item=self.cable)
+        self.assertEqual((balance.stock_value, balance.avg_cost), (Decimal("37.00"), Decimal("1.8500")))
+        self.assertEqual(set(StockMovement.objects.values_list("currency", flat=True)), {"AZN"})
+
+        unrated = self._purchase(self.bolt, "2026-03-04", (self.cable, "5", "1.00"), currency="USD")
+        with self.assertRaises(ValidationError):
+            post_purchase(unrated, self.user)
+        posted, rejected = post_documents_bulk(PurchaseHeader, [unrated.id], self.user)
+        self.assertEqual((posted, list(rejected)), ([], [unrated.id]))
+        self.assertFalse(PurchaseHeader.objects.get(pk=unrated.id).is_posted)
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        payload = {
+            "vendor": self.bolt.id,
+            "warehouse": self.warehouse.id,
+            "invoice_date": "2026-03-05",
+            "currency": "USD",
+            "lines": [{"item": self.cable.id, "qty": "1", "unit_price": "1.00", "line_total": "1.00"}],
+        }
+        response = client.post("/api/purchases/", payload, format="json")
+        self.assertEqual((response.status_code, list(response.json())), (400, ["exchange_rate"]))
+        response = client.post("/api/purchases/", {**payload, "exchange_rate": "1.70"}, format="json")
+        self.assertEqual(response.status_code, 201)
+
+    def test_reports_api_and_best_price(self):
+        today = timezone.localdate()
+        recent = today.replace(day=1).isoformat()
+        post_purchase(self._purchase(self.acme, "2026-01-10", (self.cable, "10", "1.50")), self.user)
+        post_purchase(self._purchase(self.acme, recent, (self.cable, "10", "2.20"), (self.glove, "2", "4.00")), self.user)
+        post_purchase(self._purchase(self.bolt, recent, (self.cable, "5", "2.00")), self.user)
+        post_purchase(self._purchase(self.bolt, recent, (self.cable, "5", "1.00"), currency="USD", exchange_rate="1.70"), self.user)
+
+        rows = vendor_spend(date(2026, 1, 1), today)
+        self.assertEqual(
+            [(row["vendor__name"], row["currency"], row["lines"], row["items"], row["spend"]) for row in rows],
+            [("Acme", "AZN", 3, 2, Decimal("45.00")), ("Bolt", "AZN", 1, 1, Decimal("10.00")), ("Bolt", "USD", 1, 1, Decimal("5.00"))],
+        )
+        rows = vendor_spend(date(2026, 1, 1), today, vendor_id=self.acme.id)
+        self.assertEqual(
+            [(row["item__name"], row["qty"], row["min_price"], row["avg_price"], row["max_price"]) for row in rows],
+            [("Cable", Decimal("20.000"), Decimal("1.50"), Decimal("1.85"), Decimal("2.20")), ("Glove", Decimal("2.000"), Decimal("4.00"), Decimal("4.00"), Decimal("4.00"))],
+        )
+
+        self.assertEqual(
+            best_recent_price(self.cable.id, "AZN"),
+            {"vendor": self.bolt.id, "vendor_name": "Bolt", "currency": "AZN", "price": Decimal("2.00"), "date": date.fromisoformat(recent)},
+        )
+        self.assertEqual(best_recent_price(self.cable.id)["currency"], "USD")
+        self.assertIsNone(best_recent_price(self.glove.id, "USD"))
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        series = client.get(f"/api/items/{self.cable.id}/price-history/?currency=AZN").json()["series"]
+        self.assertEqual(
+            [(line["vendor_name"], [(point["month"], point["last"]) for point in line["points"]]) for line in series],
+            [("Acme", [("2026-01-01", "1.50"), (recent, "2.20")]), ("Bolt", [(recent, "2.00")])],
+        )
+        self.assertEqual(client.get(f"/api/items/{self.cable.id}/price-history/?month_from=x").status_code, 400)
+
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("best_price") + f"?item={self.cable.id}&currency=AZN")
+        self.assertEqual(response.json()["best"]["price"], "2.00")
+        response = self.client.get(reverse("vendor_spend") + "?month_from=2026-01")
+        self.assertEqual(response.context["totals"], [("AZN", Decimal("55.00")), ("USD", Decimal("5.00"))])
+        response = self.client.get(reverse("vendor_spend") + f"?vendor={self.acme.id}&month_from=2026-01&export=csv")
+        self.assertEqual(response.content.decode().splitlines()[1].split(",")[:6], ["Cable", "m", "AZN", "2", "20.000", "37.00"])
+
+
+class ReorderSuggestionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser("planner", "planner@example.com", "pass")
+        self.warehouse = Warehouse.objects.create(name="WH", location="L")
+        self.location = OutgoingLocation.objects.create(name="Site", type="project")
+        self.acme = Vendor.objects.create(name="Acme", lead_time_days=10)
+        self.bolt = Vendor.objects.create(name="Bolt")
+        self.cable = Item.objects.create(name="Cable", unit="m", category="Electrical")
+        self.glove = Item.objects.create(name="Glove", unit="pcs", category="Safety", min_stock=Decimal("20"))
+        self.tape = Item.objects.create(name="Tape", unit="pcs", category="General")
+        VendorItem.objects.create(vendor=self.acme, item=self.cable, preferred=True)
+        VendorItem.objects.create(vendor=self.bolt, item=self.glove, preferred=True)
+        VendorItem.objects.create(vendor=self.bolt, item=self.cable, preferred=False)
+
+        today = timezone.localdate()
+        for vendor, item, qty, price in ((self.acme, self.cable, "100", "2.00"), (self.bolt, self.glove, "25", "1.00"), (self.bolt, self.tape, "2", "3.00")):
+            purchase = PurchaseHeader.objects.create(
+                vendor=vendor, warehouse=self.warehouse, invoice_no=f"INV-{item.name}", invoice_date=today, created_by=self.user
+            )
+            PurchaseLine.objects.create(
+                purchase=purchase, item=item, qty=Decimal(qty), unit_price=Decimal(price), line_total=Decimal(qty) * Decimal(price)
+            )
+            post_purchase(purchase, self.user)
+        issue = IssueHeader.objects.create(
+            warehouse=self.warehouse, outgoing_location=self.location, issue_date=today, created_by=self.user
+        )
+        for item, qty in ((self.cable, "90"), (self.glove, "10"), (self.tape, "2")):
+            IssueLine.objects.create(header=issue, item=item, qty=Decimal(qty))
+        post_issue(issue, self.user)
+
+        year, month = divmod(today.year * 12 + today.month - 4, 12)
+        self.days = Decimal((today - today.replace(year=year, month=month + 1, day=1)).days + 1)
+
+    def _suggestions(self):
+        return {
+            row.item.name: (row.vendor and row.vendor.name, row.lead_time_days, row.on_hand, row.on_order, row.suggested_qty, row.unit_price)
+            for row in ReorderSuggestion.objects.select_related("item", "vendor")
+        }
+
+    def test_suggestions_follow_usage_lead_time_and_safety_stock(self):
+        self.assertEqual(compute_reorder_suggestions(), 3)
+        cable_daily = Decimal("90") / self.days
+        glove_daily = Decimal("10") / self.days
+        tape_daily = Decimal("2") / self.days
+        self.assertEqual(
+            self._suggestions(),
+            {
+                "Cable": ("Acme", 10, Decimal("10.000"), Decimal("0.000"), quantize_qty(cable_daily * 47 - 10), Decimal("2.00")),
+                "Glove": ("Bolt", 7, Decimal("15.000"), Decimal("0.000"), quantize_qty(glove_daily * 37 + 5), Decimal("1.00")),
+                "Tape": (None, 7, Decimal("0.000"), Decimal("0.000"), quantize_qty(tape_daily * 44), None),
+            },
+        )
+
+        headers = create_reorder_purchases(ReorderSuggestion.objects.values_list("id", flat=True), self.user)
+        self.assertEqual(
+            sorted(
+                (header.vendor.name, line.item.name, line.qty, line.unit_price, line.line_total)
+                for header in PurchaseHeader.objects.filter(pk__in=[header.pk for header in headers])
+                for line in header.lines.all()
+            ),
+            [
+                ("Acme", "Cable", quantize_qty(cable_daily * 47 - 10), Decimal("2.00"), quantize_money(quantize_qty(cable_daily * 47 - 10) * 2)),
+                ("Bolt", "Glove", quantize_qty(glove_daily * 37 + 5), Decimal("1.00"), quantize_money(quantize_qty(glove_daily * 37 + 5))),
+            ],
+        )
+        self.assertFalse(any(header.is_posted for header in headers))
+        self.assertEqual(list(self._suggestions()), ["Tape"])
+
+        # The drafts are on order now, so only the item without a preferred vendor is still due.
+        compute_reorder_suggestions()
+        self.assertEqual(list(self._suggestions()), ["Tape"])
+
+    def test_view_and_command(self):
+        out = io.StringIO()
+        call_command("compute_reorder", stdout=out)
+        self.assertIn("Stored 3 reorder suggestion(s)", out.getvalue())
+
+        self.client.force_login(self.user)
+        url = reverse("reorder_suggestions")
+        response = self.client.get(url + f"?vendor={self.bolt.id}")
+        self.assertEqual([row.item.name for row in response.context["rows"]], ["Glove"])
+        response = self.client.get(url + "?vendor=none")
+        self.assertEqual([row.item.name for row in response.context["rows"]], ["Tape"])
+
+        glove = ReorderSuggestion.objects.get(item=self.glove)
+        response = self.client.post(url, {"action": "create_drafts", "suggestion": [glove.id]})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(PurchaseHeader.objects.filter(is_posted=False, vendor=self.bolt).count(), 1)
+        self.assertEqual(sorted(self._suggestions()), ["Cable", "Tape"])
+
+        self.client.post(url, {"action": "create_drafts", "all": "1"})
+        self.assertEqual(PurchaseHeader.objects.filter(is_posted=False).count(), 2)
+        self.client.post(url, {"action": "recompute"})
+        self.assertEqual(list(self._suggestions()), ["Tape"])
+
+        viewer = User.objects.create_user("viewer", password="pass")
+        viewer.user_permissions.add(Permission.objects.get(codename="view_stockbalance"))
+        self.client.force_login(viewer)
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(self.client.post(url, {"action": "recompute"}).status_code, 403)
+
+
+class ItemClassificationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser("analyst", "analyst@example.com", "pass")
+        self.warehouse = Warehouse.objects.create(name="WH", location="L")
+        self.site = OutgoingLocation.objects.create(name="Site", type="project")
+        self.office = OutgoingLocation.objects.create(name="Office", type="department")
+        self.items = {name: Item.objects.create(name=name, unit="pcs") for name in ("Big", "Mid", "Small", "Idle", "Old")}
+        this_month = timezone.localdate().replace(day=1)
+
+        def month(back):
+            year, index = divmod(this_month.year * 12 + this_month.month - 1 - back, 12)
+            return date(year, index + 1, 1)
+
+        rows = []
+        for back in range(1, 13):
+            value = Decimal("100") if back <= 8 else Decimal("0")
+            if back == 1:
+                rows.append((month(back), self.site, "Big", "5", value / 2))
+                rows.append((month(back), self.office, "Big", "5", value / 2))
+            else:
+                rows.append((month(back), self.site, "Big", "10", value))
+            if back <= 6:
+                rows.append((month(back), self.site, "Mid", "10", "25"))
+        rows.append((month(3), self.office, "Small", "12", "50"))
+        rows.append((month(13), self.site, "Old", "40", "900"))
+        rows.append((this_month, self.site, "Idle", "40", "900"))
+        ConsumptionRollup.objects.bulk_create(
+            ConsumptionRollup(
+                month=day, outgoing_location=location, warehouse=self.warehouse, item=self.items[name],
+                qty=Decimal(qty), value=Decimal(value),
+            )
+            for day, location, name, qty, value in rows
+        )
+
+    def _classes(self):
+        return {item.name: item.abc_class + item.xyz_class for item in Item.objects.all()}
+
+    def test_classes_by_value_share_and_variability(self):
+        self.assertEqual(classify_items(), {"AX": 1, "BY": 1, "CZ": 1})
+        self.assertEqual(self._classes(), {"Big": "AX", "Mid": "BY", "Small": "CZ", "Idle": "", "Old": ""})
+        self.assertTrue(Item.objects.filter(classified_at__isnull=False).exists())
+
+        self.assertEqual(classify_items(a_share=Decimal("0.85"), x_cv=Decimal("1.0"))["AX"], 2)
+        # A longer window reaches Old and adds two idle months to everyone else.
+        self.assertEqual(classify_items(months=14), {"AX": 1, "AZ": 1, "BZ": 1, "CZ": 1})
+        self.assertEqual(self._classes(), {"Big": "AX", "Mid": "BZ", "Small": "CZ", "Idle": "", "Old": "AZ"})
+
+    def test_command_and_stock_page(self):
+        out = io.StringIO()
+        call_command("classify_items", stdout=out)
+        self.assertIn("Classified 3 item(s)", out.getvalue())
+        self.assertIn("B: BX=0 BY=1 BZ=0", out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command("classify_items", a_share=Decimal("0.9"), b_share=Decimal("0.8"))
+
+        self.client.force_login(self.user)
+        url = reverse("warehouse_stock") + f"?warehouse={self.warehouse.id}"
+        response = self.client.get(url + "&abc=b")
+        self.assertEqual([item.name for item in response.context["items"]], ["Mid"])
+        response = self.client.get(url + "&xyz=Z&sort=class&direction=asc")
+        self.assertEqual([item.name for item in response.context["items"]], ["Small"])
+        response = self.client.get(url + "&sort=class&direction=desc")
+        self.assertEqual([item.name for item in response.context["items"]], ["Small", "Mid", "Big", "Idle", "Old"])
+        response = self.client.get(url + "&abc=A&export=csv")
+        self.assertEqual(response.content.decode().splitlines()[1].split(",")[:5], ["Big", "", "pcs", "A", "X"])
+
+
+class StockAgingTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser("ager", "ager@example.com", "pass")
+        self.warehouse = Warehouse.objects.create(name="WH", location="L")
+        self.location = OutgoingLocation.objects.create(name="Site", type="project")
+        self.vendor = Vendor.objects.create(name="Vendor")
+        self.cable = Item.objects.create(name="Cable", unit="m", category="Electrical")
+        self.glove = Item.objects.create(name="Glove", unit="pcs", category="Safety")
+
+    def _purchase(self, *lines):
+        purchase = PurchaseHeader.objects.create(
+            vendor=self.vendor, warehouse=self.warehouse, invoice_no="INV", invoice_date="2026-01-05", created_by=self.user
+        )
+        for item, qty, price in lines:
+            PurchaseLine.objects.create(
+                purchase=purchase, item=item, qty=Decimal(qty), unit_price=Decimal(price), line_total=Decimal(qty) * Decimal(price)
+            )
+        post_purchase(purchase, self.user)
+        return purchase
+
+    def _issue(self, qty):
+        issue = IssueHeader.objects.create(
+            warehouse=self.warehouse, outgoing_location=self.location, issue_date="2026-01-06", created_by=self.user
+        )
+        IssueLine.objects.create(header=issue, item=self.cable, qty=Decimal(qty))
+        return issue
+
+    def _balance(self):
+        return StockBalance.objects.get(warehouse=self.warehouse, item=self.cable)
+
+    def _ago(self, days):
+        return day_start(timezone.localdate() - timedelta(days=days))
+
+    def test_services_keep_last_movement_times(self):
+        self._purchase((self.cable, "10", "2.00"))
+        balance = self._balance()
+        self.assertIsNotNone(balance.last_in_at)
+        self.assertIsNone(balance.last_out_at)
+
+        issue = self._issue("4")
+        post_issue(issue, self.user)
+        first_out = self._balance().last_out_at
+        self.assertGreaterEqual(first_out, balance.last_in_at)
+
+        second = self._issue("1")
+        post_documents_bulk(IssueHeader, [second.id], self.user)
+        self.assertGreater(self._balance().last_out_at, first_out)
+
+        # Unposting reads the times back from the remaining movements.
+        unpost_issue_inventory(second)
+        issued_at = StockMovement.objects.get(reference_type="issue", reference_id=issue.id).created_at
+        self.assertEqual(self._balance().last_out_at, issued_at)
+        delete_issue_with_inventory(issue)
+        self.assertIsNone(self._balance().last_out_at)
+        received_at = StockMovement.objects.get(reference_type="purchase").created_at
+        self.assertEqual(self._balance().last_in_at, received_at)
+
+    def test_report_by_last_movement_and_receipt(self):
+        self._purchase((self.cable, "10", "2.00"), (self.glove, "3", "1.00"))
+        self._purchase((self.cable, "5", "3.00"))
+        StockBalance.objects.filter(item=self.cable).update(last_in_at=self._ago(200), last_out_at=None)
+        StockBalance.objects.filter(item=self.glove).update(last_in_at=self._ago(400), last_out_at=self._ago(370))
+        CostLayer.objects.filter(item=self.cable, unit_cost=Decimal("2.00")).update(received_at=self._ago(100))
+        CostLayer.objects.filter(item=self.cable, unit_cost=Decimal("3.00")).update(received_at=self._ago(30))
+        CostLayer.objects.filter(item=self.glove).update(received_at=self._ago(31))
+
+        def buckets(rows):
+            return {
+                row["item"]: [(str(row[f"qty_{name}"]), str(row[f"value_{name}"])) for name in ("d30", "d90", "d180", "d365", "older")]
+                for row in rows
+            }
+
+        empty = ("0.000", "0.00")
+        self.assertEqual(
+            buckets(stock_aging()),
+            {"Glove": [empty] * 4 + [("3.000", "3.00")], "Cable": [empty] * 3 + [("15.000", "35.00"), empty]},
+        )
+        self.assertEqual(
+            buckets(stock_aging("receipt")),
+            {"Cable": [("5.000", "15.00"), empty, ("10.000", "20.00"), empty, empty], "Glove": [empty, ("3.000", "3.00")] + [empty] * 3},
+        )
+        self.assertEqual([row["item"] for row in stock_aging(min_days=365)], ["Glove"])
+        self.assertEqual([row["item"] for row in stock_aging(min_days=200)], ["Glove", "Cable"])
+        self.assertEqual([row["item"] for row in stock_aging(min_days=201)], ["Glove"])
+        self.assertEqual([row["item"] for row in stock_aging(category="Electrical")], ["Cable"])
+
+        self.client.force_login(self.user)
+        url = reverse("stock_aging")
+        response = self.client.get(url + "?basis=receipt")
+        self.assertEqual(response.context["total_value"], Decimal("38.00"))
+        self.assertEqual(response.context["buckets"][0], ("0-30", Decimal("5.000"), Decimal("15.00")))
+        response = self.client.get(url + "?min_days=365&export=csv")
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(",")[:9], ["warehouse_id", "warehouse", "item_id", "item", "unit", "category", "since", "qty", "value"])
+        self.assertEqual(len(lines), 2)
+        response = self.client.get(url + "?export=xlsx")
+        self.assertEqual(response.status_code, 200)
+
+
+class StockMatrixTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser("matrix", "matrix@example.com", "pass")
+        self.north = Warehouse.objects.create(name="North", location="N")
+        self.south = Warehouse.objects.create(name="South", location="S")
+        self.cable = Item.objects.create(name="Cable", unit="m", category="Electrical", min_stock=Decimal("20"))
+        self.glove = Item.objects.create(name="Glove", unit="pcs", category="Safety")
+        self.idle = Item.objects.create(name="Idle", unit="pcs", category="Safety", min_stock=Decimal("1"))
+        for warehouse, item, qty, value in (
+            (self.north, self.cable, "4", "8.00"),
+            (self.south, self.cable, "6", "12.00"),
+            (self.south, self.glove, "30", "15.00"),
+        ):
+            StockBalance.objects.create(
+                warehouse=warehouse, item=item, on_hand=Decimal(qty), stock_value=Decimal(value)
+            )
+        self.client.force_login(self.user)
+        self.url = reverse("warehouse_stock") + "?warehouse=all"
+
+    def _names(self, query=""):
+        return [item.name for item in self.client.get(self.url + query).context["items"]]
+
+    def test_matrix_pivots_balances_per_warehouse(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(self.url)
+        pivots = [q["sql"] for q in ctx.captured_queries if "FILTER (WHERE" in q["sql"] and "LIMIT" in q["sql"]]
+        self.assertEqual(len(pivots), 1)
+        rows = {item.name: (item.cells, item.total, item.total_value) for item in response.context["items"]}
+        self.assertEqual(rows["Cable"], ([Decimal("4"), Decimal("6")], Decimal("10"), Decimal("20.00")))
+        self.assertEqual(rows["Glove"], ([Decimal("0"), Decimal("30")], Decimal("30"), Decimal("15.00")))
+        self.assertEqual(rows["Idle"], ([Decimal("0"), Decimal("0")], Decimal("0"), Decimal("0")))
+        self.assertContains(response, "North")
+
+    def test_sorting_filters_and_export(self):
+        self.assertEqual(self._names(), ["Glove", "Cable", "Idle"])
+        self.assertEqual(self._names("&sort=total&direction=asc"), ["Idle", "Cable", "Glove"])
+        self.assertEqual(self._names(f"&sort=wh_{self.north.id}&direction=desc"), ["Cable", "Glove", "Idle"])
+        self.assertEqual(self._names("&sort=last_issue_date"), ["Glove", "Cable", "Idle"])
+        self.assertEqual(self._names("&low_stock=1"), ["Cable", "Idle"])
+        self.assertEqual(self._names("&q=pcs"), ["Glove", "Idle"])
+
+        response = self.client.get(self.url + "&sort=name&direction=asc&export=csv")
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], "item_name,category,unit,abc_class,xyz_class,min_stock,North,South,total,stock_value")
+        self.assertEqual(lines[1], "Cable,Electrical,m,,,20.000,4.000,6.000,10.000,20.00")
+
+        response = self.client.get(self.url + "&export=xlsx")
+        self.assertEqual(response["Content-Disposition"], "attachment; filename=warehouse_stock_matrix.xlsx")
+
+
+class ReconcileStockTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("u3", password="pass")
+        self.warehouse = Warehouse.objects.create(name="WH", location="L")
+        self.item = Item.objects.create(internal_code="I3", name="Item3", unit="pcs")
+        self.other_item = Item.objects.create(internal_code="I4", name="Item4", unit="pcs")
+        apply_movement(
+            user=self.user,
+            warehouse=self.warehouse,
+            item=self.item,
+            qty_delta=Decimal("7"),
+            movement_type="ADJUSTMENT",
+        )
+        apply_movement(
+            user=self.user,
+            warehouse=self.warehouse,
+            item=self.other_item,
+            qty_delta=Decimal("3"),
+            movement_type="ADJUSTMENT",
+        )
+
+    def test_no_mismatches_after_posting(self):
+        self.assertEqual(find_stock_mismatches(), [])
+        call_command("reconcile_stock", stdout=io.StringIO())
+
+    def test_repair_rewrites_drifted_and_missing_balances(self):
+        StockBalance.objects.filter(item=self.item).update(on_hand=Decimal("1"))
+        StockBalance.objects.filter(item=self.other_item).delete()
+        self.assertEqual(len(find_stock_mismatches([self.warehouse.id])), 2)
+
+        with self.assertRaises(CommandError):
+            call_command("reconcile_stock", stdout=io.StringIO())
+        call_command("reconcile_stock", "--repair", f"--warehouse={self.warehouse.id}", stdout=io.StringIO())
+
+        self.assertEqual(find_stock_mismatches(), [])
+        self.assertEqual(StockBalance.objects.get(item=self.item).on_hand, Decimal("7.000"))
+        self.assertEqual(StockBalance.objects.get(item=self.other_item).on_hand, Decimal("3.000"))
+
+    def test_repair_restores_stock_value_and_average_cost(self):
+        for item in (self.item, self.other_item):
+            apply_movement(
+                user=self.user,
+                warehouse=self.warehouse,
+                item=item,
+                qty_delta=Decimal("10"),
+                unit_cost=Decimal("2.50"),
+                movement_type=StockMovement.TYPE_IN_PURCHASE,
+            )
+        StockBalance.objects.filter(item=self.item).update(on_hand=Decimal("1"), stock_value=0, avg_cost=0)
+        StockBalance.objects.filter(item=self.other_item).delete()
+
+        self.assertEqual(repair_stock_balances(), 2)
+        self.assertEqual(find_stock_mismatches(), [])
+        for item, on_hand in ((self.item, "17.000"), (self.other_item, "13.000")):
+            balance = StockBalance.objects.get(item=item)
+            self.assertEqual(balance.on_hand, Decimal(on_hand))
+            self.assertEqual(balance.stock_value, Decimal("25.00"))
+            self.assertEqual(balance.avg_cost, quantize_cost(Decimal("25") / Decimal(on_hand)))
+
+
+class StockMovementApiTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser("api", "api@example.com", "pass")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.warehouse = Warehouse.objects.create(name="WH", location="L")
+        self.other_warehouse = Warehouse.objects.create(name="WH2", location="L")
+        self.item = Item.objects.create(internal_code="I5", name="Item5", unit="pcs")
+        for warehouse in (self.warehouse, self.other_warehouse):
+            for _ in range(3):
+                apply_movement(
+                    user=self.user,
+                    warehouse=warehouse,
+                    item=self.item,
+                    qty_delta=Decimal("1"),
+                    movement_type="ADJUSTMENT",
+                    reference_type="adjustment",
+                    reference_id=7,
+                )
+
+    def test_filters(self):
+        response = self.client.get(f"/api/stock-movements/?warehouse={self.warehouse.id}&movement_type=ADJUSTMENT")
+        self.assertEqual(len(response.json()["results"]), 3)
+
+        response = self.client.get("/api/stock-movements/?reference_type=adjustment&reference_id=8")
+        self.assertEqual(response.json()["results"], [])
+
+        response = self.client.get("/api/stock-movements/?date_from=2000-01-01&date_to=2000-01-31")
+        self.assertEqual(response.json()["results"], [])
+
+        response = self.client.get("/api/stock-movements/?warehouse=abc")
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.get(f"/api/stock-balances/?warehouse={self.other_warehouse.id}")
+        self.assertEqual([row["on_hand"] for row in response.json()["results"]], ["3.000"])
+
+    def test_cursor_pages_cover_all_movements_once(self):
+        seen = []
+        url = "/api/stock-movements/?page_size=4"
+        while url:
+            data = self.client.get(url).json()
+            seen.extend(row["id"] for row in data["results"])
+            url = data["next"]
+        self.assertEqual(len(seen), 6)
+        self.assertEqual(len(set(seen)), 6)
+
+    def test_export_streams_ndjson_and_csv(self):
+        response = self.client.get("/api/stock-movements/export/")
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        rows = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(rows[0]["qty_delta"], "1.000")
+
+        response = self.client.get(f"/api/stock-movements/export/?after_id={rows[2]['id']}")
+        resumed = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        self.assertEqual([row["id"] for row in resumed], [row["id"] for row in rows[3:]])
+
+        response = self.client.get(f"/api/stock-movements/export/?format=csv&warehouse={self.warehouse.id}")
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(",")[:3], ["id", "warehouse", "item"])
+        self.assertEqual(len(lines), 4)
+
+    def test_lookup_answers_pairs_in_order(self):
+        apply_movement(
+            user=self.user,
+            warehouse=self.warehouse,
+            item=self.item,
+            qty_delta=Decimal("2"),
+            movement_type="IN_PURCHASE",
+            unit_cost=Decimal("4.50"),
+        )
+        response = self.client.post(
+            "/api/stock-balances/lookup/",
+            {
+                "include_cost": True,
+                "pairs": [
+                    [self.other_warehouse.id, self.item.id],
+                    {"warehouse": self.warehouse.id, "internal_code": "I5"},
+                    {"warehouse": self.warehouse.id, "internal_code": "missing"},
+                ],
+            },
+            format="json",
+        )
+        self.assertEqual(response.json()["columns"], ["warehouse", "item", "on_hand", "last_cost"])
+        self.assertEqual(
+            response.json()["results"],
+            [
+                [self.other_warehouse.id, self.item.id, "3.000", "4.50"],
+                [self.warehouse.id, self.item.id, "5.000", "4.50"],
+                [self.warehouse.id, None, None, None],
+            ],
+        )
+
+        response = self.client.post("/api/stock-balances/lookup/", {"pairs": [["a", 1]]}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+
+class BulkDocumentApiTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("bulk", password="pass")
+        self.user.user_permissions.set(
+            Permission.objects.filter(codename__in=["add_purchaseheader", "add_issueheader"])
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.warehouse = Warehouse.objects.create(name="WH", location="L")
+        self.vendor = Vendor.objects.create(name="Vendor")
+        self.location = OutgoingLocation.objects.create(name="Dept", type="department")
+        self.item = Item.objects.create(internal_code="I8", name="Item8", unit="pcs")
+
+    def _purchase(self, qty, item=None):
+        return {
+            "vendor": self.vendor.id,
+            "warehouse": self.warehouse.id,
+            "invoice_no": "BULK",
+            "invoice_date": "2026-02-06",
+            "lines": [
+                {"item": item or self.item.id, "qty": qty, "unit_price": "2.00", "line_total": "2.00"},
+            ],
+        }
+
+    def _issue(self, qty):
+        return {
+            "warehouse": self.warehouse.id,
+            "outgoing_location": self.location.id,
+            "issue_date": "2026-02-07",
+            "lines": [{"item": self.item.id, "qty": qty}],
+        }
+
+    def test_bulk_purchases_report_each_document(self):
+        response = self.client.post(
+            "/api/purchases/bulk/",
+            {"post": True, "documents": [self._purchase("4"), self._purchase("1", item=999999), self._purchase("6")]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 207)
+        results = response.json()["results"]
+        self.assertEqual([result["status"] for result in results], ["posted", "invalid", "posted"])
+        self.assertIn("item", results[1]["errors"]["lines"]["0"])
+        self.assertEqual(StockBalance.objects.get(item=self.item).on_hand, Decimal("10.000"))
+        self.assertEqual(StockMovement.objects.filter(reference_type="purchase").count(), 2)
+        self.assertTrue(PurchaseHeader.objects.get(pk=results[0]["id"]).is_posted)
+        self.assertEqual(find_stock_mismatches(), [])
+
+    def test_bulk_issues_stop_at_available_stock(self):
+        self.client.post("/api/purchases/bulk/", {"post": True, "documents": [self._purchase("5")]}, format="json")
+        response = self.client.post(
+            "/api/issues/bulk/",
+            {"post": True, "documents": [self._issue("3"), self._issue("3"), self._issue("2")]},
+            format="json",
+        )
+        results = response.json()["results"]
+        self.assertEqual([result["status"] for result in results], ["posted", "not_posted", "posted"])
+        self.assertFalse(IssueHeader.objects.get(pk=results[1]["id"]).is_posted)
+        self.assertEqual(StockBalance.objects.get(item=self.item).on_hand, Decimal("0.000"))
+
+        response = self.client.post("/api/issues/bulk/", {"documents": [self._issue("1")]}, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["results"][0]["status"], "created")
+
+        response = self.client.get(f"/api/issues/lines/export/?format=csv&item={self.item.id}")
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 5)
+        response = self.client.get("/api/purchases/lines/export/?date_from=2026-02-07")
+        self.assertEqual(b"".join(response.streaming_content), b"")
+
+    def test_bulk_query_count_does_not_grow_with_documents(self):
+        counts = []
+        for size in (1, 2, 20):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.post(
+                    "/api/purchases/bulk/",
+                    {"post": True, "documents": [self._purchase("1") for _ in range(size)]},
+                    format="json",
+                )
+            self.assertEqual(response.status_code, 201)
+            counts.append(len(ctx.captured_queries))
+        self.assertEqual(counts[1], counts[2])
+
+
+class TransferAdjustmentPostingApiTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("poster", password="pass")
+        self.user.user_permissions.set(
+            Permission.objects.filter(
+                codename__in=["add_transferheader", "add_adjustmentheader", "change_transferheader", "change_adjustmentheader"]
+            )
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.warehouse = Warehouse.objects.create(name="WH", location="L")
+        self.other_warehouse = Warehouse.objects.create(name="WH2", location="L")
+        self.item = Item.objects.create(internal_code="I9", name="Item9", unit="pcs")
+        apply_movement(
+            user=self.user,
+            warehouse=self.warehouse,
+            item=self.item,
+            qty_delta=Decimal("10"),
+            movement_type="ADJUSTMENT",
+        )
+
+    def _on_hand(self, warehouse):
+        return StockBalance.objects.get(warehouse=warehouse, item=self.item).on_hand
+
+    def _adjustment(self, qty_delta):
+        response = self.client.post(
+            "/api/adjustments/",
+            {
+                "warehouse": self.warehouse.id,
+                "date": "2026-02-08",
+                "reason": "Count",
+                "is_posted": True,
+                "lines": [{"item": self.item.id, "qty_delta": qty_delta}],
+            },
+            format="json",
+        )
+        self.assertFalse(response.json()["is_posted"])
+        return response.json()["id"]
+
+    def test_post_and_unpost_transfer(self):
+        transfer_id = self.client.post(
+            "/api/transfers/",
+            {
+                "from_warehouse": self.warehouse.id,
+                "to_warehouse": self.other_warehouse.id,
+                "date": "2026-02-08",
+                "lines": [{"item": self.item.id, "qty": "4"}],
+            },
+            format="json",
+        ).json()["id"]
+
+        response = self.client.post(f"/api/transfers/{transfer_id}/post/")
+        self.assertTrue(response.json()["is_posted"])
+        self.assertEqual(self._on_hand(self.warehouse), Decimal("6.000"))
+        self.assertEqual(self._on_hand(self.other_warehouse), Decimal("4.000"))
+
+        response = self.client.post(f"/api/transfers/{transfer_id}/unpost/")
+        self.assertFalse(response.json()["is_posted"])
+        self.assertEqual(self._on_hand(self.warehouse), Decimal("10.000"))
+        self.assertEqual(self._on_hand(self.other_warehouse), Decimal("0.000"))
+        self.assertFalse(StockMovement.objects.filter(reference_type="transfer").exists())
+        self.assertEqual(find_stock_mismatches(), [])
+
+    def test_post_rejects_negative_stock(self):
+        adjustment_id = self._adjustment("-20")
+        response = self.client.post(f"/api/adjustments/{adjustment_id}/post/")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self._on_hand(self.warehouse), Decimal("10.000"))
+
+    def test_post_batch_reports_each_document(self):
+        ids = [self._adjustment("2"), self._adjustment("-20"), self._adjustment("1"), 999999]
+        response = self.client.post("/api/adjustments/post-batch/", {"ids": ids}, format="json")
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(
+            [result["status"] for result in response.json()["results"]],
+            ["posted", "not_posted", "posted", "skipped"],
+        )
+        self.assertEqual(self._on_hand(self.warehouse), Decimal("13.000"))
+
+        self.client.post(f"/api/adjustments/{ids[0]}/unpost/")
+        self.assertEqual(self._on_hand(self.warehouse), Decimal("11.000"))
+        self.assertEqual(find_stock_mismatches(), [])
+
+    def test_posting_requires_change_permission(self):
+        adjustment_id = self._adjustment("2")
+        clerk = User.objects.create_user("clerk", password="pass")
+        clerk.user_permissions.add(*Permission.objects.filter(codename__in=["add_adjustmentheader", "view_adjustmentheader"]))
+        self.client.force_authenticate(clerk)
+        for url in (f"/api/adjustments/{adjustment_id}/post/", f"/api/adjustments/{adjustment_id}/unpost/"):
+            self.assertEqual(self.client.post(url).status_code, 403)
+        response = self.client.post("/api/adjustments/post-batch/", {"ids": [adjustment_id]}, format="json")
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self._on_hand(self.warehouse), Decimal("10.000"))
+
+        clerk.user_permissions.add(Permission.objects.get(codename="change_adjustmentheader"))
+        clerk = User.objects.get(pk=clerk.pk)
+        self.client.force_authenticate(clerk)
+        self.assertEqual(self.client.post(f"/api/adjustments/{adjustment_id}/post/").status_code, 200)
+        self.assertEqual(self._on_hand(self.warehouse), Decimal("12.000"))
+
+
+class StockChangeFeedTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser("feed", "feed@example.com", "pass")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.warehouse = Warehouse.objects.create(name="WH", location="L")
+        self.item = Item.objects.create(internal_code="I6", name="Item6", unit="pcs")
+        self.location = OutgoingLocation.objects.create(name="Dept", type="department")
+        vendor = Vendor.objects.create(name="Vendor")
+        purchase = PurchaseHeader.objects.create(
+            vendor=vendor,
+            warehouse=self.warehouse,
+            invoice_no="INV-FEED",
+            invoice_date="2026-02-06",
+            created_by=self.user,
+        )
+        PurchaseLine.objects.create(
+            purchase=purchase,
+            item=self.item,
+            qty=Decimal("10"),
+            unit_price=Decimal("1.00"),
+            line_total=Decimal("10.00"),
+        )
+        post_purchase(purchase, self.user)
+
+    def _feed(self, cursor="", limit=""):
+        return self.client.get(f"/api/stock-changes/?cursor={cursor}&limit={limit}").json()
+
+    def _adjust(self, qty, item=None):
+        apply_movement(
+            user=self.user,
+            warehouse=self.warehouse,
+            item=item or self.item,
+            qty_delta=Decimal(qty),
+            movement_type="ADJUSTMENT",
+        )
+
+    def test_feed_returns_changes_and_tombstones(self):
+        data = self._feed()
+        self.assertEqual([row["on_hand"] for row in data["balances"]], ["10.000"])
+        self.assertEqual(len(data["movements"]), 1)
+        cursor = data["cursor"]
+        self.assertEqual(self._feed(cursor)["movements"], [])
+
+        issue = IssueHeader.objects.create(
+            warehouse=self.warehouse,
+            outgoing_location=self.location,
+            issue_date="2026-02-07",
+            created_by=self.user,
+        )
+        IssueLine.objects.create(header=issue, item=self.item, qty=Decimal("3"))
+        post_issue(issue, self.user)
+        data = self._feed(cursor)
+        self.assertEqual([row["on_hand"] for row in data["balances"]], ["7.000"])
+        [movement] = data["movements"]
+        cursor = data["cursor"]
+
+        unpost_issue_inventory(issue)
+        data = self._feed(cursor)
+        self.assertEqual([row["on_hand"] for row in data["balances"]], ["10.000"])
+        self.assertEqual(data["deleted"], [
+            {"kind": "movement", "id": movement["id"], "warehouse": self.warehouse.id, "item": self.item.id}
+        ])
+
+        self.assertEqual(self.client.get("/api/stock-changes/?cursor=abc").status_code, 400)
+
+    def test_limit_pages_through_every_change_once(self):
+        for _ in range(3):
+            self._adjust("1")
+        seen = []
+        cursor = ""
+        while True:
+            data = self._feed(cursor, limit=2)
+            seen.extend(("movement", row["id"]) for row in data["movements"])
+            seen.extend(("balance", row["id"]) for row in data["balances"])
+            cursor = data["cursor"]
+            if not data["has_more"]:
+                break
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(len(set(seen)), 5)
+
+    def test_open_transaction_holds_back_later_commits(self):
+        cursor = self._feed()["cursor"]
+        written = threading.Event()
+        release = threading.Event()
+
+        def slow_writer():
+            with transaction.atomic():
+                self._adjust("1")
+                written.set()
+                release.wait(10)
+            connections.close_all()
+
+        thread = threading.Thread(target=slow_writer)
+        thread.start()
+        written.wait(10)
+        self._adjust("2", item=Item.objects.create(internal_code="I7", name="Item7", unit="pcs"))
+        self.assertEqual(self._feed(cursor)["movements"], [])
+
+        release.set()
+        thread.join()
+        data = self._feed(cursor)
+        self.assertEqual(sorted(row["qty_delta"] for row in data["movements"]), ["1.000", "2.000"])
+
+
+class StockEventsTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser("events", "events@example.com", "pass")
+        self.warehouse = Warehouse.objects.create(name="WH", location="L")
+        self.other_warehouse = Warehouse.objects.create(name="WH2", location="L2")
+        self.item = Item.objects.create(internal_code="I8", name="Item8", unit="pcs")
+
+    def _adjust(self, qty, warehouse=None):
+        apply_movement(
+            user=self.user,
+            warehouse=warehouse or self.warehouse,
+            item=self.item,
+            qty_delta=Decimal(qty),
+            movement_type="ADJUSTMENT",
+        )
+
+    def test_balance_changes_are_notified_on_commit(self):
+        params = connection.get_connection_params()
+        params.pop("cursor_factory")
+        params.pop("context")
+        with psycopg.connect(autocommit=True, **params) as listener:
+            listener.execute(f"LISTEN {BALANCE_CHANNEL}")
+            with transaction.atomic():
+                self._adjust("4")
+                self.assertEqual(list(listener.notifies(timeout=0.2)), [])
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                self._adjust("1")
+                raise RuntimeError
+            payloads = [json.loads(notify.payload) for notify in listener.notifies(timeout=0.5)]
+        self.assertEqual(
+            payloads,
+            [{"warehouse": self.warehouse.id, "item": self.item.id, "on_hand": "4.000", "stock_value": "0.00"}],
+        )
+
+    def test_stream_requires_asgi_and_warehouse(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get("/inventory/stock/events/").status_code, 400)
+        self.assertEqual(self.client.get(f"/inventory/stock/events/?warehouse={self.warehouse.id}").status_code, 204)
+
+    async def test_stream_pushes_balances_for_the_warehouse(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(f"/inventory/stock/events/?warehouse={self.warehouse.id}")
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        chunks = aiter(response.streaming_content)
+        try:
+            self.assertEqual(await anext(chunks), b"retry: 3000\n\n")
+            await sync_to_async(self._adjust)("5", warehouse=self.other_warehouse)
+            await sync_to_async(self._adjust)("2")
+            event = (await asyncio.wait_for(anext(chunks), 5)).decode()
+        finally:
+            await chunks.aclose()
+        name, data = event.strip().split("\n")
+        self.assertEqual(name, "event: balance")
+        change = json.loads(data.removeprefix("data: "))
+        self.assertEqual((change["warehouse"], change["item"], change["on_hand"]), (self.warehouse.id, self.item.id, "2.000"))
+        self.assertEqual(change["display"], "2,000")
+
+    def _listening_backends(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM pg_stat_activity WHERE query = %s", [f"LISTEN {BALANCE_CHANNEL}"])
+            return cursor.fetchone()[0]
+
+    async def test_streams_share_one_listen_connection(self):
+        await self.async_client.aforce_login(self.user)
+        url = f"/inventory/stock/events/?warehouse={self.warehouse.id}"
+        streams = [aiter((await self.async_client.get(url)).streaming_content) for _ in range(3)]
+        try:
+            for chunks in streams:
+                self.assertEqual(await anext(chunks), b"retry: 3000\n\n")
+            self.assertEqual(await sync_to_async(self._listening_backends)(), 1)
+            await sync_to_async(self._adjust)("3")
+            for chunks in streams:
+                event = (await asyncio.wait_for(anext(chunks), 5)).decode()
+                self.assertIn('"on_hand": "3.000"', event)
+        finally:
+            for chunks in streams:
+                await chunks.aclose()
+        # Closed streams leave their generators to the event loop's finalizer.
+        del streams, chunks
+        gc.collect()
+        await asyncio.sleep(0.1)
+        self.assertEqual(balance_listener.subscribers, set())
+
+
 class ConcurrencyTests(TransactionTestCase):
     reset_sequences = True
 
@@ -90,3 +1778,31 @@ class ConcurrencyTests(TransactionTestCase):
 
         balance = StockBalance.objects.get(warehouse=self.warehouse, item=self.item)
         self.assertEqual(balance.on_hand, Decimal("20.000"))
+
+    def test_relays_skip_batches_claimed_by_another_relay(self):
+        StockOutboxEvent.objects.bulk_create(StockOutboxEvent(event_type="stock.repaired") for _ in range(4))
+        claimed = threading.Event()
+        release = threading.Event()
+        first_relay = []
+
+        def slow_sink(messages):
+            first_relay.extend(message["id"] for message in messages)
+            claimed.set()
+            release.wait(10)
+
+        def relay():
+            relay_batch([CallbackSink(slow_sink)], batch_size=2)
+            connections.close_all()
+
+        thread = threading.Thread(target=relay)
+        thread.start()
+        claimed.wait(10)
+        second_relay = []
+        relay_batch([CallbackSink(lambda messages: second_relay.extend(m["id"] for m in messages))])
+        release.set()
+        thread.join()
+
+        self.assertEqual(len(first_relay), 2)
+        self.assertEqual(len(second_relay), 2)
+        self.assertEqual(set(first_relay) & set(second_relay), set())
+        self.assertFalse(StockOutboxEvent.objects.filter(dispatched_at__isnull=True).exists())
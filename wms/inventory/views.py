@@ -1,17 +1,72 @@
+import asyncio
+import json
+from decimal import Decimal
+
 from django.contrib.auth.decorators import login_required, permission_required
 from django.db import models
 from django.db.models import OuterRef, Subquery, Value, DecimalField, DateField, Sum
 from django.db.models.functions import Coalesce
-from django.http import HttpResponse
-from django.shortcuts import render, get_object_or_404
+from django.http import HttpResponse, HttpResponseBadRequest, StreamingHttpResponse
+from django.shortcuts import render, redirect, get_object_or_404
+from django.contrib import messages
+from django.core.exceptions import PermissionDenied
 from django.core.paginator import Paginator
+from django.utils import formats, timezone, translation
+from django.utils.translation import gettext_lazy as _
 import csv
 from datetime import datetime
 
-from wms.masters.models import Item, Warehouse, Vendor
+from wms.masters.models import Item, Warehouse, Vendor, OutgoingLocation
 from wms.purchasing.models import PurchaseLine
 from wms.issuing.models import IssueHeader, IssueLine
-from .models import StockBalance, StockMovement
+from .models import ReorderSuggestion, StockBalance, StockMovement
+from wms.api import _csv_chunks
+from .reports import (
+    CONSUMPTION_GROUPS,
+    PERIOD_SUMMARY_FIELDS,
+    AGING_BASES,
+    AGING_BUCKETS,
+    AGING_FIELDS,
+    VALUATION_GROUPS,
+    compute_reorder_suggestions,
+    consumption_summary,
+    iter_period_summary,
+    iter_stock_aging,
+    period_summary,
+    stock_aging as stock_aging_rows,
+    stock_matrix,
+    stock_valuation as stock_valuation_rows,
+)
+from .listener import balance_listener
+from .services import create_reorder_purchases
+
+STOCK_EVENTS_KEEPALIVE = 15
+# Streams are closed after this many seconds and the browser reconnects on its own.
+STOCK_EVENTS_MAX_AGE = 600
+
+VALUATION_GROUP_CHOICES = [
+    ("warehouse", _("Warehouse")),
+    ("category", _("Category")),
+    ("vendor", _("Vendor")),
+]
+
+CONSUMPTION_GROUP_CHOICES = [
+    ("location", _("Outgoing Location")),
+    ("item", _("Item")),
+    ("category", _("Category")),
+    ("month", _("Month")),
+]
+AGING_BASIS_CHOICES = [
+    ("movement", _("Last movement")),
+    ("receipt", _("FIFO receipt")),
+]
+AGING_BUCKET_LABELS = {"d30": "0-30", "d90": "31-90", "d180": "91-180", "d365": "181-365", "older": "365+"}
+CONSUMPTION_COLUMNS = {
+    "location": [("location_name", _("Outgoing Location"))],
+    "item": [("item_name", _("Item")), ("unit", _("Unit"))],
+    "category": [("category", _("Category"))],
+    "month": [("month", _("Month"))],
+}
 
 
 def _parse_date(value: str):
@@ -37,6 +92,8 @@ def warehouse_stock(request):
 
     q = request.GET.get("q", "").strip()
     low_stock = request.GET.get("low_stock", "") == "1"
+    abc = request.GET.get("abc", "").strip().upper()
+    xyz = request.GET.get("xyz", "").strip().upper()
     sort = request.GET.get("sort", "last_purchase_date")
     direction = request.GET.get("direction", "desc")
     date_from = request.GET.get("date_from", "").strip()
@@ -53,6 +110,23 @@ def warehouse_stock(request):
         ).distinct()
     if selected_vendor_id:
         items = items.filter(purchaseline__purchase__vendor_id=selected_vendor_id).distinct()
+    if abc in {"A", "B", "C"}:
+        items = items.filter(abc_class=abc)
+    if xyz in {"X", "Y", "Z"}:
+        items = items.filter(xyz_class=xyz)
+
+    if selected_warehouse_id == "all":
+        return _warehouse_stock_matrix(request, items, {
+            "warehouses": warehouses,
+            "vendors": vendors,
+            "selected_warehouse_id": selected_warehouse_id,
+            "selected_vendor_id": selected_vendor_id,
+            "q": q,
+            "low_stock": low_stock,
+            "abc": abc,
+            "xyz": xyz,
+            "direction": direction,
+        })
 
     if selected_warehouse_id and date_to_parsed:
         # Historical view: sum all movements up to date_to
@@ -70,7 +144,8 @@ def warehouse_stock(request):
             on_hand=Coalesce(
                 Subquery(hist_sub, output_field=DecimalField(max_digits=14, decimal_places=3)),
                 Value("0.000", output_field=DecimalField(max_digits=14, decimal_places=3)),
-            )
+            ),
+            stock_value=Value(None, output_field=DecimalField(max_digits=16, decimal_places=2)),
         )
         # If date_from also given, restrict to items with movement activity in the period
         if date_from_parsed:
@@ -80,17 +155,22 @@ def warehouse_stock(request):
                 stockmovement__created_at__date__lte=date_to_parsed,
             ).distinct()
     elif selected_warehouse_id:
-        stock_sub = StockBalance.objects.filter(
-            warehouse_id=selected_warehouse_id, item_id=OuterRef("pk")
-        ).values("on_hand")[:1]
+        stock_sub = StockBalance.objects.filter(warehouse_id=selected_warehouse_id, item_id=OuterRef("pk"))
         items = items.annotate(
             on_hand=Coalesce(
-                Subquery(stock_sub, output_field=DecimalField(max_digits=14, decimal_places=3)),
+                Subquery(stock_sub.values("on_hand")[:1], output_field=DecimalField(max_digits=14, decimal_places=3)),
                 Value("0.000", output_field=DecimalField(max_digits=14, decimal_places=3)),
-            )
+            ),
+            stock_value=Coalesce(
+                Subquery(stock_sub.values("stock_value")[:1], output_field=DecimalField(max_digits=16, decimal_places=2)),
+                Value("0.00", output_field=DecimalField(max_digits=16, decimal_places=2)),
+            ),
         )
     else:
-        items = items.annotate(on_hand=Value("0.000", output_field=DecimalField(max_digits=14, decimal_places=3)))
+        items = items.annotate(
+            on_hand=Value("0.000", output_field=DecimalField(max_digits=14, decimal_places=3)),
+            stock_value=Value("0.00", output_field=DecimalField(max_digits=16, decimal_places=2)),
+        )
 
     last_purchase = PurchaseLine.objects.filter(item_id=OuterRef("pk")).order_by(
         "-purchase__invoice_date", "-id"
@@ -114,6 +194,7 @@ def warehouse_stock(request):
         "category",
         "unit",
         "on_hand",
+        "stock_value",
         "min_stock",
         "last_purchase_vendor",
         "last_purchase_unit_price",
@@ -122,6 +203,9 @@ def warehouse_stock(request):
     }:
         prefix = "" if direction == "asc" else "-"
         items = items.order_by(f"{prefix}{sort}")
+    elif sort == "class":
+        prefix = "" if direction == "asc" else "-"
+        items = items.order_by(f"{prefix}abc_class", f"{prefix}xyz_class", "name")
 
     if request.GET.get("export") == "csv":
         response = HttpResponse(content_type="text/csv")
@@ -131,7 +215,10 @@ def warehouse_stock(request):
             "item_name",
             "category",
             "unit",
+            "abc_class",
+            "xyz_class",
             "on_hand",
+            "stock_value",
             "min_stock",
             "last_purchase_vendor",
             "last_purchase_unit_price",
@@ -143,7 +230,10 @@ def warehouse_stock(request):
                 item.name,
                 item.category,
                 item.unit,
+                item.abc_class,
+                item.xyz_class,
                 item.on_hand,
+                item.stock_value,
                 item.min_stock,
                 item.last_purchase_vendor,
                 item.last_purchase_unit_price,
@@ -161,7 +251,7 @@ def warehouse_stock(request):
         ws = wb.active
         ws.title = "Warehouse Stock"
         ws.append([
-            "Məhsul", "Kateqoriya", "Ölçü vahidi", "Anbarda",
+            "Məhsul", "Kateqoriya", "Ölçü vahidi", "ABC", "XYZ", "Anbarda", "Dəyər",
             "Min Stok", "Son Alış Təchizatçısı", "Son Alış Qiyməti",
             "Son Alış Tarixi", "Son Verilmə Tarixi",
         ])
@@ -172,7 +262,10 @@ def warehouse_stock(request):
                 item.name,
                 item.category,
                 item.unit,
+                item.abc_class,
+                item.xyz_class,
                 float(item.on_hand),
+                float(item.stock_value) if item.stock_value is not None else "",
                 float(item.min_stock),
                 item.last_purchase_vendor or "",
                 float(item.last_purchase_unit_price) if item.last_purchase_unit_price else "",
@@ -207,6 +300,8 @@ def warehouse_stock(request):
         "items": page,
         "q": q,
         "low_stock": low_stock,
+        "abc": abc,
+        "xyz": xyz,
         "sort": sort,
         "direction": direction,
         "base_query": base_query,
@@ -221,6 +316,130 @@ def warehouse_stock(request):
     return render(request, "inventory/warehouse_stock.html", context)
 
 
+MATRIX_SORTS = {"name", "category", "unit", "min_stock", "total", "total_value"}
+
+
+def _warehouse_stock_matrix(request, items, context):
+    warehouses = list(context["warehouses"])
+    columns = [f"wh_{wh.id}" for wh in warehouses]
+    rows = stock_matrix(items, [wh.id for wh in warehouses])
+    if context["low_stock"]:
+        rows = rows.filter(total__lt=models.F("min_stock"))
+
+    sort = request.GET.get("sort", "total")
+    if sort not in MATRIX_SORTS and sort not in columns:
+        sort = "total"
+    prefix = "" if context["direction"] == "asc" else "-"
+    rows = rows.order_by(f"{prefix}{sort}", "name")
+
+    fields = ["name", "category", "unit", "abc_class", "xyz_class", "min_stock", *columns, "total", "total_value"]
+    export = request.GET.get("export")
+    if export == "csv":
+        names = ["item_name", "category", "unit", "abc_class", "xyz_class", "min_stock"]
+        names += [wh.name for wh in warehouses] + ["total", "stock_value"]
+        response = StreamingHttpResponse(
+            _csv_chunks(names, rows.values_list(*fields).iterator(chunk_size=2000)),
+            content_type="text/csv; charset=utf-8",
+        )
+        response["Content-Disposition"] = "attachment; filename=warehouse_stock_matrix.csv"
+        return response
+
+    if export == "xlsx":
+        import io
+        from openpyxl import Workbook
+        from openpyxl.styles import Font
+
+        wb = Workbook()
+        ws = wb.active
+        ws.title = "Warehouse Stock"
+        ws.append(
+            ["Məhsul", "Kateqoriya", "Ölçü vahidi", "ABC", "XYZ", "Min Stok"]
+            + [wh.name for wh in warehouses]
+            + ["Cəmi", "Dəyər"]
+        )
+        for cell in ws[1]:
+            cell.font = Font(bold=True)
+        for row in rows.values_list(*fields).iterator(chunk_size=2000):
+            ws.append(list(row[:5]) + [float(value) for value in row[5:]])
+        buf = io.BytesIO()
+        wb.save(buf)
+        buf.seek(0)
+        response = HttpResponse(
+            buf.read(),
+            content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        )
+        response["Content-Disposition"] = "attachment; filename=warehouse_stock_matrix.xlsx"
+        return response
+
+    paginator = Paginator(rows, 25)
+    page = paginator.get_page(request.GET.get("page"))
+    for row in page:
+        row.cells = [getattr(row, column) for column in columns]
+    params = request.GET.copy()
+    params.pop("page", None)
+    params.pop("export", None)
+    base_query = params.urlencode()
+    params.pop("sort", None)
+    params.pop("direction", None)
+
+    context.update({
+        "items": page,
+        "sort": sort,
+        "columns": list(zip(columns, warehouses)),
+        "base_query": base_query,
+        "sort_query": params.urlencode(),
+        "is_matrix": True,
+    })
+    if request.headers.get("HX-Request"):
+        return render(request, "inventory/_stock_matrix.html", context)
+    return render(request, "inventory/warehouse_stock.html", context)
+
+
+async def _balance_events(warehouse_id, language):
+    queue = await balance_listener.subscribe()
+    try:
+        yield "retry: 3000\n\n"
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + STOCK_EVENTS_MAX_AGE
+        keepalive = loop.time() + STOCK_EVENTS_KEEPALIVE
+        while loop.time() < deadline:
+            try:
+                change = await asyncio.wait_for(queue.get(), max(keepalive - loop.time(), 0))
+            except TimeoutError:
+                yield ": keep-alive\n\n"
+                keepalive = loop.time() + STOCK_EVENTS_KEEPALIVE
+                continue
+            if change is None:
+                return
+            if change["warehouse"] != warehouse_id:
+                continue
+            with translation.override(language):
+                change = dict(change)
+                change["display"] = formats.localize(Decimal(change["on_hand"]))
+                change["stock_value_display"] = formats.localize(Decimal(change["stock_value"]))
+            yield f"event: balance\ndata: {json.dumps(change)}\n\n"
+    finally:
+        balance_listener.unsubscribe(queue)
+
+
+@login_required
+@permission_required("masters.view_item", raise_exception=True)
+async def stock_events(request):
+    try:
+        warehouse_id = int(request.GET.get("warehouse", ""))
+    except ValueError:
+        return HttpResponseBadRequest("warehouse is required")
+    if "wsgi.version" in request.META:
+        # A WSGI worker would buffer the endless stream; 204 tells EventSource not to reconnect.
+        return HttpResponse(status=204)
+    response = StreamingHttpResponse(
+        _balance_events(warehouse_id, translation.get_language()), content_type="text/event-stream"
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
 @login_required
 @permission_required("masters.view_item", raise_exception=True)
 def item_detail(request, item_id: int):
@@ -366,3 +585,334 @@ def recent_movements(request):
             "date_to": date_to,
         },
     )
+
+
+@login_required
+@permission_required("inventory.view_stockbalance", raise_exception=True)
+def stock_valuation(request):
+    group_by = request.GET.get("group", "warehouse")
+    if group_by not in VALUATION_GROUPS:
+        group_by = "warehouse"
+    warehouse_id = request.GET.get("warehouse", "")
+    as_of = request.GET.get("date", "").strip()
+    as_of_parsed = _parse_date(as_of)
+    if as_of_parsed and as_of_parsed >= timezone.localdate():
+        as_of_parsed = None
+
+    rows = stock_valuation_rows(
+        group_by,
+        as_of_parsed,
+        [int(warehouse_id)] if warehouse_id.isdigit() else None,
+    )
+    total_value = sum((row["value"] for row in rows), Decimal("0.00"))
+    group_label = dict(VALUATION_GROUP_CHOICES)[group_by]
+
+    if request.GET.get("export") == "csv":
+        response = HttpResponse(content_type="text/csv")
+        response["Content-Disposition"] = "attachment; filename=stock_valuation.csv"
+        writer = csv.writer(response)
+        writer.writerow([group_by, "items", "qty", "value"])
+        for row in rows:
+            writer.writerow([row["label"], row["items"], row["qty"], row["value"]])
+        return response
+
+    if request.GET.get("export") == "xlsx":
+        import io
+        from openpyxl import Workbook
+        from openpyxl.styles import Font
+
+        wb = Workbook()
+        ws = wb.active
+        ws.title = "Stock Valuation"
+        ws.append([str(group_label), "Məhsul sayı", "Miqdar", "Dəyər"])
+        for cell in ws[1]:
+            cell.font = Font(bold=True)
+        for row in rows:
+            ws.append([row["label"], row["items"], float(row["qty"]), float(row["value"])])
+        ws.append(["", "", "", float(total_value)])
+        buf = io.BytesIO()
+        wb.save(buf)
+        buf.seek(0)
+        response = HttpResponse(
+            buf.read(),
+            content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        )
+        response["Content-Disposition"] = "attachment; filename=stock_valuation.xlsx"
+        return response
+
+    return render(
+        request,
+        "inventory/stock_valuation.html",
+        {
+            "rows": rows,
+            "total_value": total_value,
+            "group_by": group_by,
+            "group_label": group_label,
+            "group_choices": VALUATION_GROUP_CHOICES,
+            "warehouses": Warehouse.objects.filter(is_active=True).order_by("name"),
+            "warehouse_id": warehouse_id,
+            "date": as_of,
+        },
+    )
+
+
+@login_required
+@permission_required("inventory.view_stockmovement", raise_exception=True)
+def stock_period_summary(request):
+    today = timezone.localdate()
+    date_from = request.GET.get("date_from", "").strip()
+    date_to = request.GET.get("date_to", "").strip()
+    date_from_parsed = _parse_date(date_from) or today.replace(day=1)
+    date_to_parsed = _parse_date(date_to) or today
+    if date_to_parsed < date_from_parsed:
+        date_from_parsed, date_to_parsed = date_to_parsed, date_from_parsed
+    warehouse_id = request.GET.get("warehouse", "")
+    warehouse_ids = [int(warehouse_id)] if warehouse_id.isdigit() else None
+
+    if request.GET.get("export") == "csv":
+        rows = iter_period_summary(date_from_parsed, date_to_parsed, warehouse_ids)
+        response = StreamingHttpResponse(
+            _csv_chunks(PERIOD_SUMMARY_FIELDS, rows), content_type="text/csv; charset=utf-8"
+        )
+        response["Content-Disposition"] = (
+            f"attachment; filename=stock_summary_{date_from_parsed:%Y%m%d}_{date_to_parsed:%Y%m%d}.csv"
+        )
+        return response
+
+    paginator = Paginator(period_summary(date_from_parsed, date_to_parsed, warehouse_ids), 50)
+    page = paginator.get_page(request.GET.get("page"))
+    params = request.GET.copy()
+    params.pop("page", None)
+
+    return render(
+        request,
+        "inventory/stock_period_summary.html",
+        {
+            "rows": page,
+            "base_query": params.urlencode(),
+            "warehouses": Warehouse.objects.filter(is_active=True).order_by("name"),
+            "warehouse_id": warehouse_id,
+            "date_from": date_from or date_from_parsed.strftime("%d/%m/%Y"),
+            "date_to": date_to or date_to_parsed.strftime("%d/%m/%Y"),
+        },
+    )
+
+
+def _parse_month(value):
+    try:
+        return datetime.strptime(value, "%Y-%m").date()
+    except ValueError:
+        return None
+
+
+@login_required
+@permission_required("issuing.view_issueheader", raise_exception=True)
+def consumption_report(request):
+    today = timezone.localdate()
+    group_by = [group for group in (request.GET.get("group", "location"), request.GET.get("then", "")) if group]
+    group_by = [group for group in dict.fromkeys(group_by) if group in CONSUMPTION_GROUPS] or ["location"]
+    month_from = request.GET.get("month_from", "").strip() or f"{today.year}-{(today.month - 1) // 3 * 3 + 1:02d}"
+    month_to = request.GET.get("month_to", "").strip() or f"{today:%Y-%m}"
+    location_id = request.GET.get("location", "")
+    warehouse_id = request.GET.get("warehouse", "")
+    category = request.GET.get("category", "").strip()
+
+    rows = consumption_summary(
+        group_by,
+        month_from=_parse_month(month_from),
+        month_to=_parse_month(month_to),
+        location_ids=[int(location_id)] if location_id.isdigit() else None,
+        warehouse_ids=[int(warehouse_id)] if warehouse_id.isdigit() else None,
+        category=category or None,
+    )
+    columns = [
+        (name, label)
+        for group in group_by
+        for name, label in CONSUMPTION_COLUMNS[group]
+    ]
+    for row in rows:
+        row["cells"] = [row[name] for name, label in columns]
+    total_value = sum((row["value"] for row in rows), Decimal("0.00"))
+
+    if request.GET.get("export") == "csv":
+        response = HttpResponse(content_type="text/csv")
+        response["Content-Disposition"] = "attachment; filename=consumption.csv"
+        writer = csv.writer(response)
+        writer.writerow([name for name, label in columns] + ["qty", "value"])
+        for row in rows:
+            writer.writerow(row["cells"] + [row["qty"], row["value"]])
+        return response
+
+    if request.GET.get("export") == "xlsx":
+        import io
+        from openpyxl import Workbook
+        from openpyxl.styles import Font
+
+        wb = Workbook()
+        ws = wb.active
+        ws.title = "Consumption"
+        ws.append([str(label) for name, label in columns] + ["Miqdar", "Dəyər"])
+        for cell in ws[1]:
+            cell.font = Font(bold=True)
+        for row in rows:
+            ws.append(row["cells"] + [float(row["qty"]), float(row["value"])])
+        buf = io.BytesIO()
+        wb.save(buf)
+        buf.seek(0)
+        response = HttpResponse(
+            buf.read(),
+            content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        )
+        response["Content-Disposition"] = "attachment; filename=consumption.xlsx"
+        return response
+
+    params = request.GET.copy()
+    params.pop("export", None)
+    return render(
+        request,
+        "inventory/consumption_report.html",
+        {
+            "rows": rows,
+            "columns": columns,
+            "total_value": total_value,
+            "group_choices": CONSUMPTION_GROUP_CHOICES,
+            "group": group_by[0],
+            "then": group_by[1] if len(group_by) > 1 else "",
+            "locations": OutgoingLocation.objects.filter(is_active=True).order_by("name"),
+            "warehouses": Warehouse.objects.filter(is_active=True).order_by("name"),
+            "location_id": location_id,
+            "warehouse_id": warehouse_id,
+            "category": category,
+            "month_from": month_from,
+            "month_to": month_to,
+            "base_query": params.urlencode(),
+        },
+    )
+
+
+@login_required
+@permission_required("inventory.view_stockbalance", raise_exception=True)
+def reorder_suggestions(request):
+    suggestions = ReorderSuggestion.objects.select_related("warehouse", "item", "vendor")
+    warehouse_id = request.GET.get("warehouse", "")
+    vendor_id = request.GET.get("vendor", "")
+    if warehouse_id.isdigit():
+        suggestions = suggestions.filter(warehouse_id=warehouse_id)
+    if vendor_id == "none":
+        suggestions = suggestions.filter(vendor__isnull=True)
+    elif vendor_id.isdigit():
+        suggestions = suggestions.filter(vendor_id=vendor_id)
+
+    if request.method == "POST":
+        if not request.user.has_perm("purchasing.add_purchaseheader"):
+            raise PermissionDenied
+        action = request.POST.get("action")
+        if action == "recompute":
+            count = compute_reorder_suggestions(warehouse_ids=[int(warehouse_id)] if warehouse_id.isdigit() else None)
+            messages.success(request, _("%(count)s reorder suggestion(s) computed.") % {"count": count})
+        elif action == "create_drafts":
+            ids = suggestions.values_list("id", flat=True)
+            if not request.POST.get("all"):
+                ids = ids.filter(pk__in=[value for value in request.POST.getlist("suggestion") if value.isdigit()])
+            headers = create_reorder_purchases(ids, request.user)
+            messages.success(request, _("%(count)s draft purchase(s) created.") % {"count": len(headers)})
+        return redirect(request.get_full_path())
+
+    paginator = Paginator(suggestions.order_by("vendor__name", "warehouse__name", "item__name", "id"), 50)
+    page = paginator.get_page(request.GET.get("page"))
+    params = request.GET.copy()
+    params.pop("page", None)
+    return render(
+        request,
+        "inventory/reorder_suggestions.html",
+        {
+            "rows": page,
+            "base_query": params.urlencode(),
+            "computed_at": suggestions.order_by("-computed_at").values_list("computed_at", flat=True).first(),
+            "warehouses": Warehouse.objects.filter(is_active=True).order_by("name"),
+            "vendors": Vendor.objects.filter(is_active=True).order_by("name"),
+            "warehouse_id": warehouse_id,
+            "vendor_id": vendor_id,
+        },
+    )
+
+
+@login_required
+@permission_required("inventory.view_stockbalance", raise_exception=True)
+def stock_aging(request):
+    basis = request.GET.get("basis", "movement")
+    if basis not in AGING_BASES:
+        basis = "movement"
+    warehouse_id = request.GET.get("warehouse", "")
+    category = request.GET.get("category", "").strip()
+    min_days = request.GET.get("min_days", "").strip()
+    filters = {
+        "warehouse_ids": [int(warehouse_id)] if warehouse_id.isdigit() else None,
+        "min_days": int(min_days) if min_days.isdigit() else None,
+        "category": category or None,
+    }
+
+    if request.GET.get("export") == "csv":
+        response = StreamingHttpResponse(
+            _csv_chunks(AGING_FIELDS, iter_stock_aging(basis, **filters)), content_type="text/csv; charset=utf-8"
+        )
+        response["Content-Disposition"] = f"attachment; filename=stock_aging_{basis}.csv"
+        return response
+
+    if request.GET.get("export") == "xlsx":
+        import io
+        from openpyxl import Workbook
+        from openpyxl.styles import Font
+
+        wb = Workbook()
+        ws = wb.active
+        ws.title = "Stock Aging"
+        ws.append(
+            ["Anbar", "Məhsul", "Ölçü vahidi", "Kateqoriya", "Tarix", "Miqdar", "Dəyər"]
+            + [f"{label} {kind}" for label in AGING_BUCKET_LABELS.values() for kind in ("Miqdar", "Dəyər")]
+        )
+        for cell in ws[1]:
+            cell.font = Font(bold=True)
+        for row in iter_stock_aging(basis, **filters):
+            since = timezone.localtime(row[6]).date() if row[6] else None
+            ws.append([row[1], row[3], row[4], row[5], since] + [float(value) for value in row[7:]])
+        buf = io.BytesIO()
+        wb.save(buf)
+        buf.seek(0)
+        response = HttpResponse(
+            buf.read(),
+            content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        )
+        response["Content-Disposition"] = f"attachment; filename=stock_aging_{basis}.xlsx"
+        return response
+
+    rows = stock_aging_rows(basis, **filters)
+    totals = {field: sum((row[field] for row in rows), Decimal("0")) for field in AGING_FIELDS[7:]}
+    paginator = Paginator(rows, 50)
+    page = paginator.get_page(request.GET.get("page"))
+    for row in page:
+        row["buckets"] = [(row[f"qty_{name}"], row[f"value_{name}"]) for name, days in AGING_BUCKETS]
+    params = request.GET.copy()
+    params.pop("page", None)
+    params.pop("export", None)
+
+    return render(
+        request,
+        "inventory/stock_aging.html",
+        {
+            "rows": page,
+            "buckets": [
+                (AGING_BUCKET_LABELS[name], totals[f"qty_{name}"], totals[f"value_{name}"])
+                for name, days in AGING_BUCKETS
+            ],
+            "total_qty": totals["qty"],
+            "total_value": totals["value"],
+            "basis": basis,
+            "basis_choices": AGING_BASIS_CHOICES,
+            "warehouses": Warehouse.objects.filter(is_active=True).order_by("name"),
+            "warehouse_id": warehouse_id,
+            "category": category,
+            "min_days": min_days,
+            "base_query": params.urlencode(),
+        },
+    )
@@ -1,13 +1,46 @@
 from rest_framework import viewsets
+from rest_framework.decorators import action
 from rest_framework.permissions import DjangoModelPermissions
-from .models import IssueHeader
+from wms.api import EXPORT_RENDERERS, BulkCreateMixin, LinesPrefetchMixin, date_param, export_response, int_param
+from .models import IssueHeader, IssueLine
 from .serializers import IssueSerializer
 
 
-class IssueViewSet(viewsets.ModelViewSet):
+class IssueViewSet(BulkCreateMixin, LinesPrefetchMixin, viewsets.ModelViewSet):
     queryset = IssueHeader.objects.all().order_by("-created_at")
     serializer_class = IssueSerializer
     permission_classes = [DjangoModelPermissions]
+    line_model = IssueLine
+    line_export_fields = [
+        ("id", "id"),
+        ("issue", "header_id"),
+        ("issue_date", "header__issue_date"),
+        ("warehouse", "header__warehouse_id"),
+        ("outgoing_location", "header__outgoing_location_id"),
+        ("is_posted", "header__is_posted"),
+        ("item", "item_id"),
+        ("qty", "qty"),
+    ]
 
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
+
+    @action(detail=False, url_path="lines/export", renderer_classes=EXPORT_RENDERERS)
+    def export_lines(self, request):
+        params = request.query_params
+        lines = IssueLine.objects.all()
+        for name, lookup in (
+            ("warehouse", "header__warehouse_id"),
+            ("outgoing_location", "header__outgoing_location_id"),
+            ("item", "item_id"),
+        ):
+            value = int_param(params, name)
+            if value is not None:
+                lines = lines.filter(**{lookup: value})
+        date_from = date_param(params, "date_from")
+        if date_from:
+            lines = lines.filter(header__issue_date__gte=date_from)
+        date_to = date_param(params, "date_to")
+        if date_to:
+            lines = lines.filter(header__issue_date__lte=date_to)
+        return export_response(request, lines, self.line_export_fields, "issue-lines")
@@ -1,18 +1,33 @@
 from rest_framework import serializers
+from wms.serializers import (
+    BulkLinesListSerializer,
+    ExpandableFieldsMixin,
+    FastListSerializer,
+    PrefetchedPrimaryKeyRelatedField,
+    SparseFieldsMixin,
+)
 from .models import IssueHeader, IssueLine
 
 
-class IssueLineSerializer(serializers.ModelSerializer):
+class IssueLineSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    serializer_related_field = PrefetchedPrimaryKeyRelatedField
+    item_code = serializers.CharField(source="item.internal_code", read_only=True)
+    item_name = serializers.CharField(source="item.name", read_only=True)
+
     class Meta:
         model = IssueLine
-        fields = ["id", "item", "qty"]
+        list_serializer_class = FastListSerializer
+        fields = ["id", "item", "qty", "item_code", "item_name"]
+        expandable_fields = {"item": ["item_code", "item_name"]}
 
 
-class IssueSerializer(serializers.ModelSerializer):
+class IssueSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    serializer_related_field = PrefetchedPrimaryKeyRelatedField
     lines = IssueLineSerializer(many=True)
 
     class Meta:
         model = IssueHeader
+        list_serializer_class = BulkLinesListSerializer
         fields = [
             "id",
             "warehouse",
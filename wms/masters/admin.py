@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.contrib import messages
 from django.utils.translation import gettext_lazy as _
+from wms.inventory.services import delete_movements, delete_balances
 from .models import Vendor, Warehouse, OutgoingLocation, Unit, Item, VendorItem, VendorAttachment
 
 
@@ -72,8 +73,8 @@ class ItemAdmin(BulkDeleteActionMixin, admin.ModelAdmin):
 
         deleted = 0
         for item in queryset:
-            StockMovement.objects.filter(item=item).delete()
-            StockBalance.objects.filter(item=item).delete()
+            delete_movements(StockMovement.objects.filter(item=item))
+            delete_balances(StockBalance.objects.filter(item=item))
             IssueLine.objects.filter(item=item).delete()
             PurchaseLine.objects.filter(item=item).delete()
             TransferLine.objects.filter(item=item).delete()
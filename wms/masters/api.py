@@ -1,5 +1,9 @@
 from rest_framework import viewsets
+from rest_framework.decorators import action
 from rest_framework.permissions import DjangoModelPermissions
+from rest_framework.response import Response
+from wms.api import month_param
+from wms.inventory.reports import price_history
 from .models import Vendor, Warehouse, OutgoingLocation, Item
 from .serializers import VendorSerializer, WarehouseSerializer, OutgoingLocationSerializer, ItemSerializer
 
@@ -26,3 +30,17 @@ class ItemViewSet(viewsets.ModelViewSet):
     queryset = Item.objects.all()
     serializer_class = ItemSerializer
     permission_classes = [DjangoModelPermissions]
+
+    @action(detail=True, methods=["get"], url_path="price-history")
+    def price_history(self, request, pk=None):
+        item = self.get_object()
+        series = price_history(
+            item.id,
+            month_from=month_param(request.query_params, "month_from"),
+            currency=request.query_params.get("currency") or None,
+        )
+        for line in series:
+            for point in line["points"]:
+                for key in ("min", "max", "avg", "last", "qty", "spend"):
+                    point[key] = str(point[key])
+        return Response({"item": item.id, "series": series})
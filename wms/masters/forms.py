@@ -20,6 +20,7 @@ class VendorForm(forms.ModelForm):
             "tax_id",
             "address",
             "notes",
+            "lead_time_days",
             "is_active",
         ]
         labels = {
@@ -30,6 +31,7 @@ class VendorForm(forms.ModelForm):
             "tax_id": _("Tax ID"),
             "address": _("Address"),
             "notes": _("Notes"),
+            "lead_time_days": _("Lead Time (days)"),
             "is_active": _("Active"),
         }
 
@@ -0,0 +1,77 @@
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection, connections
+from django.test import Client
+from wms.health import database_status
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure requests per second for one URL through the full middleware stack. "
+        "Run it with POSTGRES_CONN_MAX_AGE=0, with the default settings and with POSTGRES_POOL=1 to compare."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--path", default="/masters/items/search/?q=a")
+        parser.add_argument("--requests", type=int, default=500, help="Requests per thread.")
+        parser.add_argument("--threads", type=int, default=4)
+        parser.add_argument("--user", help="Username to log in as, defaults to the first superuser.")
+
+    def handle(self, *args, **options):
+        if options["user"]:
+            user = User.objects.filter(username=options["user"]).first()
+        else:
+            user = User.objects.filter(is_superuser=True).order_by("id").first()
+        if user is None:
+            raise CommandError("No user to log in as.")
+
+        if connection.pool is not None:
+            mode = f"pool (max_size={connection.pool.max_size})"
+        else:
+            mode = f"CONN_MAX_AGE={connection.settings_dict['CONN_MAX_AGE']}"
+        connections.close_all()
+
+        failures = []
+        latencies = []
+        lock = threading.Lock()
+
+        def worker():
+            client = Client()
+            client.force_login(user)
+            local = []
+            for _ in range(options["requests"]):
+                started = time.perf_counter()
+                response = client.get(options["path"])
+                # The test client skips the end-of-request cleanup a real server does.
+                close_old_connections()
+                local.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    failures.append(response.status_code)
+            with lock:
+                latencies.extend(local)
+            connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(options["threads"])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        p50 = latencies[len(latencies) // 2] * 1000 if latencies else 0
+        p95 = latencies[int(len(latencies) * 0.95) - 1] * 1000 if latencies else 0
+        self.stdout.write(f"Connections: {mode}")
+        self.stdout.write(
+            f"{len(latencies)} request(s) to {options['path']} in {elapsed:.2f}s: "
+            f"{len(latencies) / elapsed:.1f} req/s, p50={p50:.1f}ms p95={p95:.1f}ms"
+        )
+        if failures:
+            self.stdout.write(self.style.WARNING(f"{len(failures)} non-200 response(s), first: {failures[0]}"))
+        status = database_status()
+        if "pool" in status:
+            self.stdout.write(f"Pool: {status['pool']}")
@@ -0,0 +1,82 @@
+import importlib.util
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from wms.api import ORJSONRenderer
+from wms.inventory.models import StockMovement
+from wms.inventory.serializers import StockMovementSerializer
+
+
+def _rows(count):
+    now = timezone.now()
+    return [
+        StockMovement(
+            id=n,
+            warehouse_id=1 + n % 3,
+            item_id=1 + n % 500,
+            movement_type=StockMovement.TYPE_IN_PURCHASE,
+            qty_delta=Decimal("12.500"),
+            unit_cost=Decimal("3.25"),
+            currency="AZN",
+            reference_type="purchase",
+            reference_id=n // 10,
+            note=f"Invoice INV-{n // 10}",
+            created_by_id=1,
+            created_at=now,
+            change_xid=1000 + n,
+            change_seq=n,
+        )
+        for n in range(1, count + 1)
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        "Time serializing and rendering StockMovement rows with DRF's default list serializer and JSON renderer "
+        "against FastListSerializer, ?fields= and the orjson renderer. No database access."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=10000)
+        parser.add_argument("--repeat", type=int, default=3, help="Best of N runs is reported.")
+
+    def handle(self, *args, **options):
+        rows = _rows(options["rows"])
+        factory = APIRequestFactory()
+        plain = {"request": Request(factory.get("/api/stock-movements/"))}
+        sparse = {"request": Request(factory.get("/api/stock-movements/?fields=id,item,qty_delta,created_at"))}
+
+        variants = [
+            ("drf default", lambda: serializers.ListSerializer(rows, child=StockMovementSerializer(), context=plain), JSONRenderer),
+            ("fast list", lambda: StockMovementSerializer(rows, many=True, context=plain), JSONRenderer),
+            ("fast list + orjson", lambda: StockMovementSerializer(rows, many=True, context=plain), ORJSONRenderer),
+            ("fields=4 + orjson", lambda: StockMovementSerializer(rows, many=True, context=sparse), ORJSONRenderer),
+        ]
+        if importlib.util.find_spec("orjson") is None:
+            self.stdout.write(self.style.WARNING("orjson is not installed, skipping the orjson variants."))
+            variants = variants[:2]
+
+        per = 10000 / len(rows) * 1000
+        baseline = None
+        for name, build, renderer_class in variants:
+            best_serialize = best_render = None
+            for _ in range(options["repeat"]):
+                started = time.perf_counter()
+                data = build().data
+                serialized = time.perf_counter()
+                renderer_class().render(data)
+                rendered = time.perf_counter()
+                if best_serialize is None or serialized - started + rendered - serialized < best_serialize + best_render:
+                    best_serialize, best_render = serialized - started, rendered - serialized
+            total = best_serialize + best_render
+            baseline = baseline or total
+            self.stdout.write(
+                f"{name:<20} serialize={best_serialize * per:7.1f}ms render={best_render * per:6.1f}ms "
+                f"total={total * per:7.1f}ms per 10k rows ({baseline / total:.1f}x)"
+            )
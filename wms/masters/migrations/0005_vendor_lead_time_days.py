@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("masters", "0004_unit"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="vendor",
+            name="lead_time_days",
+            field=models.PositiveIntegerField(default=7),
+        ),
+    ]
@@ -0,0 +1,30 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("masters", "0005_vendor_lead_time_days"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="item",
+            name="abc_class",
+            field=models.CharField(blank=True, editable=False, max_length=1),
+        ),
+        migrations.AddField(
+            model_name="item",
+            name="xyz_class",
+            field=models.CharField(blank=True, editable=False, max_length=1),
+        ),
+        migrations.AddField(
+            model_name="item",
+            name="classified_at",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="item",
+            index=models.Index(fields=["abc_class", "xyz_class"], name="masters_ite_abc_cla_1af619_idx"),
+        ),
+    ]
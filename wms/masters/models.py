@@ -12,6 +12,7 @@ class Vendor(models.Model):
     tax_id = models.CharField(max_length=100, blank=True)
     address = models.TextField(blank=True)
     notes = models.TextField(blank=True)
+    lead_time_days = models.PositiveIntegerField(default=7)
     is_active = models.BooleanField(default=True)
 
     def __str__(self) -> str:
@@ -78,11 +79,16 @@ class Item(models.Model):
     notes = models.TextField(blank=True)
     is_active = models.BooleanField(default=True)
     photo = models.ImageField(upload_to="item_photos/", blank=True, null=True)
+    # Written by the classify_items job from issue consumption, blank until an item has been issued.
+    abc_class = models.CharField(max_length=1, blank=True, editable=False)
+    xyz_class = models.CharField(max_length=1, blank=True, editable=False)
+    classified_at = models.DateTimeField(blank=True, null=True, editable=False)
 
     class Meta:
         indexes = [
             models.Index(fields=["internal_code"]),
             models.Index(fields=["name"]),
+            models.Index(fields=["abc_class", "xyz_class"]),
         ]
 
     def __str__(self) -> str:
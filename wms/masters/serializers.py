@@ -1,32 +1,38 @@
 from rest_framework import serializers
+from wms.serializers import SparseFieldsMixin, FastListSerializer
 from .models import Vendor, Warehouse, OutgoingLocation, Item, VendorItem
 
 
-class VendorSerializer(serializers.ModelSerializer):
+class VendorSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Vendor
+        list_serializer_class = FastListSerializer
         fields = "__all__"
 
 
-class WarehouseSerializer(serializers.ModelSerializer):
+class WarehouseSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Warehouse
+        list_serializer_class = FastListSerializer
         fields = "__all__"
 
 
-class OutgoingLocationSerializer(serializers.ModelSerializer):
+class OutgoingLocationSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = OutgoingLocation
+        list_serializer_class = FastListSerializer
         fields = "__all__"
 
 
-class ItemSerializer(serializers.ModelSerializer):
+class ItemSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = Item
+        list_serializer_class = FastListSerializer
         fields = "__all__"
 
 
-class VendorItemSerializer(serializers.ModelSerializer):
+class VendorItemSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = VendorItem
+        list_serializer_class = FastListSerializer
         fields = "__all__"
@@ -1,3 +1,4 @@
+from collections import defaultdict
 from django.contrib.auth.decorators import login_required, permission_required
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
@@ -17,7 +18,17 @@ from .forms import (
 from django.utils import timezone
 from pathlib import Path
 from wms.purchasing.models import PurchaseHeader, PurchaseLine, PurchaseAttachment
-from wms.inventory.services import post_purchase, quantize_money, quantize_qty
+from wms.inventory.services import (
+    post_purchase,
+    quantize_money,
+    quantize_qty,
+    movement_value,
+    restore_balance,
+    delete_movements,
+    delete_balances,
+    record_stock_event,
+    refresh_price_history,
+)
 
 _ALLOWED_ATTACHMENT_EXTS = {".pdf", ".jpg", ".jpeg", ".png", ".xlsx", ".xls", ".doc", ".docx"}
 
@@ -140,6 +151,12 @@ def vendor_delete(request, vendor_id: int):
                         )
                     PurchaseHeader.objects.filter(vendor=vendor).update(vendor=replacement_vendor)
                     vendor.delete()
+                    refresh_price_history(
+                        (replacement_vendor.id, invoice_date.replace(day=1), item_id)
+                        for invoice_date, item_id in PurchaseLine.objects.filter(
+                            purchase__vendor=replacement_vendor, purchase__is_posted=True
+                        ).values_list("purchase__invoice_date", "item_id")
+                    )
         return redirect("vendor_list")
     return render(
         request,
@@ -256,15 +273,18 @@ def outgoing_location_delete(request, location_id: int):
                             reference_type="issue",
                             reference_id__in=issue_ids,
                         ).select_related("warehouse", "item")
+                        deltas_by_issue = defaultdict(list)
                         for mv in issue_movements:
+                            deltas_by_issue[mv.reference_id].append((mv.warehouse_id, mv.item_id, -mv.qty_delta))
                             balance, created_balance = StockBalance.objects.get_or_create(
                                 warehouse=mv.warehouse,
                                 item=mv.item,
                                 defaults={"on_hand": 0},
                             )
-                            balance.on_hand = quantize_qty(balance.on_hand - mv.qty_delta)
-                            balance.save(update_fields=["on_hand"])
-                        issue_movements.delete()
+                            restore_balance(balance, -mv.qty_delta, -movement_value(mv))
+                        delete_movements(issue_movements)
+                        for issue_id, deltas in deltas_by_issue.items():
+                            record_stock_event("issue.deleted", "issue", issue_id, deltas)
                         IssueHeader.objects.filter(id__in=issue_ids).delete()
                     location.delete()
         return redirect("outgoing_location_list")
@@ -442,8 +462,8 @@ def item_delete(request, item_id: int):
                 from wms.masters.models import VendorItem
 
                 with transaction.atomic():
-                    StockMovement.objects.filter(item=item).delete()
-                    StockBalance.objects.filter(item=item).delete()
+                    delete_movements(StockMovement.objects.filter(item=item))
+                    delete_balances(StockBalance.objects.filter(item=item))
                     IssueLine.objects.filter(item=item).delete()
                     PurchaseLine.objects.filter(item=item).delete()
                     TransferLine.objects.filter(item=item).delete()
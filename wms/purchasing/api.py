@@ -1,13 +1,48 @@
 from rest_framework import viewsets
+from rest_framework.decorators import action
 from rest_framework.permissions import DjangoModelPermissions
-from .models import PurchaseHeader
+from wms.api import EXPORT_RENDERERS, BulkCreateMixin, LinesPrefetchMixin, date_param, export_response, int_param
+from .models import PurchaseHeader, PurchaseLine
 from .serializers import PurchaseSerializer
 
 
-class PurchaseViewSet(viewsets.ModelViewSet):
+class PurchaseViewSet(BulkCreateMixin, LinesPrefetchMixin, viewsets.ModelViewSet):
     queryset = PurchaseHeader.objects.all().order_by("-created_at")
     serializer_class = PurchaseSerializer
     permission_classes = [DjangoModelPermissions]
+    line_model = PurchaseLine
+    line_export_fields = [
+        ("id", "id"),
+        ("purchase", "purchase_id"),
+        ("invoice_no", "purchase__invoice_no"),
+        ("invoice_date", "purchase__invoice_date"),
+        ("vendor", "purchase__vendor_id"),
+        ("warehouse", "purchase__warehouse_id"),
+        ("currency", "purchase__currency"),
+        ("is_posted", "purchase__is_posted"),
+        ("item", "item_id"),
+        ("qty", "qty"),
+        ("unit_price", "unit_price"),
+        ("discount", "discount"),
+        ("tax_rate", "tax_rate"),
+        ("line_total", "line_total"),
+    ]
 
     def perform_create(self, serializer):
         serializer.save(created_by=self.request.user)
+
+    @action(detail=False, url_path="lines/export", renderer_classes=EXPORT_RENDERERS)
+    def export_lines(self, request):
+        params = request.query_params
+        lines = PurchaseLine.objects.all()
+        for name, lookup in (("warehouse", "purchase__warehouse_id"), ("vendor", "purchase__vendor_id"), ("item", "item_id")):
+            value = int_param(params, name)
+            if value is not None:
+                lines = lines.filter(**{lookup: value})
+        date_from = date_param(params, "date_from")
+        if date_from:
+            lines = lines.filter(purchase__invoice_date__gte=date_from)
+        date_to = date_param(params, "date_to")
+        if date_to:
+            lines = lines.filter(purchase__invoice_date__lte=date_to)
+        return export_response(request, lines, self.line_export_fields, "purchase-lines")
@@ -1,4 +1,5 @@
 from django import forms
+from django.conf import settings
 from django.utils.translation import gettext_lazy as _
 from django.forms import inlineformset_factory
 from decimal import Decimal
@@ -19,11 +20,12 @@ class PurchaseHeaderForm(forms.ModelForm):
 
     class Meta:
         model = PurchaseHeader
-        fields = ["vendor", "warehouse", "invoice_date", "currency", "notes"]
+        fields = ["vendor", "warehouse", "invoice_date", "currency", "exchange_rate", "notes"]
         labels = {
             "vendor": _("Vendor"),
             "warehouse": _("Warehouse"),
             "currency": _("Currency"),
+            "exchange_rate": _("Exchange Rate"),
             "notes": _("Notes"),
         }
 
@@ -34,6 +36,17 @@ class PurchaseHeaderForm(forms.ModelForm):
         if not self.instance.pk and not self.initial.get("invoice_date"):
             self.initial["invoice_date"] = timezone.localdate()
 
+    def clean(self):
+        cleaned = super().clean()
+        currency = cleaned.get("currency")
+        if currency and currency != settings.DEFAULT_CURRENCY and not cleaned.get("exchange_rate"):
+            self.add_error(
+                "exchange_rate",
+                _("Enter the %(default)s rate for %(currency)s purchases.")
+                % {"default": settings.DEFAULT_CURRENCY, "currency": currency},
+            )
+        return cleaned
+
 
 class PurchaseLineForm(forms.ModelForm):
     item_name = forms.CharField(required=False, label=_("Item"))
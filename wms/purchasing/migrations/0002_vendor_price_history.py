@@ -0,0 +1,62 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("masters", "0004_unit"),
+        ("purchasing", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="purchaseheader",
+            index=models.Index(fields=["vendor", "invoice_date"], name="purchasing__vendor__644a4b_idx"),
+        ),
+        migrations.CreateModel(
+            name="VendorPriceHistory",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("month", models.DateField()),
+                ("currency", models.CharField(max_length=10)),
+                ("line_count", models.PositiveIntegerField(default=0)),
+                ("qty", models.DecimalField(decimal_places=3, max_digits=16)),
+                ("spend", models.DecimalField(decimal_places=2, max_digits=16)),
+                ("min_price", models.DecimalField(decimal_places=2, max_digits=14)),
+                ("max_price", models.DecimalField(decimal_places=2, max_digits=14)),
+                ("avg_price", models.DecimalField(decimal_places=4, max_digits=14)),
+                ("last_price", models.DecimalField(decimal_places=2, max_digits=14)),
+                ("last_date", models.DateField()),
+                ("item", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to="masters.item")),
+                ("vendor", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to="masters.vendor")),
+            ],
+            options={
+                "indexes": [
+                    models.Index(fields=["item", "month"], name="purchasing__item_id_df8abf_idx"),
+                    models.Index(fields=["vendor", "month"], name="purchasing__vendor__3455ec_idx"),
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("month", "vendor", "item", "currency"), name="uq_vendor_price_history"
+                    ),
+                ],
+            },
+        ),
+        migrations.RunSQL(
+            """
+            INSERT INTO purchasing_vendorpricehistory
+                (month, vendor_id, item_id, currency, line_count, qty, spend,
+                 min_price, max_price, avg_price, last_price, last_date)
+            SELECT date_trunc('month', h.invoice_date)::date, h.vendor_id, l.item_id, h.currency, COUNT(*),
+                SUM(l.qty), SUM(l.line_total), MIN(l.unit_price), MAX(l.unit_price),
+                ROUND(COALESCE(SUM(l.unit_price * l.qty) / NULLIF(SUM(l.qty), 0), AVG(l.unit_price)), 4),
+                (ARRAY_AGG(l.unit_price ORDER BY h.invoice_date DESC, l.id DESC))[1], MAX(h.invoice_date)
+            FROM purchasing_purchaseline l
+            JOIN purchasing_purchaseheader h ON h.id = l.purchase_id
+            WHERE h.is_posted
+            GROUP BY 1, 2, 3, 4
+            """,
+            migrations.RunSQL.noop,
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("purchasing", "0002_vendor_price_history"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="purchaseheader",
+            name="exchange_rate",
+            field=models.DecimalField(blank=True, decimal_places=6, max_digits=14, null=True),
+        ),
+    ]
@@ -13,6 +13,8 @@ class PurchaseHeader(models.Model):
     invoice_no = models.CharField(max_length=100, blank=True)
     invoice_date = models.DateField()
     currency = models.CharField(max_length=10, default=settings.DEFAULT_CURRENCY)
+    # DEFAULT_CURRENCY per unit of `currency`; stock is valued in DEFAULT_CURRENCY.
+    exchange_rate = models.DecimalField(max_digits=14, decimal_places=6, blank=True, null=True)
     notes = models.TextField(blank=True)
     created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.PROTECT)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -20,6 +22,11 @@ class PurchaseHeader(models.Model):
     is_posted = models.BooleanField(default=False)
     posted_at = models.DateTimeField(blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["vendor", "invoice_date"]),
+        ]
+
 
 class PurchaseLine(models.Model):
     purchase = models.ForeignKey(PurchaseHeader, on_delete=models.CASCADE, related_name="lines")
@@ -38,3 +45,27 @@ class PurchaseAttachment(models.Model):
     file_type = models.CharField(max_length=100, blank=True)
     uploaded_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.PROTECT)
     uploaded_at = models.DateTimeField(auto_now_add=True)
+
+
+class VendorPriceHistory(models.Model):
+    month = models.DateField()
+    vendor = models.ForeignKey(Vendor, on_delete=models.CASCADE)
+    item = models.ForeignKey(Item, on_delete=models.CASCADE)
+    currency = models.CharField(max_length=10)
+    line_count = models.PositiveIntegerField(default=0)
+    qty = models.DecimalField(max_digits=16, decimal_places=3)
+    spend = models.DecimalField(max_digits=16, decimal_places=2)
+    min_price = models.DecimalField(max_digits=14, decimal_places=2)
+    max_price = models.DecimalField(max_digits=14, decimal_places=2)
+    avg_price = models.DecimalField(max_digits=14, decimal_places=4)
+    last_price = models.DecimalField(max_digits=14, decimal_places=2)
+    last_date = models.DateField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["month", "vendor", "item", "currency"], name="uq_vendor_price_history"),
+        ]
+        indexes = [
+            models.Index(fields=["item", "month"]),
+            models.Index(fields=["vendor", "month"]),
+        ]
@@ -1,25 +1,42 @@
+from django.conf import settings
 from rest_framework import serializers
+from wms.serializers import (
+    BulkLinesListSerializer,
+    ExpandableFieldsMixin,
+    FastListSerializer,
+    PrefetchedPrimaryKeyRelatedField,
+    SparseFieldsMixin,
+)
 from .models import PurchaseHeader, PurchaseLine, PurchaseAttachment
 
 
-class PurchaseLineSerializer(serializers.ModelSerializer):
+class PurchaseLineSerializer(ExpandableFieldsMixin, serializers.ModelSerializer):
+    serializer_related_field = PrefetchedPrimaryKeyRelatedField
+    item_code = serializers.CharField(source="item.internal_code", read_only=True)
+    item_name = serializers.CharField(source="item.name", read_only=True)
+
     class Meta:
         model = PurchaseLine
-        fields = ["id", "item", "qty", "unit_price", "discount", "tax_rate", "line_total"]
+        list_serializer_class = FastListSerializer
+        fields = ["id", "item", "qty", "unit_price", "discount", "tax_rate", "line_total", "item_code", "item_name"]
+        expandable_fields = {"item": ["item_code", "item_name"]}
 
 
 class PurchaseAttachmentSerializer(serializers.ModelSerializer):
     class Meta:
         model = PurchaseAttachment
+        list_serializer_class = FastListSerializer
         fields = ["id", "file", "original_name", "file_type", "uploaded_by", "uploaded_at"]
         read_only_fields = ["uploaded_by", "uploaded_at"]
 
 
-class PurchaseSerializer(serializers.ModelSerializer):
+class PurchaseSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    serializer_related_field = PrefetchedPrimaryKeyRelatedField
     lines = PurchaseLineSerializer(many=True)
 
     class Meta:
         model = PurchaseHeader
+        list_serializer_class = BulkLinesListSerializer
         fields = [
             "id",
             "vendor",
@@ -27,6 +44,7 @@ class PurchaseSerializer(serializers.ModelSerializer):
             "invoice_no",
             "invoice_date",
             "currency",
+            "exchange_rate",
             "notes",
             "created_by",
             "created_at",
@@ -37,6 +55,15 @@ class PurchaseSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ["created_by", "created_at", "updated_at", "posted_at"]
 
+    def validate(self, attrs):
+        currency = attrs.get("currency", getattr(self.instance, "currency", settings.DEFAULT_CURRENCY))
+        rate = attrs.get("exchange_rate", getattr(self.instance, "exchange_rate", None))
+        if currency != settings.DEFAULT_CURRENCY and not rate:
+            raise serializers.ValidationError(
+                {"exchange_rate": f"Required for {currency} purchases, in {settings.DEFAULT_CURRENCY} per {currency}."}
+            )
+        return attrs
+
     def create(self, validated_data):
         lines_data = validated_data.pop("lines")
         purchase = PurchaseHeader.objects.create(**validated_data)
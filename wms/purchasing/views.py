@@ -1,5 +1,6 @@
 from django.contrib.auth.decorators import login_required, permission_required
 from django.shortcuts import render, redirect, get_object_or_404
+from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse
 from django.core.exceptions import PermissionDenied
 from django.db.models import Count, Sum
 from django.db import transaction
@@ -7,7 +8,9 @@ from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.contrib import messages
 from datetime import datetime
+from decimal import Decimal
 from pathlib import Path
+import csv
 
 _ALLOWED_ATTACHMENT_EXTS = {".pdf", ".jpg", ".jpeg", ".png", ".xlsx", ".xls", ".doc", ".docx"}
 
@@ -23,7 +26,8 @@ def _parse_date(value):
     return None
 from .forms import PurchaseHeaderForm, PurchaseLineFormSet, PurchaseEditLineFormSet
 from .models import PurchaseAttachment, PurchaseLine
-from wms.masters.models import Item
+from wms.masters.models import Item, Vendor
+from wms.inventory.reports import best_recent_price, vendor_spend as vendor_spend_rows
 from wms.inventory.services import post_purchase, delete_purchase_with_inventory, unpost_purchase_inventory
 from .models import PurchaseHeader
 
@@ -101,7 +105,6 @@ def purchase_list(request):
     if date_to_parsed:
         purchases = purchases.filter(invoice_date__lte=date_to_parsed)
 
-    from wms.masters.models import Vendor
     vendors = Vendor.objects.filter(is_active=True).order_by("name")
     return render(
         request,
@@ -244,3 +247,77 @@ def purchase_detail(request, purchase_id: int):
             "can_change_purchase": request.user.has_perm("purchasing.change_purchaseheader"),
         },
     )
+
+
+def _parse_month(value):
+    try:
+        return datetime.strptime(value, "%Y-%m").date()
+    except ValueError:
+        return None
+
+
+@login_required
+@permission_required("purchasing.view_purchaseheader", raise_exception=True)
+def vendor_spend(request):
+    today = timezone.localdate()
+    month_from = request.GET.get("month_from", "").strip() or f"{today.year}-01"
+    month_to = request.GET.get("month_to", "").strip() or f"{today:%Y-%m}"
+    vendor_id = request.GET.get("vendor", "").strip()
+    currency = request.GET.get("currency", "").strip()
+    vendor = get_object_or_404(Vendor, pk=vendor_id) if vendor_id.isdigit() else None
+
+    rows = vendor_spend_rows(_parse_month(month_from), _parse_month(month_to), vendor.id if vendor else None, currency)
+
+    if request.GET.get("export") == "csv":
+        response = HttpResponse(content_type="text/csv")
+        response["Content-Disposition"] = "attachment; filename=vendor_spend.csv"
+        writer = csv.writer(response)
+        if vendor:
+            writer.writerow(["item", "unit", "currency", "lines", "qty", "spend", "min_price", "avg_price", "max_price", "last_date"])
+            for row in rows:
+                writer.writerow([
+                    row["item__name"], row["item__unit"], row["currency"], row["lines"], row["qty"], row["spend"],
+                    row["min_price"], row["avg_price"], row["max_price"], row["last_date"],
+                ])
+        else:
+            writer.writerow(["vendor", "currency", "lines", "items", "spend", "last_date"])
+            for row in rows:
+                writer.writerow([
+                    row["vendor__name"], row["currency"], row["lines"], row["items"], row["spend"], row["last_date"],
+                ])
+        return response
+
+    # Spend in different currencies cannot be added up, so there is one total per currency.
+    totals = {}
+    for row in rows:
+        totals[row["currency"]] = totals.get(row["currency"], Decimal("0")) + row["spend"]
+    params = request.GET.copy()
+    params.pop("export", None)
+    return render(
+        request,
+        "purchasing/vendor_spend.html",
+        {
+            "rows": rows,
+            "totals": sorted(totals.items()),
+            "vendor": vendor,
+            "vendors": Vendor.objects.filter(is_active=True).order_by("name"),
+            "month_from": month_from,
+            "month_to": month_to,
+            "currency": currency,
+            "base_query": params.urlencode(),
+        },
+    )
+
+
+@login_required
+@permission_required("purchasing.view_purchaseheader", raise_exception=True)
+def best_price(request):
+    try:
+        item_id = int(request.GET.get("item", ""))
+    except ValueError:
+        return HttpResponseBadRequest("item is required")
+    best = best_recent_price(item_id, request.GET.get("currency") or None)
+    if best is not None:
+        best["price"] = str(best["price"])
+        best["date"] = best["date"].isoformat()
+    return JsonResponse({"best": best})
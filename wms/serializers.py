@@ -0,0 +1,225 @@
+import decimal
+from collections import defaultdict
+from operator import attrgetter
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.fields import SkipField
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.relations import PKOnlyObject
+from rest_framework.settings import api_settings
+
+
+def requested_expansions(request):
+    if request is None:
+        return set()
+    raw = request.query_params.get("expand", "")
+    return {part.strip() for part in raw.split(",") if part.strip()}
+
+
+def requested_fields(request):
+    # Writes need every field to validate and save, so ?fields= only trims reads.
+    if request is None or request.method not in SAFE_METHODS:
+        return None
+    raw = request.query_params.get("fields", "")
+    fields = {part.strip() for part in raw.split(",") if part.strip()}
+    return fields or None
+
+
+class SparseFieldsMixin:
+    # ?fields=id,on_hand limits the top-level output; nested line serializers keep all their fields.
+    def get_fields(self):
+        fields = super().get_fields()
+        owner = self.parent.parent if isinstance(self.parent, serializers.ListSerializer) else self.parent
+        if owner is None:
+            wanted = requested_fields(self.context.get("request"))
+            if wanted:
+                for name in list(fields):
+                    if name not in wanted:
+                        fields.pop(name)
+        return fields
+
+
+class ExpandableFieldsMixin:
+    # Meta.expandable_fields maps an ?expand= name to the fields it adds to the output.
+    def get_fields(self):
+        fields = super().get_fields()
+        expand = requested_expansions(self.context.get("request"))
+        for name, field_names in getattr(self.Meta, "expandable_fields", {}).items():
+            if name not in expand:
+                for field_name in field_names:
+                    fields.pop(field_name, None)
+        return fields
+
+
+class PrefetchedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    # Resolves primary keys from context["prefetched"] when a bulk request loaded them up front.
+    def to_internal_value(self, data):
+        instances = self.context.get("prefetched", {}).get(self.get_queryset().model)
+        if instances is None:
+            return super().to_internal_value(data)
+        if isinstance(data, bool):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        try:
+            pk = int(data)
+        except (TypeError, ValueError):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        try:
+            return instances[pk]
+        except KeyError:
+            self.fail("does_not_exist", pk_value=data)
+
+
+def _collect_related_pks(fields, document, wanted):
+    if not isinstance(document, dict):
+        return
+    for name, field in fields.items():
+        if field.read_only or name not in document:
+            continue
+        if isinstance(field, serializers.PrimaryKeyRelatedField):
+            value = document[name]
+            if isinstance(value, (int, str)) and str(value).isdigit():
+                wanted[field].add(int(value))
+        elif isinstance(field, serializers.ListSerializer) and isinstance(document[name], list):
+            for row in document[name]:
+                _collect_related_pks(field.child.fields, row, wanted)
+
+
+def prefetch_related_instances(serializer, documents):
+    wanted = defaultdict(set)
+    for document in documents:
+        _collect_related_pks(serializer.fields, document, wanted)
+    prefetched = {}
+    for field, pks in wanted.items():
+        queryset = field.get_queryset()
+        prefetched.setdefault(queryset.model, {}).update(queryset.in_bulk(pks))
+    return prefetched
+
+
+_SKIP = object()
+
+
+def _generic_getter(field):
+    def get(instance):
+        try:
+            attribute = field.get_attribute(instance)
+        except SkipField:
+            return _SKIP
+        if isinstance(attribute, PKOnlyObject) and attribute.pk is None:
+            return None
+        return attribute
+
+    return get
+
+
+def _identity(value):
+    return value
+
+
+def _datetime_converter(field):
+    output_format = getattr(field, "format", api_settings.DATETIME_FORMAT)
+    field_timezone = field.timezone if hasattr(field, "timezone") else field.default_timezone()
+    if output_format is None or output_format.lower() != ISO_8601 or field_timezone is None:
+        return None
+
+    # DateTimeField looks up the active timezone for every value; resolve it once per list.
+    def convert(value):
+        if not timezone.is_aware(value):
+            return field.to_representation(value)
+        value = value.astimezone(field_timezone).isoformat()
+        if value.endswith("+00:00"):
+            value = value[:-6] + "Z"
+        return value
+
+    return convert
+
+
+def _decimal_converter(field):
+    coerce_to_string = getattr(field, "coerce_to_string", api_settings.COERCE_DECIMAL_TO_STRING)
+    if not coerce_to_string or field.localize or field.normalize_output or field.decimal_places is None:
+        return None
+    exponent = decimal.Decimal(".1") ** field.decimal_places
+    context = decimal.getcontext().copy()
+    if field.max_digits is not None:
+        context.prec = field.max_digits
+
+    def convert(value):
+        if not isinstance(value, decimal.Decimal):
+            return field.to_representation(value)
+        return f"{value.quantize(exponent, rounding=field.rounding, context=context):f}"
+
+    return convert
+
+
+class FastListSerializer(serializers.ListSerializer):
+    # Output path for many=True. Fields that map straight onto a model column are read with
+    # attrgetter (foreign keys through their *_id attribute) instead of field.get_attribute().
+    # Everything else falls back to DRF's per-field logic, so the output is identical.
+    def _representation_plan(self):
+        if getattr(self, "_plan", None) is not None:
+            return self._plan
+        model = getattr(getattr(self.child, "Meta", None), "model", None)
+        plan = []
+        for field in self.child._readable_fields:
+            getter, convert = _generic_getter(field), field.to_representation
+            source = field.source
+            if model is not None and source != "*" and "." not in source:
+                try:
+                    model_field = model._meta.get_field(source)
+                except FieldDoesNotExist:
+                    model_field = None
+                if model_field is not None and model_field.concrete:
+                    if not model_field.is_relation:
+                        getter = attrgetter(model_field.attname)
+                        if isinstance(field, serializers.DateTimeField):
+                            convert = _datetime_converter(field) or convert
+                        elif isinstance(field, serializers.DecimalField):
+                            convert = _decimal_converter(field) or convert
+                    elif (
+                        isinstance(field, serializers.PrimaryKeyRelatedField)
+                        and field.pk_field is None
+                        and model_field.many_to_one
+                    ):
+                        getter, convert = attrgetter(model_field.attname), _identity
+            plan.append((field.field_name, getter, convert))
+        self._plan = plan
+        return plan
+
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, models.manager.BaseManager) else data
+        plan = self._representation_plan()
+        rows = []
+        for instance in iterable:
+            row = {}
+            for name, get, convert in plan:
+                value = get(instance)
+                if value is _SKIP:
+                    continue
+                row[name] = None if value is None else convert(value)
+            rows.append(row)
+        return rows
+
+
+class BulkLinesListSerializer(FastListSerializer):
+    # Creates header + "lines" documents with one INSERT per table. Headers are always saved unposted.
+    def create(self, validated_data):
+        header_model = self.child.Meta.model
+        lines_relation = header_model._meta.get_field("lines")
+        line_model = lines_relation.related_model
+        headers = []
+        lines = []
+        for data in validated_data:
+            data = dict(data)
+            lines.append(data.pop("lines"))
+            data.pop("is_posted", None)
+            headers.append(header_model(**data))
+        header_model.objects.bulk_create(headers)
+        line_model.objects.bulk_create(
+            [
+                line_model(**{lines_relation.field.name: header}, **line)
+                for header, header_lines in zip(headers, lines)
+                for line in header_lines
+            ]
+        )
+        return headers
@@ -64,9 +64,46 @@ DATABASES = {
         "PASSWORD": os.environ.get("POSTGRES_PASSWORD", "wms"),
         "HOST": os.environ.get("POSTGRES_HOST", "localhost"),
         "PORT": os.environ.get("POSTGRES_PORT", "5432"),
+        "CONN_MAX_AGE": int(os.environ.get("POSTGRES_CONN_MAX_AGE", "60")),
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {},
     }
 }
 
+if os.environ.get("POSTGRES_POOL", "0") == "1":
+    # Pooled connections are handed back to the pool at the end of each request,
+    # so Django's own persistent connections must be turned off. CONN_HEALTH_CHECKS
+    # makes the pool check each connection before handing it out.
+    DATABASES["default"]["CONN_MAX_AGE"] = 0
+    DATABASES["default"]["OPTIONS"]["pool"] = {
+        "min_size": int(os.environ.get("POSTGRES_POOL_MIN_SIZE", "2")),
+        "max_size": int(os.environ.get("POSTGRES_POOL_MAX_SIZE", "10")),
+        "timeout": float(os.environ.get("POSTGRES_POOL_TIMEOUT", "10")),
+        "max_idle": float(os.environ.get("POSTGRES_POOL_MAX_IDLE", "300")),
+        "name": "wms",
+    }
+
+if os.environ.get("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.environ["REDIS_URL"],
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+SESSION_ENGINE = "django.contrib.sessions.backends.cached_db"
+
+AUTHENTICATION_BACKENDS = ["wms.accounts.backends.CachedModelBackend"]
+# Without a shared cache (REDIS_URL) each worker process keeps its own copy,
+# so permission changes reach other workers only after this many seconds.
+AUTH_CACHE_TIMEOUT = int(os.environ.get("AUTH_CACHE_TIMEOUT", "60"))
+
 AUTH_PASSWORD_VALIDATORS = [
     {"NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator"},
     {"NAME": "django.contrib.auth.password_validation.MinimumLengthValidator"},
@@ -107,10 +144,18 @@ REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
     ],
+    "DEFAULT_RENDERER_CLASSES": [
+        "rest_framework.renderers.JSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 100,
 }
+# API_FAST_JSON=1 renders API responses with orjson (pip install orjson).
+if os.environ.get("API_FAST_JSON") == "1":
+    REST_FRAMEWORK["DEFAULT_RENDERER_CLASSES"][0] = "wms.api.ORJSONRenderer"
 
 QUANT_QTY = "0.001"
 QUANT_MONEY = "0.01"
+QUANT_COST = "0.0001"
 DEFAULT_CURRENCY = "AZN"
@@ -0,0 +1,297 @@
+import json
+from decimal import Decimal
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, get_resolver, reverse
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from wms.api import ORJSONRenderer
+from wms.masters.models import Vendor, Warehouse, OutgoingLocation, Unit, Item
+from wms.purchasing.models import PurchaseHeader, PurchaseLine
+from wms.issuing.models import IssueHeader, IssueLine
+from wms.inventory.models import TransferHeader, TransferLine, AdjustmentHeader, AdjustmentLine
+from wms.inventory.services import post_purchase, post_issue
+from wms.urls import router
+
+
+# Maximum number of queries per page once the session and user are cached.
+# Every named URL in wms/urls.py and every router endpoint must be listed here.
+QUERY_BUDGETS = {
+    "health": 1,
+    "warehouse_stock": 5,
+    "warehouse_stock?warehouse=all": 4,
+    "recent_movements": 4,
+    "item_detail": 5,
+    "stock_valuation": 4,
+    "stock_period_summary": 4,
+    "consumption_report": 4,
+    "stock_aging": 3,
+    "reorder_suggestions": 5,
+    "vendor_list": 1,
+    "vendor_create": 0,
+    "vendor_edit": 2,
+    "vendor_delete": 1,
+    "vendor_search": 1,
+    "warehouse_list": 1,
+    "warehouse_create": 0,
+    "warehouse_edit": 1,
+    "warehouse_delete": 1,
+    "outgoing_location_list": 1,
+    "outgoing_location_create": 0,
+    "outgoing_location_edit": 1,
+    "outgoing_location_delete": 1,
+    "unit_list": 1,
+    "unit_create": 0,
+    "unit_edit": 1,
+    "unit_delete": 1,
+    "unit_search": 1,
+    "item_list": 1,
+    "item_search": 1,
+    "item_create": 4,
+    "item_edit": 2,
+    "item_delete": 1,
+    "purchase_list": 2,
+    "purchase_create": 35,
+    "purchase_edit": 22,
+    "purchase_detail": 6,
+    "vendor_spend": 3,
+    "best_price": 1,
+    "issue_list": 3,
+    "issue_create": 9,
+    "issue_edit": 8,
+    "issue_detail": 6,
+    "api:vendors": 2,
+    "api:warehouses": 2,
+    "api:outgoing-locations": 2,
+    "api:items": 2,
+    "api:purchases": 3,
+    "api:issues": 3,
+    "api:transfers": 3,
+    "api:adjustments": 3,
+    "api:purchases?expand=item": 3,
+    "api:issues?expand=item": 3,
+    "api:transfers?expand=item": 3,
+    "api:adjustments?expand=item": 3,
+    "api:stock-balances": 1,
+    "api:stock-movements": 1,
+    "api:stock-changes": 4,
+    "api:consumption": 1,
+}
+
+# Long-lived streams are not measured here, they have their own tests.
+STREAMING_URLS = {"stock_events"}
+
+# Pages whose query count still grows with the data set. Remove entries once fixed.
+KNOWN_N_PLUS_ONE = set()
+
+
+class QueryBudgetTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser("budget", "budget@example.com", "pass")
+        self.client.force_login(self.user)
+        Unit.objects.get_or_create(name="pcs")
+        self.anchor_item = Item.objects.create(name="Anchor", unit="pcs", category="General")
+        self._populate("s", 2)
+        self.vendor = Vendor.objects.order_by("id").first()
+        self.warehouse = Warehouse.objects.order_by("id").first()
+        self.location = OutgoingLocation.objects.order_by("id").first()
+        self.unit = Unit.objects.order_by("id").first()
+        self.purchase = PurchaseHeader.objects.order_by("id").first()
+        self.issue = IssueHeader.objects.order_by("id").first()
+
+    def _populate(self, prefix, size):
+        vendor = Vendor.objects.create(name=f"{prefix}-vendor")
+        warehouse = Warehouse.objects.create(name=f"{prefix}-wh")
+        other_warehouse = Warehouse.objects.create(name=f"{prefix}-wh-2")
+        location = OutgoingLocation.objects.create(name=f"{prefix}-dept", type="department")
+        Unit.objects.create(name=f"{prefix}-box")
+        for i in range(size):
+            item = Item.objects.create(name=f"{prefix}-item-{i}", unit="pcs", category=f"{prefix}-cat")
+            purchase = PurchaseHeader.objects.create(
+                vendor=vendor,
+                warehouse=warehouse,
+                invoice_no=f"{prefix}-{i}",
+                invoice_date="2026-02-06",
+                created_by=self.user,
+            )
+            for line_item in (item, self.anchor_item):
+                PurchaseLine.objects.create(
+                    purchase=purchase,
+                    item=line_item,
+                    qty=Decimal("10"),
+                    unit_price=Decimal("2.00"),
+                    line_total=Decimal("20.00"),
+                )
+            post_purchase(purchase, self.user)
+
+            issue = IssueHeader.objects.create(
+                warehouse=warehouse,
+                outgoing_location=location,
+                source_purchase=purchase,
+                issue_date="2026-02-07",
+                created_by=self.user,
+            )
+            IssueLine.objects.create(header=issue, item=item, qty=Decimal("1"))
+            IssueLine.objects.create(header=issue, item=self.anchor_item, qty=Decimal("1"))
+            post_issue(issue, self.user)
+
+            transfer = TransferHeader.objects.create(
+                from_warehouse=warehouse,
+                to_warehouse=other_warehouse,
+                date="2026-02-08",
+                created_by=self.user,
+            )
+            TransferLine.objects.create(header=transfer, item=item, qty=Decimal("1"))
+            TransferLine.objects.create(header=transfer, item=self.anchor_item, qty=Decimal("1"))
+
+            adjustment = AdjustmentHeader.objects.create(
+                warehouse=warehouse,
+                date="2026-02-08",
+                reason="Count",
+                created_by=self.user,
+            )
+            AdjustmentLine.objects.create(header=adjustment, item=item, qty_delta=Decimal("1"))
+            AdjustmentLine.objects.create(header=adjustment, item=self.anchor_item, qty_delta=Decimal("-1"))
+
+    def _urls(self):
+        urls = {
+            "health": reverse("health"),
+            "warehouse_stock": reverse("warehouse_stock") + f"?warehouse={self.warehouse.id}",
+            "warehouse_stock?warehouse=all": reverse("warehouse_stock") + "?warehouse=all",
+            "recent_movements": reverse("recent_movements"),
+            "item_detail": reverse("item_detail", args=[self.anchor_item.id]),
+            "stock_valuation": reverse("stock_valuation") + "?group=vendor&date=07/02/2026",
+            "stock_period_summary": reverse("stock_period_summary") + "?date_from=01/02/2026&date_to=28/02/2026",
+            "consumption_report": reverse("consumption_report") + "?group=item&then=month&month_from=2026-01",
+            "stock_aging": reverse("stock_aging") + "?basis=receipt",
+            "reorder_suggestions": reverse("reorder_suggestions"),
+            "vendor_list": reverse("vendor_list"),
+            "vendor_create": reverse("vendor_create"),
+            "vendor_edit": reverse("vendor_edit", args=[self.vendor.id]),
+            "vendor_delete": reverse("vendor_delete", args=[self.vendor.id]),
+            "vendor_search": reverse("vendor_search") + "?q=vendor",
+            "warehouse_list": reverse("warehouse_list"),
+            "warehouse_create": reverse("warehouse_create"),
+            "warehouse_edit": reverse("warehouse_edit", args=[self.warehouse.id]),
+            "warehouse_delete": reverse("warehouse_delete", args=[self.warehouse.id]),
+            "outgoing_location_list": reverse("outgoing_location_list"),
+            "outgoing_location_create": reverse("outgoing_location_create"),
+            "outgoing_location_edit": reverse("outgoing_location_edit", args=[self.location.id]),
+            "outgoing_location_delete": reverse("outgoing_location_delete", args=[self.location.id]),
+            "unit_list": reverse("unit_list"),
+            "unit_create": reverse("unit_create"),
+            "unit_edit": reverse("unit_edit", args=[self.unit.id]),
+            "unit_delete": reverse("unit_delete", args=[self.unit.id]),
+            "unit_search": reverse("unit_search") + "?q=box",
+            "item_list": reverse("item_list"),
+            "item_search": reverse("item_search") + "?q=item",
+            "item_create": reverse("item_create"),
+            "item_edit": reverse("item_edit", args=[self.anchor_item.id]),
+            "item_delete": reverse("item_delete", args=[self.anchor_item.id]),
+            "purchase_list": reverse("purchase_list"),
+            "purchase_create": reverse("purchase_create"),
+            "purchase_edit": reverse("purchase_edit", args=[self.purchase.id]),
+            "purchase_detail": reverse("purchase_detail", args=[self.purchase.id]),
+            "vendor_spend": reverse("vendor_spend") + "?month_from=2026-01",
+            "best_price": reverse("best_price") + f"?item={self.anchor_item.id}",
+            "issue_list": reverse("issue_list"),
+            "issue_create": reverse("issue_create") + f"?purchase={self.purchase.id}",
+            "issue_edit": reverse("issue_edit", args=[self.issue.id]),
+            "issue_detail": reverse("issue_detail", args=[self.issue.id]),
+        }
+        for prefix, viewset, basename in router.registry:
+            urls[f"api:{prefix}"] = f"/api/{prefix}/"
+        for prefix in ("purchases", "issues", "transfers", "adjustments"):
+            urls[f"api:{prefix}?expand=item"] = f"/api/{prefix}/?expand=item"
+        return urls
+
+    def _measure(self):
+        counts = {}
+        for name, url in self._urls().items():
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, f"{name}: {url}")
+            counts[name] = len(ctx.captured_queries)
+        return counts
+
+    def test_every_url_has_a_budget(self):
+        names = {
+            pattern.name
+            for pattern in get_resolver().url_patterns
+            if isinstance(pattern, URLPattern) and pattern.name
+        }
+        names |= {f"api:{prefix}" for prefix, viewset, basename in router.registry}
+        self.assertEqual(names - set(QUERY_BUDGETS) - STREAMING_URLS, set())
+        self.assertEqual(set(self._urls()), set(QUERY_BUDGETS))
+
+    def test_expand_inlines_item_fields(self):
+        line = self.client.get("/api/purchases/").json()["results"][0]["lines"][0]
+        self.assertNotIn("item_name", line)
+
+        line = self.client.get("/api/purchases/?expand=item").json()["results"][0]["lines"][0]
+        item = Item.objects.get(pk=line["item"])
+        self.assertEqual(line["item_name"], item.name)
+        self.assertEqual(line["item_code"], item.internal_code)
+
+    def test_fast_list_serializer_matches_drf(self):
+        request = Request(APIRequestFactory().get("/api/?expand=item"))
+        for prefix, viewset, basename in router.registry:
+            serializer_class = getattr(viewset, "serializer_class", None)
+            if serializer_class is None:
+                continue
+            with self.subTest(endpoint=prefix):
+                rows = list(viewset.queryset.all())
+                fast = serializer_class(rows, many=True, context={"request": request}).data
+                plain = serializers.ListSerializer(
+                    rows, child=serializer_class(), context={"request": request}
+                ).data
+                self.assertTrue(fast)
+                self.assertEqual(json.loads(JSONRenderer().render(fast)), json.loads(JSONRenderer().render(plain)))
+                self.assertEqual(json.loads(ORJSONRenderer().render(fast)), json.loads(JSONRenderer().render(fast)))
+
+    def test_sparse_fieldsets(self):
+        row = self.client.get("/api/stock-movements/?fields=id,qty_delta,unknown").json()["results"][0]
+        self.assertEqual(set(row), {"id", "qty_delta"})
+
+        purchase = self.client.get("/api/purchases/?fields=id,lines").json()["results"][0]
+        self.assertEqual(set(purchase), {"id", "lines"})
+        self.assertIn("qty", purchase["lines"][0])
+
+    def test_sparse_fieldsets_do_not_trim_writes(self):
+        response = self.client.patch(
+            f"/api/items/{self.anchor_item.id}/?fields=id", {"name": "Renamed"}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.anchor_item.refresh_from_db()
+        self.assertEqual(self.anchor_item.name, "Renamed")
+
+        response = self.client.post(
+            "/api/purchases/?fields=id",
+            {
+                "vendor": self.vendor.id,
+                "warehouse": self.warehouse.id,
+                "invoice_no": "SPARSE-1",
+                "invoice_date": "2026-02-09",
+                "lines": [{"item": self.anchor_item.id, "qty": "1", "unit_price": "2.00", "line_total": "2.00"}],
+            },
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(PurchaseHeader.objects.get(invoice_no="SPARSE-1").lines.count(), 1)
+
+    def test_query_counts_do_not_grow_with_data(self):
+        self._measure()  # warm up content type and translation caches
+        small = self._measure()
+        self._populate("l", 12)
+        large = self._measure()
+
+        for name, budget in QUERY_BUDGETS.items():
+            with self.subTest(url=name):
+                self.assertLessEqual(small[name], budget)
+                if name in KNOWN_N_PLUS_ONE:
+                    continue
+                self.assertEqual(large[name], small[name])
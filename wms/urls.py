@@ -9,6 +9,8 @@ from wms.issuing.api import IssueViewSet
 from wms.inventory.api import (
     StockBalanceViewSet,
     StockMovementViewSet,
+    StockChangeFeedViewSet,
+    ConsumptionViewSet,
     TransferViewSet,
     AdjustmentViewSet,
 )
@@ -16,6 +18,7 @@ from wms.inventory import views as inventory_views
 from wms.masters import views as masters_views
 from wms.purchasing import views as purchasing_views
 from wms.issuing import views as issuing_views
+from wms.health import health
 
 router = DefaultRouter()
 router.register(r"vendors", VendorViewSet)
@@ -28,15 +31,24 @@ router.register(r"transfers", TransferViewSet)
 router.register(r"adjustments", AdjustmentViewSet)
 router.register(r"stock-balances", StockBalanceViewSet)
 router.register(r"stock-movements", StockMovementViewSet, basename="stock-movement")
+router.register(r"stock-changes", StockChangeFeedViewSet, basename="stock-change")
+router.register(r"consumption", ConsumptionViewSet, basename="consumption")
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("i18n/", include("django.conf.urls.i18n")),
     path("api/", include(router.urls)),
     path("accounts/", include("django.contrib.auth.urls")),
+    path("health/", health, name="health"),
     path("", inventory_views.warehouse_stock, name="warehouse_stock"),
+    path("inventory/stock/events/", inventory_views.stock_events, name="stock_events"),
     path("inventory/movements/", inventory_views.recent_movements, name="recent_movements"),
     path("inventory/items/<int:item_id>/", inventory_views.item_detail, name="item_detail"),
+    path("inventory/reports/valuation/", inventory_views.stock_valuation, name="stock_valuation"),
+    path("inventory/reports/summary/", inventory_views.stock_period_summary, name="stock_period_summary"),
+    path("inventory/reports/consumption/", inventory_views.consumption_report, name="consumption_report"),
+    path("inventory/reports/aging/", inventory_views.stock_aging, name="stock_aging"),
+    path("inventory/reorder/", inventory_views.reorder_suggestions, name="reorder_suggestions"),
     path("masters/vendors/", masters_views.vendor_list, name="vendor_list"),
     path("masters/vendors/new/", masters_views.vendor_create, name="vendor_create"),
     path("masters/vendors/<int:vendor_id>/edit/", masters_views.vendor_edit, name="vendor_edit"),
@@ -64,6 +76,8 @@ urlpatterns = [
     path("purchasing/purchases/new/", purchasing_views.purchase_create, name="purchase_create"),
     path("purchasing/purchases/<int:purchase_id>/edit/", purchasing_views.purchase_edit, name="purchase_edit"),
     path("purchasing/purchases/<int:purchase_id>/", purchasing_views.purchase_detail, name="purchase_detail"),
+    path("purchasing/vendor-spend/", purchasing_views.vendor_spend, name="vendor_spend"),
+    path("purchasing/best-price/", purchasing_views.best_price, name="best_price"),
     path("issuing/issues/", issuing_views.issue_list, name="issue_list"),
     path("issuing/issues/new/", issuing_views.issue_create, name="issue_create"),
     path("issuing/issues/<int:issue_id>/edit/", issuing_views.issue_edit, name="issue_edit"),